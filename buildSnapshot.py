@@ -50,6 +50,10 @@ def create_gem_folder():
         if is_in_charting_tree and "backup" in dirs:
             dirs.remove("backup")
 
+        # Signal-Bar-Datasets (Spalten-Ordner, storage.py) wie _signals_-CSVs behandeln
+        if rel_path.replace("\\", "/") == "charting/data":
+            dirs[:] = [d for d in dirs if "_signals_" not in d]
+
         # 2. Spezialfall: Root 'data' -> leerer Ordner
         if rel_path == "data":
             empty_target_dir = os.path.join(target_base_path, rel_path)
@@ -1,11 +1,16 @@
 from __future__ import annotations
 import json
 import re
+import sys
 from pathlib import Path
 from typing import List, Tuple, Dict
 
 import pandas as pd
-from pandas.api.types import is_datetime64tz_dtype
+
+# Gemeinsame Module (dukascopy_time, ...) liegen eine Ebene höher in pyBacktest/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from dukascopy_time import parse_local_time
+from ohlc_aggregation import aggregate_frame
 
 # ------------------------------------------------------------------------------
 # CONFIG
@@ -60,16 +65,14 @@ def load_single_m1_csv(path: Path) -> pd.DataFrame:
     if "time_ny" not in df.columns:
         raise ValueError(f"Column 'Local time' or 'time_ny' missing in {path}")
 
-    # Parse DateTime (Day-First usually for MT5 exports: 01.02.2023)
-    # Using 'coerce' to handle potential bad lines, but mostly expecting valid data
-    df["time_ny"] = pd.to_datetime(df["time_ny"], dayfirst=True, errors="coerce")
-    
-    # Ensure timezone-naive (NY time is treated as naive here)
-    if is_datetime64tz_dtype(df["time_ny"]):
-        df["time_ny"] = df["time_ny"].dt.tz_localize(None)
+    # Parse DateTime (Day-First: 01.02.2023 00:00:00.000 [GMT+0100])
+    # Fester Spalten-Parser aus dukascopy_time; ein evtl. GMT-Offset wird
+    # ignoriert (NY-Zeit wird hier als naive Wanduhrzeit behandelt).
+    # Ungültige Zeilen werden verworfen.
+    ns, valid = parse_local_time(df["time_ny"].to_numpy(), apply_offset=False)
+    df = df.loc[valid].copy()
+    df["time_ny"] = pd.to_datetime(ns[valid])
 
-    df = df.dropna(subset=["time_ny"])
-    
     # Ensure standard OHLCV columns exist
     for col in ["open", "high", "low", "close"]:
         if col not in df.columns:
@@ -107,111 +110,29 @@ def load_m1_data(data_dir: Path, symbol: str) -> pd.DataFrame:
     raise FileNotFoundError(f"Raw M1 file not found: {target_file} (checked CWD too)")
 
 # ------------------------------------------------------------------------------
-# PART 2: TIMEFRAME RESAMPLING (Logic from app_dynamic.py)
+# PART 2: TIMEFRAME RESAMPLING (shared engine: ohlc_aggregation.py)
 # ------------------------------------------------------------------------------
 
-def make_tf_df(df_m1: pd.DataFrame, tf: str) -> pd.DataFrame:
+def make_tf_dfs(df_m1: pd.DataFrame, tf_list: List[str]) -> Dict[str, pd.DataFrame]:
     """
-    Resamples M1 data into higher timeframes (M5, H1, H4, D, W, M).
-    Handles FX specific logic (17:00 NY rollover).
+    Aggregates M1 data into all requested timeframes (M1 ... M) in one
+    cascaded pass over the sorted M1 arrays (no per-TF frame copies).
+    FX specific 17:00 NY rollover for H4/D/W/M is handled by the engine.
     """
-    # Prepare DataFrame for resampling
-    df = df_m1.copy()
-    df = df.set_index("time_ny").sort_index()
-
-    # Aggregation rules
-    agg = {
-        "open": "first",
-        "high": "max",
-        "low": "min",
-        "close": "last",
-    }
-    if "volume" in df.columns:
-        agg["volume"] = "sum"
-
-    # --- Resampling Logic ---
-    # Standard Intraday
-    intraday_rules = {
-        "M1": "1min",
-        "M3": "3min",
-        "M5": "5min",
-        "M15": "15min",
-        "H1": "1H",
-    }
+    df = df_m1.sort_values("time_ny", kind="mergesort")
+    volume_col = "volume" if "volume" in df.columns else None
 
-    if tf in intraday_rules:
-        rule = intraday_rules[tf]
-        df_res = (
-            df.resample(rule)
-              .agg(agg)
-              .dropna(subset=["open", "high", "low", "close"])
-              .reset_index()
-        )
-
-    # Special Cases: 17:00 NY Rollover
-    elif tf == "H4":
-        # 4H candles starting at 17:00, 21:00, 01:00...
-        shift = pd.Timedelta(hours=17)
-        df_shift = df.copy()
-        df_shift.index = df_shift.index - shift # Shift back to align 17:00 to 00:00
-        
-        df_res = (
-            df_shift.resample("4H")
-                    .agg(agg)
-                    .dropna(subset=["open", "high", "low", "close"])
-                    .reset_index()
-        )
-        df_res["time_ny"] = df_res["time_ny"] + shift # Shift forward for label
-
-    elif tf == "D":
-        # Daily: 17:00 -> 16:59 next day
-        shift = pd.Timedelta(hours=17)
-        df_shift = df.copy()
-        df_shift.index = df_shift.index - shift
-
-        df_res = (
-            df_shift.resample("1D")
-                    .agg(agg)
-                    .dropna(subset=["open", "high", "low", "close"])
-                    .reset_index()
-        )
-        df_res["time_ny"] = df_res["time_ny"] + shift
-
-    elif tf == "W":
-        # Weekly: Sunday 17:00 -> Friday 16:59
-        shift = pd.Timedelta(hours=17)
-        df_shift = df.copy()
-        df_shift.index = df_shift.index - shift
-
-        df_res = (
-            df_shift.resample("W-FRI") # Pandas week ending Friday
-                    .agg(agg)
-                    .dropna(subset=["open", "high", "low", "close"])
-                    .reset_index()
-        )
-        df_res["time_ny"] = df_res["time_ny"] + shift
-
-    elif tf == "M":
-        # Monthly: Shift +7h to include Sunday 17:00 of previous month into current month
-        shift = pd.Timedelta(hours=7)
-        df_shift = df.copy()
-        df_shift.index = df_shift.index + shift
-
-        df_res = (
-            df_shift.resample("MS") # Month Start
-                    .agg(agg)
-                    .dropna(subset=["open", "high", "low", "close"])
-                    .reset_index()
-        )
-        df_res["time_ny"] = df_res["time_ny"] - shift
-
-    else:
-        raise ValueError(f"Unknown Timeframe: {tf}")
-
-    # Add Integer Index for Viewer (x-axis)
-    df_res["bar_index"] = range(len(df_res))
-    
-    return df_res
+    dfs = aggregate_frame(df, tf_list, volume_col=volume_col, time_col="time_ny")
+
+    for df_res in dfs.values():
+        # Add Integer Index for Viewer (x-axis)
+        df_res["bar_index"] = range(len(df_res))
+
+    return dfs
+
+def make_tf_df(df_m1: pd.DataFrame, tf: str) -> pd.DataFrame:
+    """Single-timeframe convenience wrapper around make_tf_dfs."""
+    return make_tf_dfs(df_m1, [tf])[tf]
 
 # ------------------------------------------------------------------------------
 # PART 3: JSON BUILDING (Logic from build_data_json.py)
@@ -232,22 +153,27 @@ def generate_json_payload(dfs_by_tf: Dict[str, pd.DataFrame]) -> dict:
         total_rows = len(df_tf)
         print(f"{tf}: Exporting {total_rows} bars...")
 
-        bars = []
-        # Using itertuples for performance
-        for row in df_tf.itertuples(index=False):
-            # Safe volume retrieval
-            vol = getattr(row, "volume", 0.0)
-            if pd.isna(vol): vol = 0.0
-
-            bars.append({
-                "i": int(row.bar_index),
-                "t": row.time_ny.isoformat(), # ISO string for JS parsing
-                "o": float(row.open),
-                "h": float(row.high),
-                "l": float(row.low),
-                "c": float(row.close),
-                "v": float(vol),
-            })
+        try:
+            bars = []
+            # Using itertuples for performance
+            for row in df_tf.itertuples(index=False):
+                # Safe volume retrieval
+                vol = getattr(row, "volume", 0.0)
+                if pd.isna(vol): vol = 0.0
+
+                bars.append({
+                    "i": int(row.bar_index),
+                    "t": row.time_ny.isoformat(), # ISO string for JS parsing
+                    "o": float(row.open),
+                    "h": float(row.high),
+                    "l": float(row.low),
+                    "c": float(row.close),
+                    "v": float(vol),
+                })
+        except Exception as e:
+            # Fehlerhafter TF wird ausgelassen, die übrigen landen trotzdem im JSON
+            print(f"{tf}: Error: {e} (skipped)")
+            continue
 
         payload["timeframes"][tf] = {"bars": bars}
         print(f"{tf}: Done.")
@@ -274,13 +200,21 @@ def main():
     dfs_by_tf = {}
 
     print("--- Resampling Timeframes ---")
+    try:
+        dfs_by_tf = make_tf_dfs(df_m1, tf_list)
+    except Exception as e:
+        # Fallback: jeden TF einzeln, damit ein fehlerhafter TF die anderen nicht mitreißt
+        print(f"Cascaded resampling failed ({e}), falling back to per-timeframe resampling")
+        dfs_by_tf = {}
+        for tf in tf_list:
+            try:
+                dfs_by_tf[tf] = make_tf_df(df_m1, tf)
+            except Exception as e_tf:
+                print(f"Processing {tf}... Error: {e_tf}")
+
     for tf in tf_list:
-        try:
-            print(f"Processing {tf}...", end=" ", flush=True)
-            dfs_by_tf[tf] = make_tf_df(df_m1, tf)
-            print(f"OK ({len(dfs_by_tf[tf])} bars)")
-        except Exception as e:
-            print(f"Error: {e}")
+        if tf in dfs_by_tf:
+            print(f"Processing {tf}... OK ({len(dfs_by_tf[tf])} bars)")
 
     # 3. Build and Write JSON
     print("--- Building JSON ---")
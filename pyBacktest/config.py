@@ -29,4 +29,28 @@ PIP_SIZE_MAP = {
     "NAS100": 1.0,
     "US500": 1.0,
     "XAUUSD": 0.01,
-}
\ No newline at end of file
+}
+
+# ----------------------------------------------------------------
+# PARALLELE SYMBOL-VERARBEITUNG (symbol_runner.py)
+# ----------------------------------------------------------------
+
+# Max. Anzahl paralleler Symbol-Prozesse pro Phase (None = alle CPU-Kerne, 1 = seriell).
+MAX_WORKERS = None
+
+# Geschätzter Peak-RAM pro Symbol-Prozess in GB. Begrenzt die Worker-Anzahl
+# zusätzlich auf (freier RAM / MEMORY_PER_SYMBOL_GB).
+MEMORY_PER_SYMBOL_GB = 1.5
+
+# ----------------------------------------------------------------
+# ZWISCHENERGEBNISSE ZWISCHEN DEN PHASEN (storage.py)
+# ----------------------------------------------------------------
+
+# Format der Bar-Datasets (phase0_enriched, phase1_structure, signals):
+#   "npy"     = Ordner mit einer .npy-Datei pro Spalte (Standard, keine Extra-Pakete)
+#   "parquet" = eine .parquet-Datei (benötigt pyarrow)
+#   "csv"     = wie früher, langsam
+STORAGE_FORMAT = "npy"
+
+# Zusätzlich eine CSV-Kopie jedes Datasets schreiben (zum Reinschauen / Excel).
+EXPORT_CSV = False
@@ -0,0 +1,194 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+try:
+    from pandas.tseries.api import guess_datetime_format
+except ImportError:  # pandas < 2.2
+    from pandas._libs.tslibs.parsing import guess_datetime_format
+
+# ---------------------------------
+# FIXED-FORMAT PARSER FÜR DUKASCOPY "Local time"
+# ---------------------------------
+#
+# Unterstützte Formate (feste Breite):
+#   "31.12.2024 23:00:00.000 GMT+0100"   (32 Zeichen, Dukascopy-Export)
+#   "31.12.2024 23:00:00.000"            (23 Zeichen, z.B. *_M1_raw_for_json.csv)
+#
+# Positionen (0-basiert):
+#   DD.MM.YYYY hh:mm:ss.fff GMT+HHMM
+#   0  3  6    11 14 17 20  24  27
+#
+# Alle anderen Zeilen werden als "malformed" markiert und über den
+# generischen pandas-Parser nachgeparst (Fallback), damit sich das
+# Ergebnis nicht vom bisherigen Pfad unterscheidet.
+#
+# Der bisherige Pfad (pd.to_datetime ohne format) leitet das Format aus
+# dem ERSTEN Element ab und setzt alle Zeilen mit anderem Layout auf NaT
+# (z.B. Zeile ohne Offset in einer Datei mit GMT-Offset, fehlende
+# Millisekunden). Das wird hier nachgebildet: der feste Parser akzeptiert
+# nur das Layout des ersten Elements, der Fallback parst mit demselben
+# abgeleiteten Format (ohne ableitbares Format: elementweise, "mixed").
+
+NS_PER_SECOND = 1_000_000_000
+NS_PER_MILLI = 1_000_000
+
+LEN_NAIVE = 23
+LEN_WITH_OFFSET = 32
+
+_SEPARATORS = {2: ".", 5: ".", 10: " ", 13: ":", 16: ":", 19: "."}
+_OFFSET_SEPARATORS = {23: " ", 24: "G", 25: "M", 26: "T"}
+_DIGITS = [0, 1, 3, 4, 6, 7, 8, 9, 11, 12, 14, 15, 17, 18, 20, 21, 22]
+_OFFSET_DIGITS = [28, 29, 30, 31]
+
+FMT_NAIVE = "%d.%m.%Y %H:%M:%S.%f"
+FMT_WITH_OFFSET = FMT_NAIVE + " %z"
+
+_DAYS_IN_MONTH = np.array([0, 31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31], dtype=np.int64)
+
+
+def _days_from_civil(y: np.ndarray, m: np.ndarray, d: np.ndarray) -> np.ndarray:
+    """Tage seit 1970-01-01 für (y, m, d), proleptisch gregorianisch (vektorisiert)."""
+    y = y - (m <= 2)
+    era = np.floor_divide(y, 400)
+    yoe = y - era * 400
+    mp = np.where(m > 2, m - 3, m + 9)
+    doy = (153 * mp + 2) // 5 + d - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+
+def _char_matrix(values) -> np.ndarray:
+    """Strings -> (n, width) Matrix der Unicode-Codepoints (0 = Padding)."""
+    arr = np.asarray(values, dtype=object).astype(str)
+    width = max(arr.dtype.itemsize // 4, 1)
+    arr = arr.astype(f"<U{width}")
+    return arr.view(np.uint32).reshape(len(arr), width)
+
+
+def _parse_fixed(chars: np.ndarray, apply_offset: bool):
+    n, width = chars.shape
+    if width <= LEN_WITH_OFFSET:
+        chars = np.pad(chars, ((0, 0), (0, LEN_WITH_OFFSET + 1 - width)))
+    too_long = chars[:, LEN_WITH_OFFSET:].any(axis=1)
+    chars = chars[:, :LEN_WITH_OFFSET].astype(np.int32)
+
+    naive = chars[:, LEN_NAIVE] == 0
+    valid = ~too_long
+
+    for pos, ch in _SEPARATORS.items():
+        valid &= chars[:, pos] == ord(ch)
+    for pos, ch in _OFFSET_SEPARATORS.items():
+        valid &= naive | (chars[:, pos] == ord(ch))
+    sign_ch = chars[:, 27]
+    valid &= naive | (sign_ch == ord("+")) | (sign_ch == ord("-"))
+
+    digits = chars - ord("0")
+    for pos in _DIGITS:
+        valid &= (digits[:, pos] >= 0) & (digits[:, pos] <= 9)
+    for pos in _OFFSET_DIGITS:
+        valid &= naive | ((digits[:, pos] >= 0) & (digits[:, pos] <= 9))
+
+    def num(*positions):
+        out = np.zeros(n, dtype=np.int64)
+        for pos in positions:
+            out = out * 10 + digits[:, pos].astype(np.int64)
+        return out
+
+    day = num(0, 1)
+    month = num(3, 4)
+    year = num(6, 7, 8, 9)
+    hour = num(11, 12)
+    minute = num(14, 15)
+    second = num(17, 18)
+    milli = num(20, 21, 22)
+
+    valid &= (month >= 1) & (month <= 12)
+    is_leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    max_day = _DAYS_IN_MONTH[np.clip(month, 0, 12)] - ((month == 2) & ~is_leap)
+    valid &= (day >= 1) & (day <= max_day)
+    valid &= (hour < 24) & (minute < 60) & (second < 60)
+
+    days = _days_from_civil(year, month, day)
+    seconds = days * 86400 + hour * 3600 + minute * 60 + second
+
+    if apply_offset:
+        off_seconds = num(28, 29) * 3600 + num(30, 31) * 60
+        off_seconds = np.where(sign_ch == ord("-"), -off_seconds, off_seconds)
+        seconds = seconds - np.where(naive, 0, off_seconds)
+
+    ns = seconds * NS_PER_SECOND + milli * NS_PER_MILLI
+    return np.where(valid, ns, 0), valid, naive
+
+
+def _reference_strings(values, apply_offset: bool) -> pd.Series:
+    """
+    Strings so, wie sie der bisherige pandas-Pfad gesehen hat:
+      apply_offset=True:  " GMT+0100" -> " +0100" (%z)
+      apply_offset=False: Offset-Suffix abgeschnitten (naive Wanduhrzeit)
+    """
+    raw = pd.Series(np.asarray(values, dtype=object)).astype(str)
+    if apply_offset:
+        return raw.str.replace(" GMT", " ", regex=False)
+    return raw.str.replace(r" GMT[+-]\d{4}$", "", regex=True)
+
+
+def reference_format(values, apply_offset: bool = True):
+    """Format, das pd.to_datetime aus dem ersten Element ableitet (None = elementweise)."""
+    first = _reference_strings(values[:1], apply_offset).iloc[0]
+    with warnings.catch_warnings():
+        # ISO-Strings: "Parsing dates in %Y-%m-%d ... when dayfirst=True" (gültige Eingabe)
+        warnings.simplefilter("ignore", UserWarning)
+        return guess_datetime_format(first, dayfirst=True)
+
+
+def _parse_generic(values, apply_offset: bool, fmt):
+    """Bisheriger pandas-Pfad (dayfirst, errors='coerce', Format des ersten Elements) für Sonderfälle."""
+    ts = _reference_strings(values, apply_offset)
+    parsed = pd.to_datetime(ts, dayfirst=True, utc=apply_offset, errors="coerce",
+                            format=fmt if fmt is not None else "mixed")
+    if isinstance(parsed.dtype, pd.DatetimeTZDtype):
+        parsed = parsed.dt.tz_localize(None)
+    valid = parsed.notna().to_numpy()
+    ns = parsed.to_numpy(dtype="datetime64[ns]").view(np.int64)
+    return np.where(valid, ns, 0), valid
+
+
+def parse_local_time(values, apply_offset: bool = True):
+    """
+    Parst Dukascopy-'Local time'-Strings in int64-Nanosekunden.
+
+    apply_offset=True:
+        GMT-Offset wird arithmetisch abgezogen -> UTC-Epoch-ns
+        (Strings ohne Offset gelten als UTC, wie bei pd.to_datetime(utc=True)).
+    apply_offset=False:
+        Offset wird ignoriert -> naive Wanduhrzeit (wie tz_localize(None)).
+
+    Rückgabe: (ns, valid)
+      - ns:    int64-Array, 0 an ungültigen Positionen
+      - valid: bool-Array, False für Zeilen, die weder der feste Parser
+               noch der generische Fallback lesen konnten
+    """
+    if len(values) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=bool)
+
+    ns, valid, naive = _parse_fixed(_char_matrix(values), apply_offset)
+
+    # Nur das Layout, das pandas aus dem ersten Element ableiten würde
+    fmt = reference_format(values, apply_offset)
+    if apply_offset and fmt == FMT_WITH_OFFSET:
+        valid &= ~naive
+    elif apply_offset and fmt == FMT_NAIVE:
+        valid &= naive
+    elif fmt not in (None, FMT_NAIVE):
+        valid[:] = False
+
+    malformed = np.flatnonzero(~valid)
+    if len(malformed):
+        subset = np.asarray(values, dtype=object)[malformed]
+        ns_fb, valid_fb = _parse_generic(subset, apply_offset, fmt)
+        ns[malformed] = ns_fb
+        valid[malformed] = valid_fb
+
+    return ns, valid
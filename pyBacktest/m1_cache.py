@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+# ---------------------------------
+# CONFIGURATION
+# ---------------------------------
+
+# Unterordner (neben den M1-CSVs), in dem die Binär-Caches liegen
+CACHE_DIR_NAME = "_cache"
+
+# Bei Änderungen am Cache-Layout oder an der Parse-Logik hochzählen,
+# damit alte Caches automatisch neu gebaut werden.
+CACHE_VERSION = 1
+
+# Spalten im Cache: time_ny als int64 (naive NY-Zeit in ns), Rest float64
+CACHE_COLUMNS = ["time_ny", "open", "high", "low", "close", "tick_volume"]
+
+META_FILENAME = "meta.json"
+HASH_CHUNK_BYTES = 1 << 20
+
+
+# ---------------------------------
+# SIGNATUR & HASH DER QUELLDATEI
+# ---------------------------------
+
+def file_signature(path: str) -> dict:
+    """Größe + mtime (ns) der Quelldatei – billiger Schnell-Check."""
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def content_hash(path: str) -> str:
+    """BLAKE2b über den kompletten Dateiinhalt (gestreamt)."""
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def cache_dir_for(csv_path: str) -> str:
+    """
+    Cache-Ordner pro Quelldatei, z.B.
+      dukascopy_m1/EURUSD_2024_M1.csv -> dukascopy_m1/_cache/EURUSD_2024_M1/
+    """
+    folder, filename = os.path.split(csv_path)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(folder, CACHE_DIR_NAME, stem)
+
+
+# ---------------------------------
+# LESEN / SCHREIBEN
+# ---------------------------------
+
+def _read_meta(cache_dir: str):
+    meta_path = os.path.join(cache_dir, META_FILENAME)
+    if not os.path.exists(meta_path):
+        return None
+    try:
+        with open(meta_path, "r") as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+
+def _write_meta(cache_dir: str, meta: dict) -> None:
+    meta_path = os.path.join(cache_dir, META_FILENAME)
+    tmp_path = meta_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, meta_path)
+
+
+def load_cached_arrays(csv_path: str):
+    """
+    Liefert die gecachten Spalten (memory-mapped) für csv_path oder None,
+    wenn kein gültiger Cache existiert.
+
+    Gültigkeit:
+      - Version passt
+      - Größe + mtime identisch -> Treffer ohne Hash
+      - sonst: Content-Hash vergleichen. Gleicher Inhalt (z.B. nur kopiert/
+        touch) -> Treffer, Signatur im Meta wird aktualisiert.
+        Anderer Inhalt (CSV ersetzt) -> None, Cache wird neu gebaut.
+    """
+    cache_dir = cache_dir_for(csv_path)
+    meta = _read_meta(cache_dir)
+    if meta is None or meta.get("version") != CACHE_VERSION:
+        return None
+
+    signature = file_signature(csv_path)
+    if meta.get("signature") != signature:
+        if meta.get("content_hash") != content_hash(csv_path):
+            return None
+        meta["signature"] = signature
+        _write_meta(cache_dir, meta)
+
+    arrays = {}
+    for col in CACHE_COLUMNS:
+        col_path = os.path.join(cache_dir, f"{col}.npy")
+        if not os.path.exists(col_path):
+            return None
+        arrays[col] = np.load(col_path, mmap_mode="r")
+
+    n = {len(a) for a in arrays.values()}
+    if len(n) != 1 or n.pop() != meta.get("rows"):
+        return None
+    return arrays
+
+
+def save_cached_arrays(csv_path: str, arrays: dict) -> None:
+    """
+    Schreibt die geparsten Spalten einer Quelldatei in den Cache.
+    meta.json wird zuerst entfernt und zuletzt geschrieben, damit ein
+    abgebrochener Schreibvorgang nie als gültiger Cache gilt.
+    """
+    cache_dir = cache_dir_for(csv_path)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    meta_path = os.path.join(cache_dir, META_FILENAME)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+
+    rows = None
+    for col in CACHE_COLUMNS:
+        arr = np.ascontiguousarray(arrays[col])
+        rows = len(arr)
+        np.save(os.path.join(cache_dir, f"{col}.npy"), arr)
+
+    _write_meta(cache_dir, {
+        "version": CACHE_VERSION,
+        "source": os.path.basename(csv_path),
+        "signature": file_signature(csv_path),
+        "content_hash": content_hash(csv_path),
+        "rows": rows,
+    })
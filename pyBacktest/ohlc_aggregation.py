@@ -0,0 +1,217 @@
+import numpy as np
+import pandas as pd
+
+# ---------------------------------
+# MULTI-TIMEFRAME OHLCV AGGREGATION
+# ---------------------------------
+#
+# Ein gemeinsamer Aggregations-Kern für Phase 0a (M1 -> M5) und den
+# Chart-Generator (M1 -> M1 ... M).
+#
+# Arbeitet auf sortierten int64-Zeitstempeln (naive NY-Zeit in ns) und
+# NumPy-Arrays statt auf DataFrame-Kopien + resample():
+#   - jede Kerze bekommt einen Bucket-Key (rollover-aware für H4/D/W/M)
+#   - Bucket-Grenzen = Stellen, an denen sich der Key ändert
+#   - OHLCV per ufunc.reduceat über die Bucket-Grenzen
+#
+# Die Timeframes sind ineinander geschachtelt, daher wird kaskadiert:
+# M5 aus M1, M15 aus M5, H1 aus M15, H4 aus H1, D aus H4, W/M aus D.
+# Jede Stufe läuft nur noch über die Buckets der feineren Stufe.
+#
+# Labels entsprechen exakt der bisherigen pandas-Logik:
+#   - Intraday:  Bucket-Start
+#   - H4 / D:    Bucket-Start mit 17:00-NY-Rollover (17:00, 21:00, 01:00 ...)
+#   - W:         Freitag 17:00 am Ende der Woche (resample("W-FRI") auf -17h)
+#   - M:         Monatserster 00:00 - 7h, d.h. Vortag 17:00 (resample("MS") auf +7h)
+
+NS_PER_MINUTE = 60 * 1_000_000_000
+NS_PER_HOUR = 60 * NS_PER_MINUTE
+NS_PER_DAY = 24 * NS_PER_HOUR
+
+ROLLOVER_NS = 17 * NS_PER_HOUR       # FX-Tageswechsel 17:00 NY
+MONTH_SHIFT_NS = 7 * NS_PER_HOUR     # So 17:00 gehört zum Folgemonat
+
+# 1970-01-01 war ein Donnerstag (Montag = 0)
+EPOCH_WEEKDAY = 3
+FRIDAY = 4
+
+INTRADAY_MINUTES = {
+    "M1": 1,
+    "M3": 3,
+    "M5": 5,
+    "M15": 15,
+    "H1": 60,
+}
+
+# Feinere Stufe, aus der ein Timeframe kaskadiert wird (None = Roh-Bars)
+PARENT_TF = {
+    "M1": None,
+    "M3": "M1",
+    "M5": "M1",
+    "M15": "M5",
+    "H1": "M15",
+    "H4": "H1",
+    "D": "H4",
+    "W": "D",
+    "M": "D",
+}
+
+SUPPORTED_TIMEFRAMES = list(PARENT_TF.keys())
+
+
+# ---------------------------------
+# BUCKET-KEYS & LABELS
+# ---------------------------------
+
+def _bucket_keys(tf: str, t: np.ndarray) -> np.ndarray:
+    """Monoton steigender Bucket-Key je Zeitstempel (ns)."""
+    if tf in INTRADAY_MINUTES:
+        return t // (INTRADAY_MINUTES[tf] * NS_PER_MINUTE)
+    if tf == "H4":
+        return (t - ROLLOVER_NS) // (4 * NS_PER_HOUR)
+    if tf == "D":
+        return (t - ROLLOVER_NS) // NS_PER_DAY
+    if tf == "W":
+        day = (t - ROLLOVER_NS) // NS_PER_DAY
+        weekday = (day + EPOCH_WEEKDAY) % 7
+        return day + (FRIDAY - weekday) % 7
+    if tf == "M":
+        shifted = (t + MONTH_SHIFT_NS).view("datetime64[ns]")
+        return shifted.astype("datetime64[M]").astype(np.int64)
+    raise ValueError(f"Unknown Timeframe: {tf}")
+
+
+def _bucket_labels(tf: str, keys: np.ndarray) -> np.ndarray:
+    """Label-Zeitstempel (ns) je Bucket-Key."""
+    if tf in INTRADAY_MINUTES:
+        return keys * (INTRADAY_MINUTES[tf] * NS_PER_MINUTE)
+    if tf == "H4":
+        return keys * (4 * NS_PER_HOUR) + ROLLOVER_NS
+    if tf in ("D", "W"):
+        return keys * NS_PER_DAY + ROLLOVER_NS
+    if tf == "M":
+        month_start = keys.astype("datetime64[M]").astype("datetime64[ns]").astype(np.int64)
+        return month_start - MONTH_SHIFT_NS
+    raise ValueError(f"Unknown Timeframe: {tf}")
+
+
+# ---------------------------------
+# KERN
+# ---------------------------------
+
+def _reduce_level(tf: str, level: dict) -> dict:
+    """
+    Fasst eine (feinere) Stufe zu tf zusammen.
+    level: first_time, open, high, low, close, volume (optional)
+    """
+    keys = _bucket_keys(tf, level["first_time"])
+    if len(keys) == 0:
+        starts = np.zeros(0, dtype=np.int64)
+    else:
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(keys)) + 1))
+    ends = np.append(starts[1:], len(keys)) - 1
+
+    out = {
+        "time": _bucket_labels(tf, keys[starts]),
+        "first_time": level["first_time"][starts],
+        "open": level["open"][starts],
+        "high": np.maximum.reduceat(level["high"], starts) if len(starts) else level["high"][:0],
+        "low": np.minimum.reduceat(level["low"], starts) if len(starts) else level["low"][:0],
+        "close": level["close"][ends],
+    }
+    if level.get("volume") is not None:
+        out["volume"] = np.add.reduceat(level["volume"], starts) if len(starts) else level["volume"][:0]
+    return out
+
+
+def aggregate_ohlcv(times_ns: np.ndarray,
+                    open_: np.ndarray,
+                    high: np.ndarray,
+                    low: np.ndarray,
+                    close: np.ndarray,
+                    volume=None,
+                    timeframes=("M5",)) -> dict:
+    """
+    Aggregiert sortierte Bars (times_ns = int64 naive NY-Zeit) in alle
+    angeforderten Timeframes in einem kaskadierten Durchlauf.
+
+    Zeilen mit NaN in OHLC werden vorab verworfen.
+
+    Rückgabe: {tf: {"time", "open", "high", "low", "close"[, "volume"]}}
+    mit time als int64-ns-Label je Bucket.
+    """
+    for tf in timeframes:
+        if tf not in PARENT_TF:
+            raise ValueError(f"Unknown Timeframe: {tf}")
+
+    times_ns = np.asarray(times_ns, dtype=np.int64)
+    ohlc = [np.asarray(a, dtype=np.float64) for a in (open_, high, low, close)]
+    ok = ~(np.isnan(ohlc[0]) | np.isnan(ohlc[1]) | np.isnan(ohlc[2]) | np.isnan(ohlc[3]))
+    if len(times_ns) > 1 and np.any(np.diff(times_ns) < 0):
+        raise ValueError("times_ns must be sorted ascending")
+
+    raw = {
+        "first_time": times_ns[ok],
+        "open": ohlc[0][ok],
+        "high": ohlc[1][ok],
+        "low": ohlc[2][ok],
+        "close": ohlc[3][ok],
+        "volume": None if volume is None else np.asarray(volume, dtype=np.float64)[ok],
+    }
+
+    levels = {}
+
+    def build(tf: str) -> dict:
+        if tf not in levels:
+            parent = PARENT_TF[tf]
+            source = raw if parent is None else build(parent)
+            levels[tf] = _reduce_level(tf, source)
+        return levels[tf]
+
+    result = {}
+    for tf in timeframes:
+        level = build(tf)
+        result[tf] = {k: v for k, v in level.items() if k != "first_time"}
+    return result
+
+
+def aggregate_frame(df: pd.DataFrame,
+                    timeframes,
+                    volume_col=None,
+                    time_col=None) -> dict:
+    """
+    DataFrame-Wrapper um aggregate_ohlcv.
+    Zeit kommt aus time_col oder (falls None) aus dem DatetimeIndex.
+
+    Rückgabe: {tf: DataFrame mit Spalte time_ny + open/high/low/close[/volume_col]}
+    """
+    if time_col is None:
+        times = df.index.values
+    else:
+        times = df[time_col].values
+    times = np.asarray(times, dtype="datetime64[ns]").view(np.int64)
+
+    volume = df[volume_col].to_numpy() if volume_col is not None else None
+    bars = aggregate_ohlcv(
+        times,
+        df["open"].to_numpy(),
+        df["high"].to_numpy(),
+        df["low"].to_numpy(),
+        df["close"].to_numpy(),
+        volume=volume,
+        timeframes=timeframes,
+    )
+
+    frames = {}
+    for tf, b in bars.items():
+        data = {
+            "time_ny": b["time"].view("datetime64[ns]"),
+            "open": b["open"],
+            "high": b["high"],
+            "low": b["low"],
+            "close": b["close"],
+        }
+        if volume_col is not None:
+            data[volume_col] = b["volume"]
+        frames[tf] = pd.DataFrame(data)
+    return frames
@@ -1,8 +1,23 @@
+import json
 import os
 from datetime import datetime, timedelta
 
 import pandas as pd
 
+from dukascopy_time import parse_local_time
+from m1_cache import file_signature, load_cached_arrays, save_cached_arrays
+from ohlc_aggregation import aggregate_frame
+from schema import enforce_bar_schema
+from session_calendar import (
+    block_max,
+    block_min,
+    broadcast_blocks,
+    day_blocks,
+    trading_day_dates,
+    trading_day_ids,
+)
+from symbol_runner import print_summary, run_for_symbols
+
 # ---------------------------------
 # CONFIGURATION
 # ---------------------------------
@@ -18,6 +33,20 @@ CSV_DIR = r"./dukascopy_m1"
 # >> HIER auf dein echtes Pattern anpassen!
 CSV_FILENAME_TEMPLATE = "{symbol}_{year}_M1.csv"
 
+# Geparste M1-Jahresdateien als Binär-Cache (dukascopy_m1/_cache/) ablegen
+# und bei Folge-Läufen memory-mapped laden statt die CSV neu zu parsen.
+# Der Cache invalidiert sich selbst, wenn eine CSV ersetzt wird.
+USE_M1_CACHE = True
+
+# Inkrementeller Modus: Pro Symbol wird ein Watermark (letzter verarbeiteter
+# NY-Zeitstempel + Byte-Offsets in den Outputs) gespeichert. Folge-Läufe laden
+# nur die neuen M1-Bars ab dem letzten (ggf. unvollständigen) Trading-Tag,
+# rechnen diese Tage neu und hängen sie an die bestehenden Outputs an.
+# Bei ungültigem/fehlendem Watermark -> automatisch kompletter Neuaufbau.
+# Korrekturen an bereits verarbeiteten Daten im laufenden Jahr werden NICHT
+# erkannt -> dann einmal mit INCREMENTAL_MODE = False laufen lassen.
+INCREMENTAL_MODE = True
+
 # Symbole
 SYMBOLS = ["AUDUSD", "NZDUSD", "USDCAD", "USDCHF", "USDJPY", "GBPJPY", "EURGBP", "DXY", "US30", "NAS100", "US500", "XAUUSD"] #"EURUSD", "GBPUSD", "AUDUSD", "NZDUSD", "USDCAD", "USDCHF", "USDJPY", "GBPJPY", "EURGBP", "DXY", "US30", "NAS100", "US500", "XAUUSD"]
 
@@ -32,6 +61,18 @@ except ImportError:
     START_DATE_NY = datetime(2021, 1, 1)
     END_DATE_NY   = datetime(2025, 11, 21)
 
+# Output-Ordner
+# 1. DATA_DIR für die Phase-Pipeline (Phase 0b/1)
+DATA_DIR = "data"
+# 2. CHARTING_DIR für den direkten JSON-Input
+CHARTING_DIR = "charting"
+# 3. Watermarks für den inkrementellen Modus
+WATERMARK_DIR = os.path.join(DATA_DIR, "watermarks")
+
+# Bei Änderungen an Aggregation/Session-Logik oder Output-Format hochzählen,
+# damit bestehende Outputs einmal komplett neu gebaut werden.
+WATERMARK_VERSION = 3
+
 # Local time (GMT+1) -> NY (GMT-5) = -6 Stunden
 LOCAL_TO_NY_OFFSET_HOURS = 6
 
@@ -39,6 +80,86 @@ LOCAL_TO_NY_OFFSET_HOURS = 6
 # LOAD M1 CSV & CONVERT TO NY TIME
 # ---------------------------------
 
+def parse_m1_csv(filepath: str) -> pd.DataFrame:
+    """
+    Parst eine komplette Dukascopy-M1-CSV (ein Symbol, ein Jahr) ohne
+    Zeitraum-Filter: 'Local time' -> UTC -> naive NY-Zeit als Index,
+    Spalten open/high/low/close/tick_volume, nach Zeit sortiert.
+    """
+    df_year = pd.read_csv(filepath)
+
+    if "Local time" not in df_year.columns:
+        raise ValueError(f"'Local time' column not found in {filepath}")
+
+    # Beispiel-Formate:
+    # 31.12.2024 23:00:00.000 GMT+0100
+    # 15.07.2025 10:15:00.000 GMT+0200
+    #
+    # Fester Spalten-Parser (dukascopy_time): Tag/Monat/Jahr/Zeit/Offset
+    # werden direkt aus den festen Positionen in int64-ns gelesen, der
+    # GMT-Offset arithmetisch abgezogen -> UTC. Zeilen mit abweichendem
+    # Format laufen über den generischen pandas-Parser, ungültige fallen raus.
+    utc_ns, valid = parse_local_time(df_year["Local time"].to_numpy(), apply_offset=True)
+
+    # ungültige Zeiten droppen
+    df_year = df_year.loc[valid]
+    time_utc = pd.DatetimeIndex(utc_ns[valid], tz="UTC")
+
+    # UTC -> New York (inkl. aller DST-Übergänge)
+    time_ny_aware = time_utc.tz_convert("America/New_York")
+
+    # Zeitzone droppen, damit wir im Rest der Pipeline mit naiven NY-Zeiten arbeiten
+    df_year["time_ny"] = time_ny_aware.tz_localize(None)
+
+    # Spalten-Namen ins gewohnte Schema mappen
+    rename_map = {
+        "Open": "open",
+        "High": "high",
+        "Low": "low",
+        "Close": "close",
+        "Volume": "tick_volume",
+    }
+    for col in rename_map.keys():
+        if col not in df_year.columns:
+            raise ValueError(f"Column '{col}' not found in {filepath}")
+
+    df_year = df_year.rename(columns=rename_map)
+
+    # Index = NY-Zeit (stabil sortiert, damit Duplikate deterministisch bleiben)
+    df_year = df_year.set_index("time_ny").sort_index(kind="mergesort")
+    df_year.index.name = "time_ny"
+
+    # Nur relevante Spalten behalten
+    return df_year[["open", "high", "low", "close", "tick_volume"]]
+
+
+def load_m1_year(filepath: str) -> pd.DataFrame:
+    """
+    Wie parse_m1_csv, aber über den Binär-Cache (m1_cache):
+      - gültiger Cache -> Spalten memory-mapped laden, kein CSV-Parse
+      - sonst CSV parsen und Cache (neu) schreiben
+    """
+    if USE_M1_CACHE:
+        arrays = load_cached_arrays(filepath)
+        if arrays is not None:
+            print(f"  Reading {filepath} (cached) ...")
+            index = pd.DatetimeIndex(arrays["time_ny"].view("datetime64[ns]"), name="time_ny")
+            return pd.DataFrame(
+                {col: arrays[col] for col in ["open", "high", "low", "close", "tick_volume"]},
+                index=index,
+            )
+
+    print(f"  Reading {filepath} ...")
+    df_year = parse_m1_csv(filepath)
+
+    if USE_M1_CACHE:
+        arrays = {col: df_year[col].to_numpy(dtype="float64") for col in df_year.columns}
+        arrays["time_ny"] = df_year.index.values.astype("datetime64[ns]").view("int64")
+        save_cached_arrays(filepath, arrays)
+
+    return df_year
+
+
 def load_m1_data_for_symbol(symbol: str,
                             start_ny: datetime,
                             end_ny: datetime) -> pd.DataFrame:
@@ -50,6 +171,9 @@ def load_m1_data_for_symbol(symbol: str,
     danach nach New York Zeit (America/New_York, inkl. korrekter DST-Übergänge),
     und filtert auf [start_ny, end_ny).
 
+    Bereits geparste Jahres-Dateien kommen aus dem Binär-Cache
+    (siehe load_m1_year / m1_cache.py).
+
     Erwartetes CSV-Format pro Datei:
         Local time,Open,High,Low,Close,Volume
         31.12.2024 23:00:00.000 GMT+0100,1.03526,1.03526,1.03526,1.03526,0
@@ -67,70 +191,21 @@ def load_m1_data_for_symbol(symbol: str,
             print(f"  [WARN] File not found for {symbol}, year {year}: {filepath}")
             continue
 
-        print(f"  Reading {filepath} ...")
-        df_year = pd.read_csv(filepath)
-
-        if "Local time" not in df_year.columns:
-            raise ValueError(f"'Local time' column not found in {filepath}")
-
-        # Beispiel-Formate:
-        # 31.12.2024 23:00:00.000 GMT+0100
-        # 15.07.2025 10:15:00.000 GMT+0200
-        #
-        # Wir schneiden " GMT+0100"/" GMT+0200" nicht einfach weg,
-        # sondern wandeln es in ein Standard-%z-Format um:
-        # "31.12.2024 23:00:00.000 GMT+0100" -> "31.12.2024 23:00:00.000 +0100"
-        raw = df_year["Local time"].astype(str)
-        ts = raw.str.replace(" GMT", " ", regex=False)
-
-        # Direkt nach UTC parsen:
-        # - dayfirst=True, weil Format dd.mm.yyyy ...
-        # - utc=True: pandas interpretiert +0100/+0200 korrekt und rechnet nach UTC
-        df_year["time_utc"] = pd.to_datetime(ts, dayfirst=True, utc=True, errors="coerce")
-
-        # ungültige Zeiten droppen
-        df_year = df_year.dropna(subset=["time_utc"])
-
-        # UTC -> New York (inkl. aller DST-Übergänge)
-        time_ny_aware = df_year["time_utc"].dt.tz_convert("America/New_York")
-
-        # Zeitzone droppen, damit wir im Rest der Pipeline mit naiven NY-Zeiten arbeiten
-        df_year["time_ny"] = time_ny_aware.dt.tz_localize(None)
+        df_year = load_m1_year(filepath)
 
         # Auf gewünschten Zeitraum [start_ny, end_ny) filtern
-        mask = (df_year["time_ny"] >= start_ny) & (df_year["time_ny"] < end_ny)
+        mask = (df_year.index >= start_ny) & (df_year.index < end_ny)
         df_year = df_year.loc[mask]
 
         if df_year.empty:
             continue
 
-        # Spalten-Namen ins gewohnte Schema mappen
-        rename_map = {
-            "Open": "open",
-            "High": "high",
-            "Low": "low",
-            "Close": "close",
-            "Volume": "tick_volume",
-        }
-        for col in rename_map.keys():
-            if col not in df_year.columns:
-                raise ValueError(f"Column '{col}' not found in {filepath}")
-
-        df_year = df_year.rename(columns=rename_map)
-
-        # Index = NY-Zeit
-        df_year = df_year.set_index("time_ny").sort_index()
-        df_year.index.name = "time_ny"
-
-        # Nur relevante Spalten behalten
-        df_year = df_year[["open", "high", "low", "close", "tick_volume"]]
-
         dfs.append(df_year)
 
     if not dfs:
         raise RuntimeError(f"No M1 CSV data found for {symbol} in years {list(years)}")
 
-    df_m1 = pd.concat(dfs).sort_index()
+    df_m1 = pd.concat(dfs).sort_index(kind="mergesort")
 
     # Doppelte Time-Indexe raus (falls sich Jahre überlappen)
     df_m1 = df_m1[~df_m1.index.duplicated(keep="first")]
@@ -157,36 +232,20 @@ def aggregate_m1_to_m5(df_m1: pd.DataFrame) -> pd.DataFrame:
       - Index = time_ny (NY-Zeit, naiv)
       - KEINE separate time_server-Spalte mehr.
 
-    spread und real_volume werden auf 0 gesetzt, um das alte Schema grob
-    beizubehalten.
+    spread / real_volume (immer 0) gibt es nicht mehr, siehe schema.py.
     """
     if df_m1.empty:
         raise ValueError("df_m1 is empty in aggregate_m1_to_m5")
 
-    agg_dict = {
-        "open": "first",
-        "high": "max",
-        "low": "min",
-        "close": "last",
-        "tick_volume": "sum",
-    }
-
-    # M1 -> M5 resample
-    df_m5 = df_m1.resample("5T").agg(agg_dict)
-
-    # Zeilen ohne vollständige OHLC droppen
-    df_m5 = df_m5.dropna(subset=["open", "high", "low", "close"])
-
-    # spread / real_volume anlegen für Konsistenz
-    df_m5["spread"] = 0
-    df_m5["real_volume"] = 0
+    # M1 -> M5 über den gemeinsamen Aggregations-Kern (ohlc_aggregation)
+    df_m5 = aggregate_frame(df_m1, ["M5"], volume_col="tick_volume")["M5"]
+    df_m5 = df_m5.set_index("time_ny")
 
     # Index ist bereits time_ny (kommt aus df_m1.index)
     df_m5.index.name = "time_ny"
 
     # Spalten-Reihenfolge ohne time_server
-    df_m5 = df_m5[["open", "high", "low", "close",
-                   "tick_volume", "spread", "real_volume"]]
+    df_m5 = df_m5[["open", "high", "low", "close", "tick_volume"]]
 
     return df_m5
 
@@ -199,7 +258,11 @@ def aggregate_m1_to_m5(df_m1: pd.DataFrame) -> pd.DataFrame:
 def add_session_columns(df: pd.DataFrame) -> pd.DataFrame:
     """
     Add NY-based session information and daily levels to the DataFrame.
-    Assumes index is NY time (time_ny, naiv).
+    Assumes index is NY time (time_ny, naiv), sorted ascending.
+
+    Tages-Kennzahlen laufen über den Session-Kalender (session_calendar):
+    int32 Trading-Tag-IDs, Segment-Reduktionen über die Tages-Blöcke,
+    fehlende London-Werte als float64-NaN.
     """
     df = df.copy()
 
@@ -207,11 +270,10 @@ def add_session_columns(df: pd.DataFrame) -> pd.DataFrame:
     df["minute_ny"] = df.index.minute
 
     # Trading-Tag: 17:00 NY des Vortags bis 16:59 des aktuellen Tages
-    df["date_ny"] = df.index.date
-
-    mask = df["hour_ny"] >= 17
-    if mask.any():
-        df.loc[mask, "date_ny"] = (df.index[mask] + pd.Timedelta(days=1)).date
+    times_ns = df.index.values.astype("datetime64[ns]").view("int64")
+    day_ids = trading_day_ids(times_ns)
+    starts, lengths = day_blocks(day_ids)
+    df["date_ny"] = trading_day_dates(day_ids)
 
     # London Session: 03:00–07:00 NY
     df["is_london_session"] = (
@@ -224,31 +286,22 @@ def add_session_columns(df: pd.DataFrame) -> pd.DataFrame:
         ((df["hour_ny"] > 9) & (df["hour_ny"] < 11))
     )
 
-    # Day High/Low pro NY-Kalendertag
-    df["day_high"] = df.groupby("date_ny")["high"].transform("max")
-    df["day_low"] = df.groupby("date_ny")["low"].transform("min")
+    high = df["high"].to_numpy(dtype="float64")
+    low = df["low"].to_numpy(dtype="float64")
+    london_mask = df["is_london_session"].to_numpy()
 
-    # London High/Low zuerst nur auf London-Bars berechnen
-    df["london_high_raw"] = pd.NA
-    df["london_low_raw"] = pd.NA
+    # Day High/Low pro Trading-Tag
+    df["day_high"] = broadcast_blocks(block_max(high, starts), lengths)
+    df["day_low"] = broadcast_blocks(block_min(low, starts), lengths)
 
-    london_mask = df["is_london_session"]
+    # London High/Low nur über die London-Bars des Tages (NaN ohne London-Bars)
+    london_high = broadcast_blocks(block_max(high, starts, london_mask), lengths)
+    london_low = broadcast_blocks(block_min(low, starts, london_mask), lengths)
 
-    if london_mask.any():
-        df.loc[london_mask, "london_high_raw"] = (
-            df.loc[london_mask]
-            .groupby("date_ny")["high"]
-            .transform("max")
-        )
-        df.loc[london_mask, "london_low_raw"] = (
-            df.loc[london_mask]
-            .groupby("date_ny")["low"]
-            .transform("min")
-        )
-
-    # London-Werte innerhalb des Tages ausrollen (ffill/bfill pro Tag)
-    df["london_high"] = df.groupby("date_ny")["london_high_raw"].ffill().bfill()
-    df["london_low"] = df.groupby("date_ny")["london_low_raw"].ffill().bfill()
+    # Auf den ganzen Tag ausgerollt – strikt pro Tag, Tage ohne London-Bars
+    # bleiben NaN (kein Durchreichen vom Folgetag)
+    df["london_high"] = london_high
+    df["london_low"] = london_low
 
     # Flag, ob an dem Tag überhaupt eine London-Range existiert
     df["has_london_range"] = df["london_high"].notna() & df["london_low"].notna()
@@ -262,20 +315,304 @@ def add_session_columns(df: pd.DataFrame) -> pd.DataFrame:
 
 def build_symbol_dataset(symbol: str,
                          start_ny: datetime,
-                         end_ny: datetime) -> pd.DataFrame:
+                         end_ny: datetime):
     """
     Full pipeline for a single symbol:
     - M1-CSV-Daten laden
     - auf NY-Zeit bringen und Zeitraum filtern
     - zu M5 aggregieren
-    - Session & Level Columns hinzufügen
+    - Session & Level Columns hinzufügen (Bar-Schema)
+
+    Rückgabe: (df_m1, df_feat); df_feat ist None, wenn keine M1-Daten im Zeitraum liegen.
     """
-    print(f"\n=== Building dataset for {symbol} ===")
     df_m1 = load_m1_data_for_symbol(symbol, start_ny, end_ny)
+    if df_m1.empty:
+        return df_m1, None
     df_m5 = aggregate_m1_to_m5(df_m1)
     df_feat = add_session_columns(df_m5)
     df_feat["symbol"] = symbol
-    return df_feat
+    enforce_bar_schema(df_feat)
+    return df_m1, df_feat
+
+
+# ---------------------------------
+# OUTPUT-FORMATE
+# ---------------------------------
+
+def build_m1_chart_frame(df_m1: pd.DataFrame) -> pd.DataFrame:
+    """M1-Rohdaten im Dukascopy-Schema für den Chart-Feed (*_M1_raw_for_json.csv)."""
+    df_m1_chart = df_m1.copy()
+
+    df_m1_chart = df_m1_chart.rename(
+        columns={
+            "open": "Open",
+            "high": "High",
+            "low": "Low",
+            "close": "Close",
+            "tick_volume": "Volume",
+        }
+    )
+
+    # Zeit als String formatieren für CSV
+    local_time_str = df_m1_chart.index.strftime("%d.%m.%Y %H:%M:%S.%f").str[:-3]
+    df_m1_chart.insert(0, "Local time", local_time_str)
+    return df_m1_chart
+
+
+def write_csv_with_cut(df: pd.DataFrame,
+                       path: str,
+                       cut_pos: int,
+                       index: bool,
+                       append_at=None):
+    """
+    Schreibt df als CSV (Format wie df.to_csv(path)) und merkt sich den
+    Byte-Offset der Zeile cut_pos – dort setzt der nächste inkrementelle
+    Lauf an.
+
+    append_at=None -> Datei neu schreiben (mit Header)
+    append_at=int  -> Datei ab diesem Byte abschneiden, df ohne Header anhängen
+
+    Rückgabe: (cut_offset, file_size)
+    """
+    if append_at is None:
+        f = open(path, "w", newline="")
+    else:
+        f = open(path, "r+", newline="")
+        f.seek(append_at)
+        f.truncate()
+
+    with f:
+        header = append_at is None
+        head = df.iloc[:cut_pos]
+        if header or len(head):
+            head.to_csv(f, index=index, header=header)
+        f.flush()
+        cut_offset = f.tell()
+        tail = df.iloc[cut_pos:]
+        if len(tail):
+            tail.to_csv(f, index=index, header=False)
+        f.flush()
+        size = f.tell()
+
+    return cut_offset, size
+
+
+def write_m1_chart_feed(symbol: str, df_m1: pd.DataFrame) -> str:
+    """Schreibt nur den M1-Chart-Feed komplett neu (Fused-Modus in Phase 0b)."""
+    out_m1 = os.path.join(CHARTING_DIR, f"{symbol}_M1_raw_for_json.csv")
+    build_m1_chart_frame(df_m1).to_csv(out_m1, index=False)
+    print(f"  Saved M1 Raw for JSON: {out_m1}")
+    return out_m1
+
+
+def discard_phase0_csv(symbol: str) -> None:
+    """
+    Entfernt data_{symbol}_M5_phase0.csv + Watermark, wenn der Fused-Modus
+    die Pipeline ohne dieses Zwischen-File gebaut hat (sonst würde ein
+    späterer Lauf an einen veralteten Stand anhängen bzw. ihn lesen).
+    """
+    remove_watermark(symbol)
+    out_m5 = os.path.join(DATA_DIR, f"data_{symbol}_M5_phase0.csv")
+    if os.path.exists(out_m5):
+        os.remove(out_m5)
+        print(f"  Removed stale intermediate file: {out_m5}")
+
+
+# ---------------------------------
+# INKREMENTELLER MODUS (WATERMARKS)
+# ---------------------------------
+
+def trading_day_start(date_ny) -> pd.Timestamp:
+    """Beginn des Trading-Tags date_ny: 17:00 NY des Vortags."""
+    return pd.Timestamp(date_ny) - pd.Timedelta(hours=7)
+
+
+def find_reprocess_start(df_feat: pd.DataFrame) -> pd.Timestamp:
+    """
+    Ab welchem Zeitpunkt muss ein Folge-Lauf neu rechnen?
+
+    Alle Session-Kennzahlen sind strikt pro Trading-Tag (add_session_columns),
+    daher reicht der letzte Trading-Tag: er kann unvollständig sein, d.h.
+    day_high/day_low und London-Range ändern sich mit neuen Bars.
+    """
+    return trading_day_start(df_feat["date_ny"].iloc[-1])
+
+
+def watermark_path(symbol: str) -> str:
+    return os.path.join(WATERMARK_DIR, f"{symbol}_phase0a.json")
+
+
+def load_watermark(symbol: str):
+    path = watermark_path(symbol)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"  [WARN] Could not read watermark {path}: {e}")
+        return None
+
+
+def save_watermark(symbol: str, watermark: dict) -> None:
+    os.makedirs(WATERMARK_DIR, exist_ok=True)
+    path = watermark_path(symbol)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(watermark, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def remove_watermark(symbol: str) -> None:
+    path = watermark_path(symbol)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def source_signatures(symbol: str, before_year: int) -> dict:
+    """
+    Signaturen der M1-Jahresdateien, die komplett VOR dem Neu-Rechen-Bereich
+    liegen. Ändert sich eine davon, ist der gespeicherte Output veraltet.
+    """
+    signatures = {}
+    for year in range(START_DATE_NY.year, before_year):
+        filename = CSV_FILENAME_TEMPLATE.format(symbol=symbol, year=year)
+        filepath = os.path.join(CSV_DIR, filename)
+        if os.path.exists(filepath):
+            signatures[filename] = file_signature(filepath)
+    return signatures
+
+
+def check_watermark(symbol: str, watermark: dict):
+    """Liefert None, wenn inkrementell weitergemacht werden kann, sonst den Grund."""
+    if watermark.get("version") != WATERMARK_VERSION:
+        return "watermark version changed"
+    if watermark.get("start_ny") != pd.Timestamp(START_DATE_NY).isoformat():
+        return "START_DATE changed"
+    if pd.Timestamp(END_DATE_NY) < pd.Timestamp(watermark["end_ny"]):
+        return "END_DATE moved backwards"
+
+    for key in ("m5", "m1"):
+        out = watermark["outputs"][key]
+        if not os.path.exists(out["path"]):
+            return f"output missing ({out['path']})"
+        if os.path.getsize(out["path"]) != out["size"]:
+            return f"output modified ({out['path']})"
+
+    reprocess_from = pd.Timestamp(watermark["reprocess_from_ny"])
+    if source_signatures(symbol, reprocess_from.year) != watermark["sources"]:
+        return "historical M1 files changed"
+    return None
+
+
+def write_phase0a_outputs(symbol: str,
+                          df_m1: pd.DataFrame,
+                          df_feat: pd.DataFrame,
+                          watermark=None) -> None:
+    """
+    Schreibt M5-Phase0-File und M1-Chart-Feed.
+
+    watermark=None -> beide Dateien komplett neu
+    sonst          -> df_m1/df_feat sind nur der Neu-Rechen-Bereich und
+                      werden ab den gespeicherten Offsets angehängt
+    Danach wird der Watermark für den nächsten Lauf geschrieben.
+    """
+    out_m5 = os.path.join(DATA_DIR, f"data_{symbol}_M5_phase0.csv")
+    # NEUER NAME: (symbol)_M1_raw_for_json.csv
+    out_m1 = os.path.join(CHARTING_DIR, f"{symbol}_M1_raw_for_json.csv")
+
+    append_m5 = None if watermark is None else watermark["outputs"]["m5"]["offset"]
+    append_m1 = None if watermark is None else watermark["outputs"]["m1"]["offset"]
+
+    # Watermark vorab entfernen: bricht der Lauf ab, wird beim nächsten Mal
+    # komplett neu gebaut statt an halb geschriebene Dateien anzuhängen.
+    remove_watermark(symbol)
+
+    reprocess_from = find_reprocess_start(df_feat)
+    cut_m5 = int(df_feat.index.searchsorted(reprocess_from, side="left"))
+    cut_m1 = int(df_m1.index.searchsorted(reprocess_from, side="left"))
+
+    # 2a) M5-Phase0-Output speichern -> IN DATA ORDNER (Pipeline-Basis)
+    offset_m5, size_m5 = write_csv_with_cut(df_feat, out_m5, cut_m5, index=True, append_at=append_m5)
+    print(f"  Saved M5 phase0 file: {out_m5}")
+
+    # 3) M1-Rohdaten als Chart-Feed speichern -> DIREKT NACH CHARTING (Neuer Name)
+    df_m1_chart = build_m1_chart_frame(df_m1)
+    offset_m1, size_m1 = write_csv_with_cut(df_m1_chart, out_m1, cut_m1, index=False, append_at=append_m1)
+    print(f"  Saved M1 Raw for JSON: {out_m1}")
+
+    save_watermark(symbol, {
+        "version": WATERMARK_VERSION,
+        "symbol": symbol,
+        "start_ny": pd.Timestamp(START_DATE_NY).isoformat(),
+        "end_ny": pd.Timestamp(END_DATE_NY).isoformat(),
+        "last_time_ny": df_m1.index[-1].isoformat(),
+        "reprocess_from_ny": reprocess_from.isoformat(),
+        "m1_rows_from": len(df_m1) - cut_m1,
+        "outputs": {
+            "m5": {"path": out_m5, "offset": offset_m5, "size": size_m5},
+            "m1": {"path": out_m1, "offset": offset_m1, "size": size_m1},
+        },
+        "sources": source_signatures(symbol, reprocess_from.year),
+    })
+    print(f"  Watermark: last bar {df_m1.index[-1]}, next run restarts at {reprocess_from}")
+
+
+def run_phase0a_incremental(symbol: str, watermark: dict) -> bool:
+    """
+    Inkrementeller Lauf ab dem Watermark.
+    Rückgabe False -> nicht möglich, Aufrufer baut komplett neu.
+    """
+    reason = check_watermark(symbol, watermark)
+    if reason is not None:
+        print(f"  [INCREMENTAL] {reason} -> full rebuild")
+        return False
+
+    reprocess_from = pd.Timestamp(watermark["reprocess_from_ny"])
+    print(f"  [INCREMENTAL] Reprocessing from {reprocess_from} (last bar {watermark['last_time_ny']})")
+
+    # 1) Nur M1-Bars ab Beginn des ersten betroffenen Trading-Tags laden
+    try:
+        df_m1 = load_m1_data_for_symbol(symbol, reprocess_from.to_pydatetime(), END_DATE_NY)
+    except RuntimeError as e:
+        print(f"  [INCREMENTAL] {e} -> full rebuild")
+        return False
+
+    if (len(df_m1) == watermark["m1_rows_from"]
+            and df_m1.index[-1] == pd.Timestamp(watermark["last_time_ny"])):
+        print(f"  [INCREMENTAL] No new M1 bars for {symbol}, outputs are up to date.")
+        return True
+
+    # 2) Nur die betroffenen Trading-Tage aggregieren und anreichern
+    df_m5 = aggregate_m1_to_m5(df_m1)
+    df_feat = add_session_columns(df_m5)
+    df_feat["symbol"] = symbol
+    enforce_bar_schema(df_feat)
+
+    write_phase0a_outputs(symbol, df_m1, df_feat, watermark=watermark)
+    return True
+
+
+# ---------------------------------
+# PHASE 0a PRO SYMBOL
+# ---------------------------------
+
+def run_phase0a_for_symbol(symbol: str) -> None:
+    print(f"\n=== Phase 0 for {symbol} ===")
+
+    if INCREMENTAL_MODE:
+        watermark = load_watermark(symbol)
+        if watermark is not None and run_phase0a_incremental(symbol, watermark):
+            return
+
+    # 1) M1 laden, M5 aggregieren und Session-Columns hinzufügen (für Pipeline)
+    df_m1, df_feat = build_symbol_dataset(symbol, START_DATE_NY, END_DATE_NY)
+    if df_feat is None:
+        print(f"  [WARN] No M1 data for {symbol} in range, skipping.")
+        return
+
+    # 3) M5-Phase0-File + M1-Chart-Feed schreiben (inkl. Watermark)
+    write_phase0a_outputs(symbol, df_m1, df_feat)
 
 
 # ---------------------------------
@@ -283,61 +620,13 @@ def build_symbol_dataset(symbol: str,
 # ---------------------------------
 
 def main():
-    # Output-Ordner definieren
-    # 1. DATA_DIR für die Phase-Pipeline (bleibt wie besprochen für Phase 0b/1)
-    DATA_DIR = "data"
-    if not os.path.exists(DATA_DIR):
-        os.makedirs(DATA_DIR)
-
-    # 2. CHARTING_DIR für den direkten JSON-Input
-    CHARTING_DIR = "charting"
-    if not os.path.exists(CHARTING_DIR):
-        os.makedirs(CHARTING_DIR)
-
-    for symbol in SYMBOLS:
-        print(f"\n=== Phase 0 for {symbol} ===")
-
-        # 1) M1-Rohdaten laden und in NY-Zeit bringen
-        df_m1 = load_m1_data_for_symbol(symbol, START_DATE_NY, END_DATE_NY)
-        if df_m1.empty:
-            print(f"  [WARN] No M1 data for {symbol} in range, skipping.")
-            continue
+    # Output-Ordner anlegen (vor dem Pool, damit Worker nicht konkurrieren)
+    os.makedirs(DATA_DIR, exist_ok=True)
+    os.makedirs(CHARTING_DIR, exist_ok=True)
 
-        # 2) M1 -> M5 aggregieren und Session-Columns hinzufügen (für Pipeline)
-        df_m5 = aggregate_m1_to_m5(df_m1)
-        df_feat = add_session_columns(df_m5)
-        df_feat["symbol"] = symbol
-
-        # 2a) M5-Phase0-Output speichern -> IN DATA ORDNER (Pipeline-Basis)
-        filename_m5 = f"data_{symbol}_M5_phase0.csv"
-        out_m5 = os.path.join(DATA_DIR, filename_m5)
-        
-        df_feat.to_csv(out_m5, index=True)
-        print(f"  Saved M5 phase0 file: {out_m5}")
-
-        # 3) M1-Rohdaten als Chart-Feed speichern -> DIREKT NACH CHARTING (Neuer Name)
-        df_m1_chart = df_m1.copy()
-
-        df_m1_chart = df_m1_chart.rename(
-            columns={
-                "open": "Open",
-                "high": "High",
-                "low": "Low",
-                "close": "Close",
-                "tick_volume": "Volume",
-            }
-        )
-
-        # Zeit als String formatieren für CSV
-        local_time_str = df_m1_chart.index.strftime("%d.%m.%Y %H:%M:%S.%f").str[:-3]
-        df_m1_chart.insert(0, "Local time", local_time_str)
-
-        # NEUER NAME: (symbol)_M1_raw_for_json.csv
-        filename_m1 = f"{symbol}_M1_raw_for_json.csv"
-        out_m1 = os.path.join(CHARTING_DIR, filename_m1)
-        
-        df_m1_chart.to_csv(out_m1, index=False)
-        print(f"  Saved M1 Raw for JSON: {out_m1}")
+    # Symbole parallel verarbeiten (symbol_runner)
+    results = run_for_symbols(run_phase0a_for_symbol, SYMBOLS)
+    print_summary(results, "Phase 0a")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,7 +1,18 @@
 import os
 import pandas as pd
 import json  # <--- NEU
-from config import PIP_SIZE_MAP # <--- NEU (wird für Pips-Berechnung benötigt)
+from phase0a_data_prep import (
+    CHARTING_DIR,
+    END_DATE_NY,
+    START_DATE_NY,
+    build_symbol_dataset,
+    discard_phase0_csv,
+    write_m1_chart_feed,
+)
+from schema import read_bars_csv
+from storage import write_bars
+from symbol_runner import print_summary, run_for_symbols
+from vola_store import avg_range_pips, update_day_ranges
 
 # ---------------------------------
 # CONFIG
@@ -13,6 +24,14 @@ SYMBOLS = ["AUDUSD", "NZDUSD", "USDCAD", "USDCHF", "USDJPY", "GBPJPY", "EURGBP",
 # Pfade
 DATA_DIR = "data"
 
+# Fused-Modus: Phase 0a + 0b in einem Lauf pro Symbol. Der M5-Frame aus
+# build_symbol_dataset geht direkt im Speicher durch add_hod_lod_flags und
+# die Session-Range-Berechnung; gespeichert werden nur die End-Artefakte
+# (Enriched-Dataset, M1-Chart-Feed, Vola-Files), kein data_{symbol}_M5_phase0.csv.
+# Immer Voll-Aufbau (der inkrementelle Modus von Phase 0a braucht das CSV).
+# False -> Phase 0b liest wie bisher den Output von Phase 0a.
+FUSED_MODE = False
+
 
 # ---------------------------------
 # LOAD & ENRICH
@@ -21,14 +40,10 @@ DATA_DIR = "data"
 def load_data(path: str) -> pd.DataFrame:
     print(f"Loading {path} ...")
 
-    # Einfach normal laden
-    df = pd.read_csv(path)
+    # Laden im Bar-Schema (schema.py); time_ny wird dabei zum Index
+    df = read_bars_csv(path)
 
-    # time_ny wieder zum Index machen (so hieß der Index im Original)
-    if "time_ny" in df.columns:
-        df["time_ny"] = pd.to_datetime(df["time_ny"])
-        df = df.set_index("time_ny")
-    else:
+    if df.index.name != "time_ny":
         # Fallback: time_utc benutzen
         if "time_utc" in df.columns:
             df["time_utc"] = pd.to_datetime(df["time_utc"])
@@ -90,8 +105,8 @@ def add_hod_lod_flags(df: pd.DataFrame) -> pd.DataFrame:
     # -----------------------------
     # Day-High/Day-Low-Flags
     # -----------------------------
-    df["day_high_running"] = df.groupby(group_cols)["high"].cummax()
-    df["day_low_running"] = df.groupby(group_cols)["low"].cummin()
+    df["day_high_running"] = df.groupby(group_cols, observed=True)["high"].cummax()
+    df["day_low_running"] = df.groupby(group_cols, observed=True)["low"].cummin()
 
     df["is_day_high_bar"] = df["high"] == df["day_high_running"]
     df["is_day_low_bar"] = df["low"] == df["day_low_running"]
@@ -124,48 +139,32 @@ def add_hod_lod_flags(df: pd.DataFrame) -> pd.DataFrame:
     df["has_broken_london_low"] = False
 
     if {"london_high", "london_low", "has_london_range"}.issubset(df.columns):
-
-        def _compute_london_breaks(g: pd.DataFrame) -> pd.DataFrame:
-            """
-            Wird pro (symbol, date_ny) aufgerufen.
-            Setzt has_broken_london_high / has_broken_london_low entsprechend.
-            """
-
-            # Absicherung: hat dieser Tag überhaupt eine London-Range?
-            has_range = g["has_london_range"].fillna(False)
-            if not has_range.any():
-                # Kein London-Range an diesem Tag -> alles False lassen
-                g["has_broken_london_high"] = False
-                g["has_broken_london_low"] = False
-                return g
-
-            hour = g["hour_ny"]
-
-            # Nur zwischen 07:00 und vor 17:00 NY dürfen Breaks auftreten
-            # (Daily Open 17:00 NY des Vortags bis < 07:00 NY = immer False)
-            in_eval_window = (hour >= 7) & (hour < 17)
-
-            # Bedingung: Kerze bricht London High / Low
-            # (>= / <=, damit ein genaues Antippen auch als "gebrochen" gilt)
-            cond_break_high = (
-                has_range
-                & in_eval_window
-                & (g["high"] >= g["london_high"])
-            )
-            cond_break_low = (
-                has_range
-                & in_eval_window
-                & (g["low"] <= g["london_low"])
-            )
-
-            # Running OR via cumsum:
-            # False False False True True True ...
-            g["has_broken_london_high"] = cond_break_high.cumsum().astype(bool)
-            g["has_broken_london_low"] = cond_break_low.cumsum().astype(bool)
-
-            return g
-
-        df = df.groupby(group_cols, group_keys=False).apply(_compute_london_breaks)
+        # Ein gruppierter Kernel statt groupby().apply() pro Tag:
+        # Break-Bedingung je Kerze, dann laufendes OR pro (symbol, date_ny)
+        # als gruppiertes cummax.
+        has_range = df["has_london_range"].fillna(False).astype(bool)
+        hour = df["hour_ny"]
+
+        # Nur zwischen 07:00 und vor 17:00 NY dürfen Breaks auftreten
+        # (Daily Open 17:00 NY des Vortags bis < 07:00 NY = immer False).
+        # Tage ohne London-Range: has_range ist überall False -> alles False.
+        in_eval_window = has_range & (hour >= 7) & (hour < 17)
+
+        # Bedingung: Kerze bricht London High / Low
+        # (>= / <=, damit ein genaues Antippen auch als "gebrochen" gilt;
+        # NaN-Level vergleichen immer False)
+        cond_break_high = in_eval_window & (df["high"] >= df["london_high"])
+        cond_break_low = in_eval_window & (df["low"] <= df["london_low"])
+
+        # Running OR: False False False True True True ...
+        breaks = pd.DataFrame({
+            "high": cond_break_high.astype("int8"),
+            "low": cond_break_low.astype("int8"),
+        }, index=df.index)
+        running = breaks.groupby([df[c] for c in group_cols], observed=True, sort=False).cummax()
+
+        df["has_broken_london_high"] = running["high"].fillna(0).astype(bool)
+        df["has_broken_london_low"] = running["low"].fillna(0).astype(bool)
     else:
         print("Warning: no london_high/london_low/has_london_range columns found. "
               "has_broken_london_high/low stay False.")
@@ -173,31 +172,47 @@ def add_hod_lod_flags(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-def save_data(df: pd.DataFrame, path: str) -> None:
-    print(f"Saving enriched data to {path} ...")
-    df.to_csv(path, index=True)
+def save_data(df: pd.DataFrame, path_base: str) -> None:
+    """path_base: Dataset-Pfad ohne Endung (Format siehe storage.py)."""
+    print(f"Saving enriched data to {path_base} ...")
+    write_bars(df, path_base)
     print("Done.")
 
 # ---------------------------------
 # VOLATILITY RATIO CALCULATION (NY AM SESSION)
 # ---------------------------------
 
-# ---------------------------------
-# VOLATILITY RATIO CALCULATION (NY AM SESSION)
-# ---------------------------------
+def update_session_ranges(symbol: str, df: pd.DataFrame):
+    """
+    Map-Schritt (pro Symbol, läuft im Worker):
+    Session High/Low 08:00-12:00 NY je Tag aus dem M5-Frame (Index time_ny)
+    in den Vola-Store schreiben (vola_store.py, nur die Tage des Frames
+    werden ersetzt) und die durchschnittliche Session-Range in Pips über
+    den Zeitraum des Frames zurückgeben.
+    Returns None if the symbol cannot be evaluated.
+    """
+    if df.empty:
+        print(f"Warning: No NY AM data for {symbol}.")
+        return None
+
+    update_day_ranges(symbol, df)
+    avg_range = avg_range_pips(symbol, start=df.index[0], end=df.index[-1] + pd.Timedelta(days=1))
+    if avg_range is None:
+        print(f"Warning: No NY AM data for {symbol}.")
+        return None
+
+    print(f"  {symbol}: Avg Session Range = {avg_range:.2f} pips")
+    return avg_range
 
-# ---------------------------------
-# VOLATILITY RATIO CALCULATION (NY AM SESSION)
-# ---------------------------------
 
-def calculate_and_save_volatility_ratios():
+def calculate_and_save_volatility_ratios(new_ranges_pips: dict):
     """
-    Calculates the average session range (Session High - Session Low) in Pips
-    between 08:00 and 12:00 NY Time.
+    Reduce-Schritt (einmal im Hauptprozess, nach dem Symbol-Pool):
     
     UPDATED LOGIC for incremental updates:
     1. Loads existing raw ranges from 'volatility_raw_ranges_NY.json'.
-    2. Updates/Adds the currently processed SYMBOLS.
+    2. Updates/Adds the ranges of the currently processed SYMBOLS
+       (new_ranges_pips = {symbol: avg range pips} from the map step).
     3. Saves the raw ranges back to disk.
     4. Calculates Ratios relative to EURUSD based on the UPDATED full list.
     5. Saves 'volatility_ratios_NY.json'.
@@ -219,59 +234,11 @@ def calculate_and_save_volatility_ratios():
             print(f"WARN: Could not read existing raw ranges: {e}. Starting fresh.")
             avg_ranges_pips = {}
 
-    # 2. Calculate/Update ranges for CURRENT symbols
-    current_run_symbols = []
-    
-    for symbol in SYMBOLS:
-        input_filename = f"data_{symbol}_M5_phase0.csv"
-        input_file = os.path.join(DATA_DIR, input_filename)
-        
-        if not os.path.exists(input_file):
-            print(f"Skipping {symbol} for vola calc: File not found.")
-            continue
-            
-        pip_size = PIP_SIZE_MAP.get(symbol, 0.0001)
-        
-        # Load data (Robust loading)
-        try:
-            # Try loading only necessary columns first
-            df = pd.read_csv(input_file, usecols=["time_ny", "high", "low"])
-        except ValueError:
-            # Fallback if columns don't match exactly
-            df = pd.read_csv(input_file)
-            
-        if "time_ny" not in df.columns:
-            print(f"Skipping {symbol}: No 'time_ny' column.")
-            continue
-            
-        df["time_ny"] = pd.to_datetime(df["time_ny"])
-        
-        # Filter: Only 08:00 to 11:55 (Candles within the 8-12 window)
-        mask_ny_am = df["time_ny"].dt.hour.isin([8, 9, 10, 11])
-        df_session = df.loc[mask_ny_am].copy()
-        
-        if df_session.empty:
-            print(f"Warning: No NY AM data for {symbol}.")
+    # 2. Update ranges for CURRENT symbols (in SYMBOLS order)
+    for symbol, avg_range in new_ranges_pips.items():
+        if avg_range is None:
             continue
-        
-        # Calculate Session Range (Max High - Min Low per Day)
-        df_session["date_temp"] = df_session["time_ny"].dt.date
-        
-        daily_session_stats = df_session.groupby("date_temp").agg({
-            "high": "max",
-            "low": "min"
-        })
-        
-        # Calculate range per day in pips
-        daily_ranges = (daily_session_stats["high"] - daily_session_stats["low"]) / pip_size
-        
-        # Average of daily session ranges
-        avg_range = daily_ranges.mean()
-        
-        # Update our "Database"
         avg_ranges_pips[symbol] = avg_range
-        current_run_symbols.append(symbol)
-        print(f"  {symbol}: Avg Session Range = {avg_range:.2f} pips")
 
     # 3. Save updated raw ranges (Persistence step)
     try:
@@ -313,26 +280,62 @@ def calculate_and_save_volatility_ratios():
 # ---------------------------------
 
 def run_phase0b_for_symbol(symbol: str):
+    """
+    Anreicherung + Map-Schritt der Volatilitäts-Analyse für ein Symbol.
+    Rückgabe: durchschnittliche NY-AM-Session-Range in Pips (oder None).
+    """
     print(f"--- Processing Phase 0b for {symbol} ---")
 
     # Dateinamen dynamisch generieren
     input_filename = f"data_{symbol}_M5_phase0.csv"
     input_file = os.path.join(DATA_DIR, input_filename)
 
-    output_filename = f"data_{symbol}_M5_phase0_enriched.csv"
-    output_file = os.path.join(DATA_DIR, output_filename)
+    # Output-Dataset (Format siehe storage.py / STORAGE_FORMAT)
+    output_name = f"data_{symbol}_M5_phase0_enriched"
+    output_file = os.path.join(DATA_DIR, output_name)
 
     # Check ob Input existiert
     if not os.path.exists(input_file):
         print(f"Skipping {symbol}: Input file not found ({input_file})")
-        return
+        print(f"Skipping {symbol} for vola calc: File not found.")
+        return None
 
     # Pipeline ausführen
     df = load_data(input_file)
     df_enriched = add_hod_lod_flags(df)
     save_data(df_enriched, output_file)
+
+    avg_range = update_session_ranges(symbol, df_enriched)
     
     print(f"Done for {symbol}.\n")
+    return avg_range
+
+
+def run_phase0_fused_for_symbol(symbol: str):
+    """
+    Fused-Modus (FUSED_MODE): Phase 0a + 0b für ein Symbol im Speicher.
+    Rückgabe wie run_phase0b_for_symbol (NY-AM-Session-Range in Pips oder None).
+    """
+    print(f"--- Processing Phase 0a+0b (fused) for {symbol} ---")
+
+    df_m1, df_feat = build_symbol_dataset(symbol, START_DATE_NY, END_DATE_NY)
+    if df_feat is None:
+        print(f"Skipping {symbol}: No M1 data in range.")
+        return None
+
+    # M1-Chart-Feed ist ein End-Artefakt (Viewer), das Phase0-CSV nicht
+    write_m1_chart_feed(symbol, df_m1)
+    del df_m1
+    discard_phase0_csv(symbol)
+
+    df_enriched = add_hod_lod_flags(df_feat)
+    del df_feat
+    save_data(df_enriched, os.path.join(DATA_DIR, f"data_{symbol}_M5_phase0_enriched"))
+
+    avg_range = update_session_ranges(symbol, df_enriched)
+
+    print(f"Done for {symbol}.\n")
+    return avg_range
 
 
 # ---------------------------------
@@ -340,12 +343,20 @@ def run_phase0b_for_symbol(symbol: str):
 # ---------------------------------
 
 def main():
-    # 1. Anreichern (wie bisher)
-    for sym in SYMBOLS:
-        run_phase0b_for_symbol(sym)
+    # 1. Anreichern + Session-Ranges pro Symbol (parallel, symbol_runner)
+    if FUSED_MODE:
+        # Output-Ordner vor dem Pool anlegen (Worker konkurrieren sonst)
+        os.makedirs(DATA_DIR, exist_ok=True)
+        os.makedirs(CHARTING_DIR, exist_ok=True)
+        results = run_for_symbols(run_phase0_fused_for_symbol, SYMBOLS)
+        print_summary(results, "Phase 0a+0b (fused)")
+    else:
+        results = run_for_symbols(run_phase0b_for_symbol, SYMBOLS)
+        print_summary(results, "Phase 0b")
         
-    # 2. Volatilitäts-Analyse & Ratio-File erstellen
-    calculate_and_save_volatility_ratios()
+    # 2. Reduce: Volatilitäts-Analyse & Ratio-File erstellen
+    new_ranges = {res.symbol: res.value for res in results if res.ok}
+    calculate_and_save_volatility_ratios(new_ranges)
 
 
 if __name__ == "__main__":
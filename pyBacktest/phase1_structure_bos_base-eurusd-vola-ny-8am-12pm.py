@@ -1,8 +1,20 @@
+import numpy as np
 import pandas as pd
 import os
-import json # <--- NEU
+from dataclasses import dataclass
 from datetime import datetime
 from config import PIP_SIZE_MAP
+from phase_metrics import NO_METRICS, PhaseMetrics
+from range_query import OhlcRangeIndex
+from schema import BAR_SCHEMA
+from storage import dataset_exists, read_bars, write_bars
+from structure_engine import DEFAULT_LAG_BARS, StructureEngine, compare_with_batch, print_comparison
+from structure_shards import ShardSteps, build_structure_sharded, print_boundary_report
+from struct_points import KIND_H, KIND_L, SWING_LABELS, StructPoints, label_code, source_code
+from structure_kernels import (CounterEngulfCandidates, PivotWindows, break_of_structure, choch_extremes,
+                               count_between, pivot_confirmed, swing_label_codes)
+from symbol_runner import print_summary, run_for_symbols
+from vola_store import load_vola_ratio
 
 # ---------------------------------
 # CONFIG
@@ -24,52 +36,68 @@ RIGHT_LOOKFORWARD = 1
 # BASE CONFIG (EURUSD BASELINE)
 # ---------------------------------
 # Diese Werte gelten für EURUSD (Ratio 1.0). 
-# Alle anderen Assets werden basierend auf 'data/volatility_ratios.json' skaliert.
+# Alle anderen Assets werden basierend auf 'data/volatility_ratios_NY.json' skaliert (vola_store.py).
 
 BASE_MIN_SWING_PIPS = 3.0
 BASE_SINGLE_COUNTER_ENGULFING = 4.0
 BASE_CHOCH_PIPS = 1.5
 BASE_SKIP_PIPS = 1.5
 
+# ---------------------------------
+# STREAMING (structure_engine.py)
+# ---------------------------------
+# Nach dem Batch-Lauf die Historie zusätzlich durch die StructureEngine
+# schieben; ausgegebene Bars + Revisionen müssen exakt dem Batch-Ergebnis
+# entsprechen (Revisionsrate wird mit ausgegeben).
+VERIFY_STREAMING = False
+
+# Bestätigungs-Lag in Bars (M5): jede Bar wird nach so vielen Folgebars
+# ausgegeben, spätere Änderungen kommen als "revision"-Event
+STREAM_LAG_BARS = DEFAULT_LAG_BARS
+
+# ---------------------------------
+# SHARDS (structure_shards.py)
+# ---------------------------------
+# Ein Symbol in Zeit-Shards (SHARD_MONTHS Kalendermonate) mit Halo parallel
+# rechnen, Ergebnis exakt wie der Monolith-Lauf. Sinnvoll für lange
+# Historien (M1, viele Jahre) mit wenigen Symbolen und mehreren freien
+# Kernen – mit einem Worker langsamer als der Monolith; der Symbol-Pool und
+# der Shard-Pool teilen sich die Kerne. Messung: python tests/test_structure_shards.py
+SHARDED_MODE = False
+SHARD_MONTHS = 3
+SHARD_HALO_BARS = 2016
+SHARD_WORKERS = None        # None = CPU-/RAM-Limit aus symbol_runner (geteilt durch Symbol-Pool)
+SHARD_VERIFY = False        # zusätzlich Monolith-Lauf, Abweichung -> Fehler (Kontrolle)
+
+# ---------------------------------
+# METRIKEN (phase_metrics.py)
+# ---------------------------------
+# Zeit / CPU / Max-RSS / Punktzahlen je Schritt nach data/metrics/.
+# None = über Umgebungsvariable PYBT_METRICS=1, PYBT_METRICS_MEMORY=1
+# bzw. PYBT_PROFILE=1. MEMORY (tracemalloc) und PROFILE verfälschen die
+# Zeiten -> nur in eigenen Läufen einschalten.
+METRICS_ENABLED = None
+METRICS_MEMORY = None
+METRICS_PROFILE = None
+
 # ---------------------------------
 # Helpers
 # ---------------------------------
 
-def load_vola_ratio(symbol: str) -> float:
-    # Explizit das NY Ratio File laden
-    ratio_file = os.path.join(DATA_DIR, "volatility_ratios_NY.json")
-    
-    if not os.path.exists(ratio_file):
-        print(f"WARN: {ratio_file} not found. Defaulting to 1.0 ratio.")
-        return 1.0
-    
-    try:
-        with open(ratio_file, "r") as f:
-            data = json.load(f)
-        return data.get(symbol, 1.0) # Default 1.0 wenn Symbol neu/unbekannt
-    except Exception as e:
-        print(f"ERROR reading ratio file: {e}. Defaulting to 1.0.")
-        return 1.0
-
-def merge_struct_points(*lists):
+def merge_struct_points(*point_sets) -> StructPoints:
     """
-    Punkte aus mehreren Listen mergen, Duplikate (idx, kind) entfernen.
-    Bei Konflikten gewinnt der mit kleinerem pos.
+    Punkte aus mehreren Sets mergen, Duplikate (pos, kind) entfernen.
+    Bei Konflikten gewinnt das zuerst gemergte Set (struct_points.py).
     """
-    merged = {}
-    for lst in lists:
-        for sp in lst:
-            key = (sp["idx"], sp["kind"])
-            if key not in merged or sp["pos"] < merged[key]["pos"]:
-                merged[key] = sp
-    return list(merged.values())
+    return StructPoints.merge(*point_sets)
 
 
 # ---------------------------------
 # 1) Pivot-basierte Swings + Drop/Spike-Overrides ggü. Vor-Candle
 # ---------------------------------
 
-def detect_struct_points(df: pd.DataFrame, min_swing_price: float, skip_price: float):
+def detect_struct_points(df: pd.DataFrame, min_swing_price: float, skip_price: float,
+                         windows: PivotWindows = None) -> StructPoints:
     """
     Basis-Swings:
       - Pivot-Logik (LEFT_LOOKBACK/RIGHT_LOOKFORWARD) + MIN_SWING_PIPS
@@ -86,99 +114,22 @@ def detect_struct_points(df: pd.DataFrame, min_swing_price: float, skip_price: f
           - max(high[i+1..i+R]) <= high[i] (lokales Hoch nach rechts)
           - i ist KEIN Pivot-H
           => H an i (source='override_prev_spike_H')
+
+    windows: vorberechnete Fenster (StructureContext), sonst hier berechnet.
     """
     print("Detecting base structural points from pivots + prev-candle overrides...")
-    df = df.copy()
-    n = len(df)
-    highs = df["high"].values
-    lows = df["low"].values
-    index = df.index
-
-    L = LEFT_LOOKBACK
-    R = RIGHT_LOOKFORWARD
-
-    points = []
-
-    pivot_low_pos = set()
-    pivot_high_pos = set()
-
-    for i in range(L, n - R):
-        low_val = lows[i]
-        high_val = highs[i]
-
-        # --- LOW PIVOT ---
-        window_lows = lows[i-L:i+R+1]
-        left_high = highs[i-L:i].max() if i - L < i else highs[i-1]
-        right_high = highs[i+1:i+1+R].max() if i + 1 < i + 1 + R <= n else highs[min(i+1, n-1)]
-        depth_min = min(left_high - low_val, right_high - low_val)
-
-        is_low_min = (low_val == window_lows.min())
-        if is_low_min and depth_min >= min_swing_price:
-            points.append({
-                "idx": index[i],
-                "kind": "L",
-                "price": float(low_val),
-                "pos": i,
-                "source": "pivot"
-            })
-            pivot_low_pos.add(i)
-
-        # --- HIGH PIVOT ---
-        window_highs = highs[i-L:i+R+1]
-        left_low = lows[i-L:i].min() if i - L < i else lows[i-1]
-        right_low = lows[i+1:i+1+R].min() if i + 1 < i + 1 + R <= n else lows[min(i+1, n-1)]
-        height_min = min(high_val - left_low, high_val - right_low)
-
-        is_high_max = (high_val == window_highs.max())
-        if is_high_max and height_min >= min_swing_price:
-            points.append({
-                "idx": index[i],
-                "kind": "H",
-                "price": float(high_val),
-                "pos": i,
-                "source": "pivot"
-            })
-            pivot_high_pos.add(i)
-
-    # --- Drop/Spike-Overrides relativ zur vorherigen Kerze ---
-    override_lows = 0
-    override_highs = 0
-
-    for i in range(L, n - R):
-        # Low-Override: starker Drop vs vorige Kerze + lokales Tief nach rechts
-        if i not in pivot_low_pos:
-            prev_low = lows[i-1]
-            drop = prev_low - lows[i]  # positiv, wenn aktuelles Low tiefer ist
-            if drop >= skip_price:
-                right_window = lows[i+1:i+1+R]
-                if len(right_window) > 0 and right_window.min() >= lows[i]:
-                    points.append({
-                        "idx": index[i],
-                        "kind": "L",
-                        "price": float(lows[i]),
-                        "pos": i,
-                        "source": "override_prev_drop_L"
-                    })
-                    override_lows += 1
-
-        # High-Override: starker Spike vs vorige Kerze + lokales Hoch nach rechts
-        if i not in pivot_high_pos:
-            prev_high = highs[i-1]
-            spike = highs[i] - prev_high  # positiv, wenn aktuelles High höher ist
-            if spike >= skip_price:
-                right_window_h = highs[i+1:i+1+R]
-                if len(right_window_h) > 0 and right_window_h.max() <= highs[i]:
-                    points.append({
-                        "idx": index[i],
-                        "kind": "H",
-                        "price": float(highs[i]),
-                        "pos": i,
-                        "source": "override_prev_spike_H"
-                    })
-                    override_highs += 1
-
-    points.sort(key=lambda x: x["pos"])
-    print(f"Base pivot structural points: L={len(pivot_low_pos)}, H={len(pivot_high_pos)}")
+
+    # Masken für alle Bars auf einmal (structure_kernels.py)
+    if windows is None:
+        windows = PivotWindows(
+            df["high"].to_numpy(dtype=float),
+            df["low"].to_numpy(dtype=float),
+            LEFT_LOOKBACK,
+            RIGHT_LOOKFORWARD,
+        )
+    points, n_pivot_l, n_pivot_h, override_lows, override_highs = windows.points(min_swing_price, skip_price)
+
+    print(f"Base pivot structural points: L={n_pivot_l}, H={n_pivot_h}")
     print(f"Prev-candle override points:  L={override_lows}, H={override_highs}")
     print(f"Total structural points from detect_struct_points: {len(points)}")
     return points
@@ -188,90 +139,72 @@ def detect_struct_points(df: pd.DataFrame, min_swing_price: float, skip_price: f
 # 2) Immer L zwischen HH, H zwischen LL (ohne die linke Extrem-Bar)
 # ---------------------------------
 
-def ensure_intermediate_swings(df: pd.DataFrame, struct_points: list):
+def ensure_intermediate_swings(df: pd.DataFrame,
+                               struct_points: StructPoints,
+                               rmq: OhlcRangeIndex = None) -> StructPoints:
     print("Ensuring intermediate swings between HH and LL...")
-    if not struct_points:
-        return []
+    if not len(struct_points):
+        return StructPoints.empty()
 
-    df_index = df.index
-    pos_map = {idx: pos for pos, idx in enumerate(df_index)}
-
-    sps = sorted(struct_points, key=lambda x: x["pos"])
-    existing = {(sp["idx"], sp["kind"]) for sp in sps}
-    additions = []
-
-    for i in range(len(sps) - 1):
-        a = sps[i]
-        b = sps[i+1]
-
-        # Bereich von a.pos (inkl.) bis b.pos (exkl.)
-        start_pos = a["pos"]
-        end_pos = b["pos"]
-
-        if end_pos <= start_pos:
-            continue
-
-        sub = df.iloc[start_pos:end_pos]
-        if sub.empty:
-            continue
-
-        # ------------------------------------------------------
-        # L zwischen zwei H (a.kind == 'H' und b.kind == 'H')
-        # Standard: linke H-Bar NICHT als Low-Kandidat.
-        # Ausnahme: wenn linke H-Bar BEARISH (close < open),
-        #           darf ihr Low als Kandidat mitgezählt werden.
-        # ------------------------------------------------------
-        if a["kind"] == "H" and b["kind"] == "H":
-            sub_for_low = sub
-
-            if sub_for_low.index[0] == a["idx"]:
-                first_row = sub_for_low.iloc[0]
-                # Bearish-Body-Check: nur wenn NICHT bearish, erste Zeile droppen
-                if not (float(first_row["close"]) < float(first_row["open"])):
-                    sub_for_low = sub_for_low.iloc[1:]
-
-            if sub_for_low.empty:
-                continue
-
-            idx_min = sub_for_low["low"].idxmin()
-            if (idx_min, "L") not in existing:
-                additions.append({
-                    "idx": idx_min,
-                    "kind": "L",
-                    "price": float(sub_for_low.loc[idx_min, "low"]),
-                    "pos": pos_map[idx_min],
-                    "source": "intermediate_L_between_HH"
-                })
-                existing.add((idx_min, "L"))
-
-        # ------------------------------------------------------
-        # H zwischen zwei L (a.kind == 'L' und b.kind == 'L')
-        # Standard: linke L-Bar NICHT als High-Kandidat.
-        # Ausnahme: wenn linke L-Bar BULLISH (close > open),
-        #           darf ihr High als Kandidat mitgezählt werden.
-        # ------------------------------------------------------
-        if a["kind"] == "L" and b["kind"] == "L":
-            sub_for_high = sub
-
-            if sub_for_high.index[0] == a["idx"]:
-                first_row = sub_for_high.iloc[0]
-                # Bullish-Body-Check: nur wenn NICHT bullish, erste Zeile droppen
-                if not (float(first_row["close"]) > float(first_row["open"])):
-                    sub_for_high = sub_for_high.iloc[1:]
-
-            if sub_for_high.empty:
-                continue
+    opens = df["open"].values
+    closes = df["close"].values
 
-            idx_max = sub_for_high["high"].idxmax()
-            if (idx_max, "H") not in existing:
-                additions.append({
-                    "idx": idx_max,
-                    "kind": "H",
-                    "price": float(sub_for_high.loc[idx_max, "high"]),
-                    "pos": pos_map[idx_max],
-                    "source": "intermediate_H_between_LL"
-                })
-                existing.add((idx_max, "H"))
+    # Min-Low / Max-High je Bereich in O(1) (range_query.py)
+    if rmq is None:
+        rmq = OhlcRangeIndex.from_frame(df)
+
+    # Alle Paare (a, b) aufeinanderfolgender Punkte gleichzeitig; Bereich
+    # a.pos (inkl.) bis b.pos (exkl.), leere Bereiche (gleiche pos) fallen raus
+    pos = struct_points.pos
+    kind = struct_points.kind
+    start_pos = pos[:-1]
+    end_pos = pos[1:]
+    valid = end_pos > start_pos
+
+    # ------------------------------------------------------
+    # L zwischen zwei H (a.kind == 'H' und b.kind == 'H')
+    # Standard: linke H-Bar NICHT als Low-Kandidat.
+    # Ausnahme: wenn linke H-Bar BEARISH (close < open),
+    #           darf ihr Low als Kandidat mitgezählt werden.
+    # ------------------------------------------------------
+    hh = valid & (kind[:-1] == KIND_H) & (kind[1:] == KIND_H)
+    s_hh = start_pos[hh]
+    first_hh = np.where(closes[s_hh] < opens[s_hh], s_hh, s_hh + 1)
+    pos_min = rmq.low_min.arg_many(first_hh, end_pos[hh])
+
+    # ------------------------------------------------------
+    # H zwischen zwei L (a.kind == 'L' und b.kind == 'L')
+    # Standard: linke L-Bar NICHT als High-Kandidat.
+    # Ausnahme: wenn linke L-Bar BULLISH (close > open),
+    #           darf ihr High als Kandidat mitgezählt werden.
+    # ------------------------------------------------------
+    ll = valid & (kind[:-1] == KIND_L) & (kind[1:] == KIND_L)
+    s_ll = start_pos[ll]
+    first_ll = np.where(closes[s_ll] > opens[s_ll], s_ll, s_ll + 1)
+    pos_max = rmq.high_max.arg_many(first_ll, end_pos[ll])
+
+    # Zurück in Paar-Reihenfolge: jede Ergänzung liegt in [a.pos, b.pos)
+    # ihres Paars -> Paar-Reihenfolge = nach pos sortiert, ohne Duplikate
+    # untereinander. Nur bereits vorhandene (pos, kind) werden übersprungen.
+    cand = np.full(len(start_pos), -1, dtype=np.int64)
+    cand[hh] = pos_min
+    cand[ll] = pos_max
+    cand_kind = np.where(hh, KIND_L, KIND_H).astype(np.int8)
+    found = cand >= 0
+    add_pos = cand[found]
+    add_kind = cand_kind[found]
+    is_new = ~np.isin(add_pos * 2 + add_kind, pos * 2 + kind)
+    add_pos = add_pos[is_new]
+    is_low = add_kind[is_new] == KIND_L
+
+    additions = StructPoints(
+        add_pos,
+        np.where(is_low, KIND_L, KIND_H),
+        np.where(is_low, rmq.lows[add_pos], rmq.highs[add_pos]),
+        np.where(is_low,
+                 source_code("intermediate_L_between_HH"),
+                 source_code("intermediate_H_between_LL")),
+    )
 
     print(f"Intermediate swings added: {len(additions)}")
     return additions
@@ -282,7 +215,7 @@ def ensure_intermediate_swings(df: pd.DataFrame, struct_points: list):
 # 2b) Body-Filter: Struktur nur mit „richtungs-passenden“ Bodies
 # ---------------------------------
 
-def apply_body_filter(df: pd.DataFrame, struct_points: list) -> list:
+def apply_body_filter(df: pd.DataFrame, struct_points: StructPoints) -> StructPoints:
     """
     Filtert Strukturpunkte so, dass:
       - ein L (HL/LL) nur erlaubt ist, wenn seit dem letzten H davor
@@ -296,45 +229,49 @@ def apply_body_filter(df: pd.DataFrame, struct_points: list) -> list:
       - Alle Punkte mit source, die mit 'counter_engulf' beginnen,
         werden ebenfalls ohne Body-Filter akzeptiert.
     """
-    if not struct_points:
-        return []
+    if not len(struct_points):
+        return struct_points
 
-    sps = sorted(struct_points, key=lambda x: x["pos"])
     opens  = df["open"].values
     closes = df["close"].values
 
-    idx_has_L = {sp["idx"] for sp in sps if sp["kind"] == "L"}
-    idx_has_H = {sp["idx"] for sp in sps if sp["kind"] == "H"}
+    # Präfix-Zähler: Anzahl bear/doji- bzw. bull/doji-Candles vor Position p
+    # -> "mind. eine in [ref..pos]" in O(1) statt Segment-Slices
+    bear_or_doji = np.concatenate(([0], np.cumsum(closes <= opens)))
+    bull_or_doji = np.concatenate(([0], np.cumsum(closes >= opens)))
 
-    accepted = []
+    sp_pos = struct_points.pos.tolist()
+    sp_kind = struct_points.kind.tolist()
+    is_engulf = struct_points.source_startswith("counter_engulf").tolist()
+
+    pos_has_L = set(struct_points.pos[struct_points.is_low].tolist())
+    pos_has_H = set(struct_points.pos[struct_points.is_high].tolist())
+
+    accepted = np.zeros(len(struct_points), dtype=bool)
 
     last_H_pos = None
     prev_H_pos = None
     last_L_pos = None
     prev_L_pos = None
 
-    for sp in sps:
-        pos  = sp["pos"]
-        idx  = sp["idx"]
-        kind = sp["kind"]
-        src  = (sp.get("source", "") or "")
+    for k, (pos, kind) in enumerate(zip(sp_pos, sp_kind)):
         accept = True
 
         # --- NEU: alle counter_engulf*-Punkte immer durchlassen ---
-        if src.startswith("counter_engulf"):
-            accepted.append(sp)
-            if kind == "L":
+        if is_engulf[k]:
+            accepted[k] = True
+            if kind == KIND_L:
                 prev_L_pos = last_L_pos
                 last_L_pos = pos
-            elif kind == "H":
+            else:
                 prev_H_pos = last_H_pos
                 last_H_pos = pos
             continue
 
-        if kind == "L":
+        if kind == KIND_L:
             # Sonderfall: auf dieser Candle gibt es auch ein H -> Body-Filter überspringen
-            if idx in idx_has_H:
-                accepted.append(sp)
+            if pos in pos_has_H:
+                accepted[k] = True
                 prev_L_pos = last_L_pos
                 last_L_pos = pos
                 continue
@@ -347,22 +284,20 @@ def apply_body_filter(df: pd.DataFrame, struct_points: list) -> list:
                     ref_H_pos = prev_H_pos
 
             if ref_H_pos is not None and ref_H_pos < pos:
-                segment_opens  = opens[ref_H_pos:pos+1]
-                segment_closes = closes[ref_H_pos:pos+1]
                 # bear oder doji: close <= open
-                has_bear_or_doji = (segment_closes <= segment_opens).any()
+                has_bear_or_doji = bear_or_doji[pos+1] > bear_or_doji[ref_H_pos]
                 if not has_bear_or_doji:
                     accept = False
 
             if accept:
-                accepted.append(sp)
+                accepted[k] = True
                 prev_L_pos = last_L_pos
                 last_L_pos = pos
 
-        elif kind == "H":
+        else:
             # Sonderfall: auf dieser Candle gibt es auch ein L -> Body-Filter überspringen
-            if idx in idx_has_L:
-                accepted.append(sp)
+            if pos in pos_has_L:
+                accepted[k] = True
                 prev_H_pos = last_H_pos
                 last_H_pos = pos
                 continue
@@ -375,26 +310,22 @@ def apply_body_filter(df: pd.DataFrame, struct_points: list) -> list:
                     ref_L_pos = prev_L_pos
 
             if ref_L_pos is not None and ref_L_pos < pos:
-                segment_opens  = opens[ref_L_pos:pos+1]
-                segment_closes = closes[ref_L_pos:pos+1]
                 # bull oder doji: close >= open
-                has_bull_or_doji = (segment_closes >= segment_opens).any()
+                has_bull_or_doji = bull_or_doji[pos+1] > bull_or_doji[ref_L_pos]
                 if not has_bull_or_doji:
                     accept = False
 
             if accept:
-                accepted.append(sp)
+                accepted[k] = True
                 prev_H_pos = last_H_pos
                 last_H_pos = pos
 
-        else:
-            accepted.append(sp)
-
+    filtered = struct_points.filter(accepted)
     print(
         f"Structural points after body filter: "
-        f"{len(accepted)} (vorher: {len(struct_points)})"
+        f"{len(filtered)} (vorher: {len(struct_points)})"
     )
-    return accepted
+    return filtered
 
 
 
@@ -406,9 +337,10 @@ def apply_body_filter(df: pd.DataFrame, struct_points: list) -> list:
 # ---------------------------------
 
 def refine_LH_HL_with_pivot(df: pd.DataFrame,
-                            struct_points: list,
-                            df_swings: pd.DataFrame,
-                            min_swing_price: float) -> list:
+                            struct_points: StructPoints,
+                            labels: np.ndarray,
+                            min_swing_price: float,
+                            rmq: OhlcRangeIndex = None) -> StructPoints:
     """
     Regel:
       - Ein LH, das NICHT zu einem LL führt (bis zum nächsten High-Swing),
@@ -416,118 +348,51 @@ def refine_LH_HL_with_pivot(df: pd.DataFrame,
         sonst wird das High an dieser Stelle entfernt.
       - Ein HL, das NICHT zu einem HH führt (bis zum nächsten Low-Swing),
         muss Pivot-Kriterien erfüllen, sonst wird das Low entfernt.
-    """
-    if not struct_points:
-        return []
 
-    sps = sorted(struct_points, key=lambda x: x["pos"])
+    labels: Label-Codes je Punkt (classify_swing_labels).
+    """
+    if not len(struct_points):
+        return struct_points
 
-    idx_list = list(df.index)
-    idx_to_pos = {idx: i for i, idx in enumerate(idx_list)}
-    highs = df["high"].values
-    lows = df["low"].values
     n = len(df)
 
-    swing_high_label = df_swings["swing_high_label"].to_dict()
-    swing_low_label = df_swings["swing_low_label"].to_dict()
-
-    to_remove_H = set()
-    to_remove_L = set()
-
-    L = LEFT_LOOKBACK
-    R = RIGHT_LOOKFORWARD
-
-    def is_pivot_high(pos: int) -> bool:
-        if pos < L or pos > n - 1 - R:
-            return False
-        h = highs[pos]
-        window_highs = highs[pos-L:pos+R+1]
-        if h != window_highs.max():
-            return False
-        left_low = lows[pos-L:pos].min()
-        right_low = lows[pos+1:pos+1+R].min()
-        height_min = min(h - left_low, h - right_low)
-        return height_min >= min_swing_price
-
-    def is_pivot_low(pos: int) -> bool:
-        if pos < L or pos > n - 1 - R:
-            return False
-        lo = lows[pos]
-        window_lows = lows[pos-L:pos+R+1]
-        if lo != window_lows.min():
-            return False
-        left_high = highs[pos-L:pos].max()
-        right_high = highs[pos+1:pos+1+R].max()
-        depth_min = min(left_high - lo, right_high - lo)
-        return depth_min >= min_swing_price
-
-    high_swing_positions = []
-    low_swing_positions = []
-
-    for idx in idx_list:
-        lbl_h = swing_high_label.get(idx, "")
-        lbl_l = swing_low_label.get(idx, "")
-        pos = idx_to_pos[idx]
-        if lbl_h != "":
-            high_swing_positions.append((pos, idx, lbl_h))
-        if lbl_l != "":
-            low_swing_positions.append((pos, idx, lbl_l))
-
-    # --- LH prüfen: hat kein LL danach -> Pivot nötig ---
-    for pos, idx, lbl in high_swing_positions:
-        if lbl != "LH":
-            continue
-
-        next_high_pos = None
-        for p2, idx2, lbl2 in high_swing_positions:
-            if p2 > pos:
-                next_high_pos = p2
-                break
-
-        end_pos = next_high_pos if next_high_pos is not None else n
-
-        has_LL = False
-        for p_l, idx_l, lbl_l in low_swing_positions:
-            if p_l > pos and p_l < end_pos and lbl_l == "LL":
-                has_LL = True
-                break
-
-        if not has_LL:
-            if not is_pivot_high(pos):
-                to_remove_H.add(idx)
-
-    # --- HL prüfen: hat kein HH danach -> Pivot nötig ---
-    for pos, idx, lbl in low_swing_positions:
-        if lbl != "HL":
-            continue
-
-        next_low_pos = None
-        for p2, idx2, lbl2 in low_swing_positions:
-            if p2 > pos:
-                next_low_pos = p2
-                break
-
-        end_pos = next_low_pos if next_low_pos is not None else n
-
-        has_HH = False
-        for p_h, idx_h, lbl_h in high_swing_positions:
-            if p_h > pos and p_h < end_pos and lbl_h == "HH":
-                has_HH = True
-                break
-
-        if not has_HH:
-            if not is_pivot_low(pos):
-                to_remove_L.add(idx)
-
-    refined = []
-    for sp in sps:
-        if sp["kind"] == "H" and sp["idx"] in to_remove_H:
-            continue
-        if sp["kind"] == "L" and sp["idx"] in to_remove_L:
-            continue
-        refined.append(sp)
+    # Pivot-Fenster über den Range-Index statt Array-Slices
+    if rmq is None:
+        rmq = OhlcRangeIndex.from_frame(df)
+
+    # Swings je Art, nach pos sortiert (pos je Art eindeutig)
+    is_high = struct_points.is_high
+    is_low = struct_points.is_low
+    high_pos, high_lbl = struct_points.pos[is_high], labels[is_high]
+    low_pos, low_lbl = struct_points.pos[is_low], labels[is_low]
+
+    # Positionen der LL / HH für "gibt es eins dazwischen" (searchsorted)
+    ll_pos = low_pos[low_lbl == label_code("LL")]
+    hh_pos = high_pos[high_lbl == label_code("HH")]
+
+    # --- LH prüfen: hat kein LL bis zum nächsten High-Swing -> Pivot nötig ---
+    lh = high_lbl == label_code("LH")
+    next_high_pos = np.append(high_pos[1:], n)[lh]
+    has_LL = count_between(ll_pos, high_pos[lh], next_high_pos) > 0
+    check_H = high_pos[lh][~has_LL]
+    to_remove_H = check_H[~pivot_confirmed(rmq, check_H, LEFT_LOOKBACK, RIGHT_LOOKFORWARD,
+                                           min_swing_price, high=True)]
+
+    # --- HL prüfen: hat kein HH bis zum nächsten Low-Swing -> Pivot nötig ---
+    hl = low_lbl == label_code("HL")
+    next_low_pos = np.append(low_pos[1:], n)[hl]
+    has_HH = count_between(hh_pos, low_pos[hl], next_low_pos) > 0
+    check_L = low_pos[hl][~has_HH]
+    to_remove_L = check_L[~pivot_confirmed(rmq, check_L, LEFT_LOOKBACK, RIGHT_LOOKFORWARD,
+                                           min_swing_price, high=False)]
+
+    drop = (
+        (is_high & np.isin(struct_points.pos, to_remove_H))
+        | (is_low & np.isin(struct_points.pos, to_remove_L))
+    )
+    refined = struct_points.filter(~drop)
 
-    print(f"Refined structural points (LH/HL pivot filter): {len(refined)} (vorher: {len(sps)})")
+    print(f"Refined structural points (LH/HL pivot filter): {len(refined)} (vorher: {len(struct_points)})")
     return refined
 
 
@@ -536,8 +401,8 @@ def refine_LH_HL_with_pivot(df: pd.DataFrame,
 # ---------------------------------
 
 def merge_consecutive_extremes(df: pd.DataFrame,
-                               struct_points: list,
-                               df_swings: pd.DataFrame) -> list:
+                               struct_points: StructPoints,
+                               labels: np.ndarray) -> StructPoints:
     """
     Regel:
       - Zwei aufeinanderfolgende LL (in der Sequence der L-Swings),
@@ -555,103 +420,46 @@ def merge_consecutive_extremes(df: pd.DataFrame,
     Dadurch gibt es keine LL-LL bzw. HH-HH-Folgen mehr ohne
     passende Gegenstruktur dazwischen, außer in dem bewusst
     erlaubten Spezialfall HH+HL auf derselben Kerze.
-    """
-    if not struct_points:
-        return []
-
-    sps = sorted(struct_points, key=lambda x: x["pos"])
 
-    # Mapping Index -> pos für schnelle Suche
-    idx_list = list(df.index)
-    idx_to_pos = {idx: i for i, idx in enumerate(idx_list)}
-
-    swing_low_label = df_swings["swing_low_label"].to_dict()
-    swing_high_label = df_swings["swing_high_label"].to_dict()
+    labels: Label-Codes je Punkt (classify_swing_labels).
+    """
+    if not len(struct_points):
+        return struct_points
 
-    low_swings = []   # (pos, idx, lbl)
-    high_swings = []  # (pos, idx, lbl)
+    # Swings je Art, nach pos sortiert (pos je Art eindeutig)
+    is_low = struct_points.is_low
+    is_high = struct_points.is_high
+    low_pos, low_lbl = struct_points.pos[is_low], labels[is_low]
+    high_pos, high_lbl = struct_points.pos[is_high], labels[is_high]
 
-    for sp in sps:
-        idx = sp["idx"]
-        pos = sp["pos"]
-        if sp["kind"] == "L":
-            lbl_l = swing_low_label.get(idx, "")
-            if lbl_l != "":
-                low_swings.append((pos, idx, lbl_l))
-        elif sp["kind"] == "H":
-            lbl_h = swing_high_label.get(idx, "")
-            if lbl_h != "":
-                high_swings.append((pos, idx, lbl_h))
+    lh_pos = high_pos[high_lbl == label_code("LH")]
+    hl_pos = low_pos[low_lbl == label_code("HL")]
 
     # --- LL-LL-Fälle bereinigen (ohne LH dazwischen) ---
-    drop_L = set()
-
-    high_swings_sorted = sorted(high_swings, key=lambda x: x[0])
-
-    prev_LL = None  # (pos, idx, lbl)
-
-    for pos, idx, lbl in sorted(low_swings, key=lambda x: x[0]):
-        if lbl == "LL":
-            if prev_LL is not None and prev_LL[2] == "LL":
-                pos_prev, idx_prev, _ = prev_LL
-
-                # Check: gibt es zwischen pos_prev und pos eine LH?
-                has_LH_between = False
-                for p_h, idx_h, lbl_h in high_swings_sorted:
-                    if p_h > pos_prev and p_h < pos and lbl_h == "LH":
-                        has_LH_between = True
-                        break
-
-                if not has_LH_between:
-                    # Älteres LL verwerfen
-                    drop_L.add(idx_prev)
-
-            prev_LL = (pos, idx, lbl)
-        else:
-            # HL/L0/... unterbrechen die LL-Kette
-            prev_LL = (pos, idx, lbl)
+    # Paare aufeinanderfolgender L-Swings; HL/L0/... unterbrechen die LL-Kette
+    is_LL = low_lbl == label_code("LL")
+    ll_pair = is_LL[1:] & is_LL[:-1]
+    no_LH_between = count_between(lh_pos, low_pos[:-1], low_pos[1:]) == 0
+    # Älteres LL verwerfen
+    drop_L = low_pos[:-1][ll_pair & no_LH_between]
 
     # --- HH-HH-Fälle bereinigen (ohne HL dazwischen) ---
-    drop_H = set()
-
-    low_swings_sorted = sorted(low_swings, key=lambda x: x[0])
-
-    prev_HH = None  # (pos, idx, lbl)
-
-    for pos, idx, lbl in sorted(high_swings, key=lambda x: x[0]):
-        if lbl == "HH":
-            if prev_HH is not None and prev_HH[2] == "HH":
-                pos_prev, idx_prev, _ = prev_HH
-
-                # Check: gibt es zwischen pos_prev und pos ein HL?
-                has_HL_between = False
-                for p_l, idx_l, lbl_l in low_swings_sorted:
-                    if p_l > pos_prev and p_l < pos and lbl_l == "HL":
-                        has_HL_between = True
-                        break
-
-                if not has_HL_between:
-                    # Ausnahme:
-                    # Wenn auf derselben Kerze wie das frühere HH auch ein HL liegt,
-                    # dann dieses HH NICHT verwerfen (typischer Fall: HH+HL zusammen).
-                    low_lbl_prev = swing_low_label.get(idx_prev, "")
-                    if low_lbl_prev != "HL":
-                        # nur droppen, wenn das frühere HH NICHT gleichzeitig ein HL trägt
-                        drop_H.add(idx_prev)
-
-            prev_HH = (pos, idx, lbl)
-        else:
-            # LH/H0/... unterbrechen die HH-Kette
-            prev_HH = (pos, idx, lbl)
+    # Paare aufeinanderfolgender H-Swings; LH/H0/... unterbrechen die HH-Kette
+    is_HH = high_lbl == label_code("HH")
+    hh_pair = is_HH[1:] & is_HH[:-1]
+    no_HL_between = count_between(hl_pos, high_pos[:-1], high_pos[1:]) == 0
+    # Ausnahme:
+    # Wenn auf derselben Kerze wie das frühere HH auch ein HL liegt,
+    # dann dieses HH NICHT verwerfen (typischer Fall: HH+HL zusammen).
+    prev_has_HL = np.isin(high_pos[:-1], hl_pos)
+    drop_H = high_pos[:-1][hh_pair & no_HL_between & ~prev_has_HL]
 
     # --- Struct-Points nach Drop-Listen filtern ---
-    refined = []
-    for sp in sps:
-        if sp["kind"] == "L" and sp["idx"] in drop_L:
-            continue
-        if sp["kind"] == "H" and sp["idx"] in drop_H:
-            continue
-        refined.append(sp)
+    drop = (
+        (is_low & np.isin(struct_points.pos, drop_L))
+        | (is_high & np.isin(struct_points.pos, drop_H))
+    )
+    refined = struct_points.filter(~drop)
 
     print(
         f"Merged consecutive extremes: "
@@ -665,54 +473,56 @@ def merge_consecutive_extremes(df: pd.DataFrame,
 # 3) Swings klassifizieren (HH/HL/LH/LL)
 # ---------------------------------
 
-def classify_swings(df: pd.DataFrame, struct_points: list) -> pd.DataFrame:
+def classify_swing_labels(struct_points: StructPoints) -> np.ndarray:
+    """
+    HH/HL/LH/LL/.._eq-Label-Code je Punkt (struct_points.SWING_LABELS),
+    ohne DataFrame - für die Zwischen-Klassifikationen der Pipeline.
+    """
+    return swing_label_codes(struct_points)
+
+
+# Label-Code (SWING_LABELS) -> Kategorie-Code der Schema-Spalten (-1 = kein Label)
+_LOW_LABEL_DTYPE = BAR_SCHEMA["swing_low_label"]
+_HIGH_LABEL_DTYPE = BAR_SCHEMA["swing_high_label"]
+_LOW_CATEGORY_CODE = np.array(
+    [_LOW_LABEL_DTYPE.categories.get_loc(name) if name in _LOW_LABEL_DTYPE.categories else -1
+     for name in SWING_LABELS], dtype=np.int8)
+_HIGH_CATEGORY_CODE = np.array(
+    [_HIGH_LABEL_DTYPE.categories.get_loc(name) if name in _HIGH_LABEL_DTYPE.categories else -1
+     for name in SWING_LABELS], dtype=np.int8)
+
+
+def classify_swings(df: pd.DataFrame, struct_points: StructPoints, labels: np.ndarray = None) -> pd.DataFrame:
+    """
+    Swing-Preise / -Labels als Spalten (swing_low_price, swing_low_label,
+    swing_high_price, swing_high_label) im Schema-Format (float64 / category),
+    je Spalte eine vektorisierte Zuweisung.
+    """
+    if labels is None:
+        labels = classify_swing_labels(struct_points)
+
     df = df.copy()
-    df["swing_low_price"] = pd.NA
-    df["swing_low_label"] = ""
-    df["swing_high_price"] = pd.NA
-    df["swing_high_label"] = ""
-
-    sps = sorted(struct_points, key=lambda x: x["pos"])
-    last_low = None
-    last_high = None
-
-    for sp in sps:
-        idx = sp["idx"]
-        price = sp["price"]
-        kind = sp["kind"]
-
-        if kind == "L":
-            if last_low is None:
-                label = "L0"
-            else:
-                if price > last_low:
-                    label = "HL"
-                elif price < last_low:
-                    label = "LL"
-                else:
-                    label = "L_eq"
-            last_low = price
-            df.loc[idx, "swing_low_price"] = price
-            df.loc[idx, "swing_low_label"] = label
-
-        elif kind == "H":
-            if last_high is None:
-                label = "H0"
-            else:
-                if price > last_high:
-                    label = "HH"
-                elif price < last_high:
-                    label = "LH"
-                else:
-                    label = "H_eq"
-            last_high = price
-            df.loc[idx, "swing_high_price"] = price
-            df.loc[idx, "swing_high_label"] = label
+    n = len(df)
+
+    for kind, side, category_code, dtype in (
+        (KIND_L, "low", _LOW_CATEGORY_CODE, _LOW_LABEL_DTYPE),
+        (KIND_H, "high", _HIGH_CATEGORY_CODE, _HIGH_LABEL_DTYPE),
+    ):
+        sel = struct_points.kind == kind
+        pos = struct_points.pos[sel]
+
+        prices = np.full(n, np.nan)
+        prices[pos] = struct_points.price[sel]
+        codes = np.full(n, -1, dtype=np.int8)
+        codes[pos] = category_code[labels[sel]]
+
+        df[f"swing_{side}_price"] = prices
+        df[f"swing_{side}_label"] = pd.Categorical.from_codes(codes, dtype=dtype)
 
     return df
 
 
-def relabel_inside_legs(df: pd.DataFrame, struct_points: list) -> pd.DataFrame:
+def relabel_inside_legs(df: pd.DataFrame, struct_points: StructPoints) -> pd.DataFrame:
     """
     Post-Processing:
       - Im Bärentrend:
@@ -735,12 +545,19 @@ def relabel_inside_legs(df: pd.DataFrame, struct_points: list) -> pd.DataFrame:
     """
     df = df.copy()
 
-    swing_low_price  = df["swing_low_price"].to_dict()
-    swing_low_label  = df["swing_low_label"].to_dict()
-    swing_high_price = df["swing_high_price"].to_dict()
-    swing_high_label = df["swing_high_label"].to_dict()
+    # Werte je Bar-Position
+    swing_low_price  = df["swing_low_price"].to_numpy()
+    swing_low_label  = df["swing_low_label"].to_numpy(dtype=object)
+    swing_high_price = df["swing_high_price"].to_numpy()
+    swing_high_label = df["swing_high_label"].to_numpy(dtype=object)
 
-    sps = sorted(struct_points, key=lambda x: x["pos"])
+    # Umgelabelte Werte (einmal am Ende zurückschreiben statt df.at je Punkt)
+    new_low_label  = swing_low_label.copy()
+    new_high_label = swing_high_label.copy()
+
+    # FX-Tag je Punkt (Datum nach Shift um 17h)
+    times = struct_points.times(df.index)
+    fx_days = np.asarray((times - pd.Timedelta(hours=17)).normalize(), dtype="datetime64[ns]")
 
     last_high_price = None
     last_low_price  = None
@@ -756,16 +573,12 @@ def relabel_inside_legs(df: pd.DataFrame, struct_points: list) -> pd.DataFrame:
     # FX-Day-Tracking (Rollover 17:00 NY)
     current_fx_day = None    # (Datum nach Shift um 17h)
 
-    for sp in sps:
-        idx  = sp["idx"]       # time_ny als Index
-        kind = sp["kind"]
-
+    for pos, kind, fx_day in zip(struct_points.pos.tolist(),
+                                 struct_points.kind.tolist(),
+                                 fx_days.tolist()):
         # -------------------------------
         # FX-Day-Bestimmung (17:00 NY)
         # -------------------------------
-        ts = pd.Timestamp(idx)
-        fx_day = (ts - pd.Timedelta(hours=17)).date()
-
         if current_fx_day is None:
             current_fx_day = fx_day
         elif fx_day != current_fx_day:
@@ -778,9 +591,9 @@ def relabel_inside_legs(df: pd.DataFrame, struct_points: list) -> pd.DataFrame:
             last_high_price  = None
             last_low_price   = None
 
-        if kind == "H":
-            price = swing_high_price.get(idx, None)
-            label = swing_high_label.get(idx, "")
+        if kind == KIND_H:
+            price = swing_high_price[pos]
+            label = swing_high_label[pos]
 
             if price is None or pd.isna(price):
                 continue
@@ -793,7 +606,7 @@ def relabel_inside_legs(df: pd.DataFrame, struct_points: list) -> pd.DataFrame:
             if bear_anchor_high is not None and label == "HH":
                 if price <= bear_anchor_high:
                     # noch innerhalb oder exakt am alten Bear-Leg-High -> nur LH
-                    df.at[idx, "swing_high_label"] = "LH"
+                    new_high_label[pos] = "LH"
                     label = "LH"
                 else:
                     # echtes HH, Leg-High nachziehen
@@ -803,7 +616,7 @@ def relabel_inside_legs(df: pd.DataFrame, struct_points: list) -> pd.DataFrame:
             if label == "HH":
                 if last_HH_price is not None and price <= last_HH_price:
                     # tiefer oder gleich letztem HH -> eigentlich LH
-                    df.at[idx, "swing_high_label"] = "LH"
+                    new_high_label[pos] = "LH"
                     label = "LH"
                 else:
                     # neues „echtes“ HH
@@ -817,9 +630,9 @@ def relabel_inside_legs(df: pd.DataFrame, struct_points: list) -> pd.DataFrame:
             # letztes High updaten
             last_high_price = price
 
-        elif kind == "L":
-            price = swing_low_price.get(idx, None)
-            label = swing_low_label.get(idx, "")
+        elif kind == KIND_L:
+            price = swing_low_price[pos]
+            label = swing_low_label[pos]
 
             if price is None or pd.isna(price):
                 continue
@@ -832,7 +645,7 @@ def relabel_inside_legs(df: pd.DataFrame, struct_points: list) -> pd.DataFrame:
             if bull_anchor_low is not None and label == "LL":
                 if price >= bull_anchor_low:
                     # noch innerhalb oder exakt am alten Bull-Leg-Low -> nur HL
-                    df.at[idx, "swing_low_label"] = "HL"
+                    new_low_label[pos] = "HL"
                     label = "HL"
                 else:
                     # echtes LL im Kontext des Bull-Legs
@@ -842,7 +655,7 @@ def relabel_inside_legs(df: pd.DataFrame, struct_points: list) -> pd.DataFrame:
             if label == "LL":
                 if last_LL_price is not None and price >= last_LL_price:
                     # oberhalb oder gleich dem aktuellen Leg-Low -> eigentlich HL
-                    df.at[idx, "swing_low_label"] = "HL"
+                    new_low_label[pos] = "HL"
                     label = "HL"
                 else:
                     # neues „echtes“ LL
@@ -856,9 +669,11 @@ def relabel_inside_legs(df: pd.DataFrame, struct_points: list) -> pd.DataFrame:
             # letztes Low updaten
             last_low_price = price
 
+    df["swing_low_label"] = pd.Series(new_low_label, index=df.index).astype(df["swing_low_label"].dtype)
+    df["swing_high_label"] = pd.Series(new_high_label, index=df.index).astype(df["swing_high_label"].dtype)
     return df
 
-def apply_counter_engulf_override(df: pd.DataFrame, struct_points: list) -> pd.DataFrame:
+def apply_counter_engulf_override(df: pd.DataFrame, struct_points: StructPoints) -> pd.DataFrame:
     """
     Sonderbehandlung für Single-Counter-Engulfing:
 
@@ -879,39 +694,37 @@ def apply_counter_engulf_override(df: pd.DataFrame, struct_points: list) -> pd.D
     """
     df = df.copy()
 
-    swing_low_price  = df["swing_low_price"].to_dict()
-    swing_low_label  = df["swing_low_label"].to_dict()
-    swing_high_price = df["swing_high_price"].to_dict()
-    swing_high_label = df["swing_high_label"].to_dict()
+    # Werte je Bar-Position (Labels als Kopie, wird unten mitgeführt und
+    # am Ende einmal in die Spalten geschrieben)
+    swing_low_price  = df["swing_low_price"].to_numpy()
+    swing_low_label  = df["swing_low_label"].to_numpy(dtype=object).copy()
+    swing_high_price = df["swing_high_price"].to_numpy()
+    swing_high_label = df["swing_high_label"].to_numpy(dtype=object).copy()
 
-    sps = sorted(struct_points, key=lambda x: x["pos"])
+    engulf_L = source_code("counter_engulf_L")
+    engulf_H = source_code("counter_engulf_H")
 
     # Wir tracken das letzte valide Low/High, so wie es final im df steht.
     last_low_price  = None
     last_high_price = None
 
-    for sp in sps:
-        idx  = sp["idx"]
-        kind = sp["kind"]
-        src  = sp.get("source", "")
-
+    for pos, kind, src in zip(struct_points.pos.tolist(),
+                              struct_points.kind.tolist(),
+                              struct_points.source.tolist()):
         # ---------- LOW-SEITE: counter_engulf_L -> HL erzwingen ----------
-        if kind == "L":
-            price = swing_low_price.get(idx, None)
+        if kind == KIND_L:
+            price = swing_low_price[pos]
             if price is None or pd.isna(price):
                 continue
 
-            lbl = swing_low_label.get(idx, "")
-
             # Wenn dieser Punkt aus Single-Counter-Engulfing stammt:
-            if src == "counter_engulf_L":
+            if src == engulf_L:
                 # Es gibt bereits ein vorheriges strukturelles Low?
                 if last_low_price is not None:
                     # Tiefer als das letzte Low -> normal LL/HL-Logik
                     # Höher als das letzte Low -> explizit HL setzen
                     if price > last_low_price:
-                        df.at[idx, "swing_low_label"] = "HL"
-                        swing_low_label[idx] = "HL"
+                        swing_low_label[pos] = "HL"
                         # und dieses HL wird neues Referenz-Low
                         last_low_price = price
                         continue
@@ -922,42 +735,94 @@ def apply_counter_engulf_override(df: pd.DataFrame, struct_points: list) -> pd.D
 
             # normales Update des letzten gültigen Lows,
             # basierend auf dem finalen Label
-            lbl_after = swing_low_label.get(idx, "")
+            lbl_after = swing_low_label[pos]
             if lbl_after in ("L0", "HL", "LL", "L_eq"):
                 last_low_price = price
 
         # ---------- HIGH-SEITE: counter_engulf_H -> LH erzwingen ----------
-        elif kind == "H":
-            price = swing_high_price.get(idx, None)
+        elif kind == KIND_H:
+            price = swing_high_price[pos]
             if price is None or pd.isna(price):
                 continue
 
-            lbl = swing_high_label.get(idx, "")
-
-            if src == "counter_engulf_H":
+            if src == engulf_H:
                 if last_high_price is not None:
                     # Höher als letztes High -> normales HH-Szenario
                     # Niedriger als letztes High -> explizit LH setzen
                     if price < last_high_price:
-                        df.at[idx, "swing_high_label"] = "LH"
-                        swing_high_label[idx] = "LH"
+                        swing_high_label[pos] = "LH"
                         last_high_price = price
                         continue
                 # falls kein last_high_price: neutral, Label bleibt wie es ist
 
-            lbl_after = swing_high_label.get(idx, "")
+            lbl_after = swing_high_label[pos]
             if lbl_after in ("H0", "HH", "LH", "H_eq"):
                 last_high_price = price
 
+    df["swing_low_label"] = pd.Series(swing_low_label, index=df.index).astype(df["swing_low_label"].dtype)
+    df["swing_high_label"] = pd.Series(swing_high_label, index=df.index).astype(df["swing_high_label"].dtype)
     return df
 
 
 
+# ---------------------------------
+# 4a/4b) CHOCH-Referenzen und -Punkte
+# ---------------------------------
+
+def choch_reference_mask(struct_points: StructPoints, labels: np.ndarray, bearish: bool) -> np.ndarray:
+    """Punkte, von denen aus der CHOCH gesucht wird: HL/L0 (bearish) bzw. LH/H0, mit Preis."""
+    if bearish:
+        kind_mask, names = struct_points.is_low, ["HL", "L0"]
+    else:
+        kind_mask, names = struct_points.is_high, ["LH", "H0"]
+    return kind_mask & np.isin(labels, [label_code(n) for n in names]) & ~np.isnan(struct_points.price)
+
+
+def choch_structure(df: pd.DataFrame, extreme_pos: np.ndarray, bearish: bool) -> StructPoints:
+    """CHOCH-Extrema (Positionen, -1 = keins) -> GENAU EIN LL (bearish) bzw. HH je Position."""
+    if bearish:
+        return StructPoints.from_positions(
+            np.unique(extreme_pos[extreme_pos >= 0]), KIND_L, df["low"].values, "bear_choch_LL")
+    return StructPoints.from_positions(
+        np.unique(extreme_pos[extreme_pos >= 0]), KIND_H, df["high"].values, "bull_choch_HH")
+
+
+# Steps 4a/4b in Teilen (Zeit-Shards, structure_shards.py): Referenzen
+# einmal global, Suche je Shard, Punkte aus den Extrema je Referenz
+
+def choch_references(struct_points: StructPoints) -> tuple:
+    """Step 3 + Auswahl der Referenzen: (HL/L0-Punkte, LH/H0-Punkte)."""
+    labels = classify_swing_labels(struct_points)
+    return tuple(struct_points.filter(choch_reference_mask(struct_points, labels, bearish))
+                 for bearish in (True, False))
+
+
+def choch_reference_extremes(df: pd.DataFrame, refs: tuple, params: "StructureParams",
+                             rmq: OhlcRangeIndex = None, linear: bool = False) -> tuple:
+    """
+    CHOCH-Extrem je Referenz aus choch_references, (bear_pos, bull_pos) als
+    Positionen in df (-1 = kein Break oder keine Base innerhalb von df).
+    linear: Vorwärts-Scan für wenige Referenzen (choch_extremes).
+    """
+    arrays = (df["open"].values, df["high"].values, df["low"].values, df["close"].values)
+    if rmq is None and not linear:
+        rmq = OhlcRangeIndex.from_frame(df)     # einmal für beide Richtungen
+    return tuple(choch_extremes(*arrays, r.pos, r.price, params.choch_price, bearish=bearish, rmq=rmq, linear=linear)
+                 for r, bearish in zip(refs, (True, False)))
+
+
+def choch_from_extremes(df: pd.DataFrame, extremes: tuple) -> tuple:
+    """(bear_pos, bull_pos) je Referenz -> (choch_bear, choch_bull) wie Steps 4a/4b."""
+    return choch_structure(df, extremes[0], bearish=True), choch_structure(df, extremes[1], bearish=False)
+
+
 # ---------------------------------
 # 4a) Bearish CHOCH – nur erstes LL nach HL-Bruch
 # ---------------------------------
 
-def scan_bearish_choch(df: pd.DataFrame, df_swings: pd.DataFrame, choch_price: float):
+def scan_bearish_choch(df: pd.DataFrame, struct_points: StructPoints, labels: np.ndarray,
+                       choch_price: float,
+                       rmq: OhlcRangeIndex = None) -> StructPoints:
     """
     Für jedes HL (oder L0):
       - suche erste bearische Candle j mit Low <= HL_low - choch_price
@@ -967,63 +832,19 @@ def scan_bearish_choch(df: pd.DataFrame, df_swings: pd.DataFrame, choch_price: f
     """
     print("Scanning bearish CHOCH (first LL after HL break)...")
 
-    idx_list = list(df.index)
-    n = len(idx_list)
-
-    lows = df["low"].values
-    opens = df["open"].values
-    closes = df["close"].values
+    # HL-/L0-Punkte (labels: Codes je Punkt aus classify_swing_labels)
+    is_hl = choch_reference_mask(struct_points, labels, bearish=True)
+    hl_pos = struct_points.pos[is_hl]
 
-    swing_low_price = df_swings["swing_low_price"].to_dict()
-    swing_low_label = df_swings["swing_low_label"].to_dict()
-
-    synthetic = []
-
-    # HL-/L0-Positionen sammeln
-    hl_positions = []
-    for pos, idx in enumerate(idx_list):
-        lbl = swing_low_label.get(idx, "")
-        if lbl in ("HL", "L0"):
-            price = swing_low_price.get(idx, None)
-            if price is not None and not pd.isna(price):
-                hl_positions.append((pos, idx, float(price)))
-
-    for pos_hl, idx_hl, hl_price in hl_positions:
-        # 1) erste bearische Break-Candle j
-        j = None
-        for k in range(pos_hl + 1, n):
-            if closes[k] < opens[k] and lows[k] <= hl_price - choch_price:
-                j = k
-                break
-        if j is None:
-            continue
-
-        # 2) erste nicht-bearische Candle k >= j (Base)
-        k_base = None
-        for k in range(j, n):
-            if closes[k] >= opens[k]:
-                k_base = k
-                break
-        if k_base is None:
-            continue
+    # Break-Candle per Sparse-Table-Suche, Base per "nächste nicht-bearische Candle"
+    # (structure_kernels.py) -> O(log n) je HL statt Vorwärts-Scan
+    ll_pos = choch_extremes(
+        df["open"].values, df["high"].values, df["low"].values, df["close"].values,
+        hl_pos, struct_points.price[is_hl], choch_price, bearish=True, rmq=rmq,
+    )
 
-        # minLow in [j..k_base]
-        segment_lows = lows[j:k_base+1]
-        rel_min = segment_lows.argmin()
-        i_min = j + rel_min
-        idx_min = idx_list[i_min]
-        base_ll_price = float(lows[i_min])
-
-        # LL an idx_min (nur wenn dort nicht schon ein L aus CHOCH steht)
-        exists = any(sp["idx"] == idx_min and sp["kind"] == "L" for sp in synthetic)
-        if not exists:
-            synthetic.append({
-                "idx": idx_min,
-                "kind": "L",
-                "price": base_ll_price,
-                "pos": i_min,
-                "source": "bear_choch_LL"
-            })
+    # GENAU EIN LL je Position (mehrere HL können auf dasselbe minLow zeigen)
+    synthetic = choch_structure(df, ll_pos, bearish=True)
 
     print(f"Bearish CHOCH LL points: {len(synthetic)}")
     return synthetic
@@ -1033,7 +854,9 @@ def scan_bearish_choch(df: pd.DataFrame, df_swings: pd.DataFrame, choch_price: f
 # 4b) Bullish CHOCH – nur erstes HH nach LH-Bruch
 # ---------------------------------
 
-def scan_bullish_choch(df: pd.DataFrame, df_swings: pd.DataFrame, choch_price: float):
+def scan_bullish_choch(df: pd.DataFrame, struct_points: StructPoints, labels: np.ndarray,
+                       choch_price: float,
+                       rmq: OhlcRangeIndex = None) -> StructPoints:
     """
     Für jedes LH (oder H0):
       - suche erste bullische Candle j mit High >= LH_high + choch_price
@@ -1043,68 +866,23 @@ def scan_bullish_choch(df: pd.DataFrame, df_swings: pd.DataFrame, choch_price: f
     """
     print("Scanning bullish CHOCH (first HH after LH break)...")
 
-    idx_list = list(df.index)
-    n = len(idx_list)
-
-    highs = df["high"].values
-    opens = df["open"].values
-    closes = df["close"].values
-
-    swing_high_price = df_swings["swing_high_price"].to_dict()
-    swing_high_label = df_swings["swing_high_label"].to_dict()
-
-    synthetic = []
-
-    # LH-/H0-Positionen sammeln
-    lh_positions = []
-    for pos, idx in enumerate(idx_list):
-        lbl = swing_high_label.get(idx, "")
-        if lbl in ("LH", "H0"):
-            price = swing_high_price.get(idx, None)
-            if price is not None and not pd.isna(price):
-                lh_positions.append((pos, idx, float(price)))
-
-    for pos_lh, idx_lh, lh_price in lh_positions:
-        # 1) erste bullische Break-Candle j
-        j = None
-        for k in range(pos_lh + 1, n):
-            if closes[k] > opens[k] and highs[k] >= lh_price + choch_price:
-                j = k
-                break
-        if j is None:
-            continue
+    # LH-/H0-Punkte (labels: Codes je Punkt aus classify_swing_labels)
+    is_lh = choch_reference_mask(struct_points, labels, bearish=False)
+    lh_pos = struct_points.pos[is_lh]
 
-        # 2) erste nicht-bearische Candle k >= j (Base)
-        k_base = None
-        for k in range(j, n):
-            if closes[k] <= opens[k]:
-                k_base = k
-                break
-        if k_base is None:
-            continue
+    hh_pos = choch_extremes(
+        df["open"].values, df["high"].values, df["low"].values, df["close"].values,
+        lh_pos, struct_points.price[is_lh], choch_price, bearish=False, rmq=rmq,
+    )
 
-        # maxHigh in [j..k_base]
-        segment_highs = highs[j:k_base+1]
-        rel_max = segment_highs.argmax()
-        i_max = j + rel_max
-        idx_max = idx_list[i_max]
-        base_hh_price = float(highs[i_max])
-
-        # HH an idx_max (nur wenn dort nicht schon ein H aus CHOCH steht)
-        exists = any(sp["idx"] == idx_max and sp["kind"] == "H" for sp in synthetic)
-        if not exists:
-            synthetic.append({
-                "idx": idx_max,
-                "kind": "H",
-                "price": base_hh_price,
-                "pos": i_max,
-                "source": "bull_choch_HH"
-            })
+    # GENAU EIN HH je Position (mehrere LH können auf dasselbe maxHigh zeigen)
+    synthetic = choch_structure(df, hh_pos, bearish=False)
 
     print(f"Bullish CHOCH HH points: {len(synthetic)}")
     return synthetic
 
-def scan_single_counter_engulfing(df: pd.DataFrame, threshold_price: float):
+def scan_single_counter_engulfing(df: pd.DataFrame, threshold_price: float,
+                                  candidates: CounterEngulfCandidates = None) -> StructPoints:
     """
     Sucht nach Single-Counter-Engulfing-Pattern mit Kontext-Bedingung,
     wobei die Mindeststrecke auf der Impuls-Candle j wie folgt gemessen wird:
@@ -1134,91 +912,29 @@ def scan_single_counter_engulfing(df: pd.DataFrame, threshold_price: float):
 
     Die eigentliche Klassifikation in HL/LL/HH/LH macht danach
     weiterhin `classify_swings()`.
-    """
-    idx_list = list(df.index)
-    n = len(idx_list)
-
-    opens  = df["open"].values
-    closes = df["close"].values
-    highs  = df["high"].values
-    lows   = df["low"].values
-
-    points = []
-
-    for i in range(n - 1):
-        j = i + 1
-
-        o_i, c_i = float(opens[i]),  float(closes[i])
-        h_i, l_i = float(highs[i]),  float(lows[i])
-        o_j, c_j = float(opens[j]),  float(closes[j])
-        h_j, l_j = float(highs[j]),  float(lows[j])
 
-        # Wir brauchen i-1 für den Kontext
-        if i == 0:
-            continue
-        o_prev, c_prev = float(opens[i-1]), float(closes[i-1])
-
-        idx_i = idx_list[i]
-
-        # -----------------------------
-        # Bullischer Sonderfall:
-        # prev bull, i bear, j bull
-        # high_j strikt > high_i
-        # und Impulsstrecke (high_j - open_j) >= threshold_price
-        # -----------------------------
-        if (c_prev > o_prev and      # i-1 bull
-            c_i < o_i and            # i bear
-            c_j > o_j and            # j bull
-            h_j > h_i):              # j bricht High von i
-
-            bull_impulse = h_j - o_j
-            if bull_impulse >= threshold_price:
-                # erzwungenes Low (später HL)
-                points.append({
-                    "idx":   idx_i,
-                    "kind":  "L",
-                    "price": l_i,
-                    "pos":   i,
-                    "source": "counter_engulf_L"
-                })
-                # erzwungenes High (später HH/H)
-                points.append({
-                    "idx":   idx_i,
-                    "kind":  "H",
-                    "price": h_i,
-                    "pos":   i,
-                    "source": "counter_engulf_L_high"
-                })
-
-        # -----------------------------
-        # Bearischer Sonderfall:
-        # prev bear, i bull, j bear
-        # low_j strikt < low_i
-        # und Impulsstrecke (open_j - low_j) >= threshold_price
-        # -----------------------------
-        if (c_prev < o_prev and      # i-1 bear
-            c_i > o_i and            # i bull
-            c_j < o_j and            # j bear
-            l_j < l_i):              # j bricht Low von i
-
-            bear_impulse = o_j - l_j
-            if bear_impulse >= threshold_price:
-                # erzwungenes High (später LH)
-                points.append({
-                    "idx":   idx_i,
-                    "kind":  "H",
-                    "price": h_i,
-                    "pos":   i,
-                    "source": "counter_engulf_H"
-                })
-                # erzwungenes Low (später LL/L)
-                points.append({
-                    "idx":   idx_i,
-                    "kind":  "L",
-                    "price": l_i,
-                    "pos":   i,
-                    "source": "counter_engulf_H_low"
-                })
+    candidates: vorberechnete Kerzenfolgen (StructureContext), sonst hier berechnet.
+    """
+    # Muster-Masken + Impulsstrecken (structure_kernels.py), dann nur noch die Schwelle
+    if candidates is None:
+        candidates = CounterEngulfCandidates(
+            df["open"].to_numpy(dtype=float),
+            df["close"].to_numpy(dtype=float),
+            df["high"].to_numpy(dtype=float),
+            df["low"].to_numpy(dtype=float),
+        )
+    bull_pos, bear_pos = candidates.positions(threshold_price)
+    highs = candidates.highs
+    lows = candidates.lows
+
+    # Reihenfolge je Candle: bullisch L (später HL) vor H (später HH/H),
+    # bearisch H (später LH) vor L (später LL/L)
+    points = StructPoints.from_unsorted(
+        StructPoints.from_positions(bull_pos, KIND_L, lows, "counter_engulf_L"),
+        StructPoints.from_positions(bull_pos, KIND_H, highs, "counter_engulf_L_high"),
+        StructPoints.from_positions(bear_pos, KIND_H, highs, "counter_engulf_H"),
+        StructPoints.from_positions(bear_pos, KIND_L, lows, "counter_engulf_H_low"),
+    )
 
     print(f"Single-counter engulfing points: {len(points)}")
     return points
@@ -1229,162 +945,335 @@ def scan_single_counter_engulfing(df: pd.DataFrame, threshold_price: float):
 # 5) BOS
 # ---------------------------------
 
-def detect_bos(df: pd.DataFrame, struct_points: list) -> pd.DataFrame:
+def detect_bos(df: pd.DataFrame, struct_points: StructPoints) -> pd.DataFrame:
+    """
+    BOS je Bar: Close über dem letzten H bzw. unter dem letzten L davor.
+    Ein Strukturpunkt wirkt erst ab der Folgebar (Vergleich vor dem Update).
+    """
     print("Detecting BOS up/down...")
     df = df.copy()
-    df["bos_up"] = False
-    df["bos_down"] = False
-
-    sp_map = {}
-    for sp in struct_points:
-        sp_map.setdefault(sp["idx"], []).append(sp)
-
-    last_high = None
-    last_low = None
-    bos_up_list = []
-    bos_down_list = []
 
-    for idx, row in df.iterrows():
-        close = float(row["close"])
+    # Levels per Scatter + ffill über die Bars (structure_kernels.py)
+    bos_up, bos_down = break_of_structure(df["close"].to_numpy(dtype=float), struct_points)
 
-        bos_up = False
-        bos_down = False
-
-        if last_high is not None and close > last_high:
-            bos_up = True
-        if last_low is not None and close < last_low:
-            bos_down = True
-
-        bos_up_list.append(bos_up)
-        bos_down_list.append(bos_down)
-
-        if idx in sp_map:
-            for sp in sp_map[idx]:
-                if sp["kind"] == "H":
-                    last_high = sp["price"]
-                elif sp["kind"] == "L":
-                    last_low = sp["price"]
-
-    df["bos_up"] = bos_up_list
-    df["bos_down"] = bos_down_list
+    df["bos_up"] = bos_up
+    df["bos_down"] = bos_down
     return df
 
 # ---------------------------------
-# PIPELINE WRAPPER
+# PARAMETER + KERN-PIPELINE (Steps 1-12)
 # ---------------------------------
 
-def run_phase1_for_symbol(symbol: str):
-    print(f"--- Processing Phase 1 for {symbol} ---")
-
-    # Dateinamen dynamisch
-    input_filename = f"data_{symbol}_M5_phase0_enriched.csv"
-    input_file = os.path.join(DATA_DIR, input_filename)
-
-    output_filename = f"data_{symbol}_M5_phase1_structure_NY.csv"
-    output_file = os.path.join(DATA_DIR, output_filename)
-
-    if not os.path.exists(input_file):
-        print(f"Skipping {symbol}: Input file not found ({input_file})")
-        return
+@dataclass(frozen=True)
+class StructureParams:
+    """Schwellen der Struktur-Erkennung in PREISeinheiten (Pips * PipSize * Ratio)."""
+    min_swing_price: float
+    choch_price: float
+    skip_price: float
+    sc_threshold_price: float
+
+    @classmethod
+    def from_pips(cls, pip_size: float, vola_ratio: float,
+                  min_swing_pips: float = BASE_MIN_SWING_PIPS,
+                  choch_pips: float = BASE_CHOCH_PIPS,
+                  skip_pips: float = BASE_SKIP_PIPS,
+                  sc_pips: float = BASE_SINGLE_COUNTER_ENGULFING) -> "StructureParams":
+        # Values are in PRICE units (Pips * PipSize * Ratio)
+        return cls(
+            min_swing_price=min_swing_pips * vola_ratio * pip_size,
+            choch_price=choch_pips * vola_ratio * pip_size,
+            skip_price=skip_pips * vola_ratio * pip_size,
+            sc_threshold_price=sc_pips * vola_ratio * pip_size,
+        )
+
+
+def structure_params_for_symbol(symbol: str) -> StructureParams:
+    """BASE_*-Pips (EURUSD) mit Pip-Size und Vola-Ratio des Symbols skaliert."""
+    pip_size = PIP_SIZE_MAP.get(symbol, 0.0001)
 
-    print("Loading input file...", input_file)
-    df_all = pd.read_csv(input_file)
+    # Load Volatility Ratio
+    vola_ratio = load_vola_ratio(symbol)
 
-    if "time_ny" not in df_all.columns:
-        raise RuntimeError("Column 'time_ny' not found in input file.")
+    # Calculate specific parameters
+    params = StructureParams.from_pips(pip_size, vola_ratio)
 
-    # Set index
-    df_all["time_ny"] = pd.to_datetime(df_all["time_ny"])
-    df_all = df_all.set_index("time_ny").sort_index()
+    print(f"Volatility Ratio (vs EURUSD): {vola_ratio:.4f}")
+    print(f"Min swing amplitude (pivot):                 {params.min_swing_price:.5f} ({BASE_MIN_SWING_PIPS * vola_ratio:.2f} pips)")
+    print(f"CHOCH price threshold:                       {params.choch_price:.5f} ({BASE_CHOCH_PIPS * vola_ratio:.2f} pips)")
+    print(f"Min lookahead skip:                          {params.skip_price:.5f} ({BASE_SKIP_PIPS * vola_ratio:.2f} pips)")
+    print(f"Counter Engulfing Threshold:                 {params.sc_threshold_price:.5f} ({BASE_SINGLE_COUNTER_ENGULFING * vola_ratio:.2f} pips)")
+    return params
 
-    # Filter auf Symbol
-    df_sym = df_all[df_all["symbol"] == symbol].copy()
-    if df_sym.empty:
-        print(f"Warning: No data for {symbol} in dataset.")
-        return
 
-    print(f"Rows for {symbol}: {len(df_sym)}")
+@dataclass
+class StructureContext:
+    """
+    Parameter-unabhängige Vorberechnung je Symbol: Range-Index, Pivot-Fenster,
+    Counter-Engulfing-Kerzenfolgen. Für mehrere build_structure-Läufe auf
+    denselben Bars (z.B. Parameter-Sweep) nur einmal aufbauen.
+    """
+    rmq: OhlcRangeIndex
+    pivots: PivotWindows
+    engulf: CounterEngulfCandidates
+
+
+def structure_context(df_sym: pd.DataFrame) -> StructureContext:
+    highs = df_sym["high"].to_numpy(dtype=float)
+    lows = df_sym["low"].to_numpy(dtype=float)
+    return StructureContext(
+        rmq=OhlcRangeIndex(highs, lows),
+        pivots=PivotWindows(highs, lows, LEFT_LOOKBACK, RIGHT_LOOKFORWARD),
+        engulf=CounterEngulfCandidates(df_sym["open"].to_numpy(dtype=float),
+                                       df_sym["close"].to_numpy(dtype=float), highs, lows),
+    )
 
-    # --- DYNAMIC PARAMETER CALCULATION ---
-    pip_size = PIP_SIZE_MAP.get(symbol, 0.0001)
-    
-    # Load Volatility Ratio
-    vola_ratio = load_vola_ratio(symbol)
-    
-    # Calculate specific parameters
-    # Values are in PRICE units (Pips * PipSize * Ratio)
-    min_swing_price = BASE_MIN_SWING_PIPS * vola_ratio * pip_size
-    choch_price = BASE_CHOCH_PIPS * vola_ratio * pip_size
-    skip_price = BASE_SKIP_PIPS * vola_ratio * pip_size
-    sc_threshold_price = BASE_SINGLE_COUNTER_ENGULFING * vola_ratio * pip_size
 
-    print(f"Volatility Ratio (vs EURUSD): {vola_ratio:.4f}")
-    print(f"Min swing amplitude (pivot):                 {min_swing_price:.5f} ({BASE_MIN_SWING_PIPS * vola_ratio:.2f} pips)")
-    print(f"CHOCH price threshold:                       {choch_price:.5f} ({BASE_CHOCH_PIPS * vola_ratio:.2f} pips)")
-    print(f"Min lookahead skip:                          {skip_price:.5f} ({BASE_SKIP_PIPS * vola_ratio:.2f} pips)")
-    print(f"Counter Engulfing Threshold:                 {sc_threshold_price:.5f} ({BASE_SINGLE_COUNTER_ENGULFING * vola_ratio:.2f} pips)")
+def pre_choch_context(df_sym: pd.DataFrame) -> StructureContext:
+    """
+    Nur was Steps 1-2 lesen: Pivot-Fenster + Range-Index ohne Tabellen
+    (Zwischen-Swings fragen nur Paare aufeinanderfolgender Punkte ab,
+    OhlcRangeIndex.segments). Für pre_choch_points allein, z.B. global
+    vor den Zeit-Shards.
+    """
+    highs = df_sym["high"].to_numpy(dtype=float)
+    lows = df_sym["low"].to_numpy(dtype=float)
+    return StructureContext(
+        rmq=OhlcRangeIndex.segments(highs, lows),
+        pivots=PivotWindows(highs, lows, LEFT_LOOKBACK, RIGHT_LOOKFORWARD),
+        engulf=None,
+    )
 
 
-    # --- CORE LOGIC (Steps 1-13) ---
+def pre_choch_points(df_sym: pd.DataFrame, params: StructureParams,
+                     context: StructureContext = None,
+                     metrics: PhaseMetrics = NO_METRICS) -> StructPoints:
+    """Steps 1-2: Pivots/Overrides + erste Zwischen-Swings."""
+    if context is None:
+        context = metrics.call("0_structure_context", pre_choch_context, df_sym)
 
     # 1) Pivot-Swings + prev-candle-Overrides
-    base_points = detect_struct_points(df_sym, min_swing_price, skip_price)
+    base_points = metrics.call("1_detect_struct_points", detect_struct_points,
+                               df_sym, params.min_swing_price, params.skip_price, context.pivots)
 
     # 2) Zwischen-Swings (erste Runde)
-    interm1 = ensure_intermediate_swings(df_sym, base_points)
-    base_plus_interm1 = merge_struct_points(base_points, interm1)
+    interm1 = metrics.call("2_intermediate_swings", ensure_intermediate_swings, df_sym, base_points, context.rmq)
+    return metrics.call("2_merge", merge_struct_points, base_points, interm1)
+
 
-    # 3) Vorläufige Klassifikation (für HL/LH-Referenzen)
-    df_pre = classify_swings(df_sym, base_plus_interm1)
+def _scan_choch(df_sym: pd.DataFrame, params: StructureParams, context: StructureContext,
+                base_plus_interm1: StructPoints, metrics: PhaseMetrics) -> tuple:
+    """Steps 3-4b: (choch_bear, choch_bull)."""
+    # 3) Vorläufige Klassifikation (für HL/LH-Referenzen, nur Label-Codes)
+    labels_pre = metrics.call("3_classify_pre", classify_swing_labels, base_plus_interm1)
 
     # 4a) Bearish CHOCH-LL
-    choch_bear = scan_bearish_choch(df_sym, df_pre, choch_price)
+    choch_bear = metrics.call("4a_bearish_choch", scan_bearish_choch,
+                              df_sym, base_plus_interm1, labels_pre, params.choch_price, context.rmq)
 
     # 4b) Bullish CHOCH-HH
-    choch_bull = scan_bullish_choch(df_sym, df_pre, choch_price)
+    choch_bull = metrics.call("4b_bullish_choch", scan_bullish_choch,
+                              df_sym, base_plus_interm1, labels_pre, params.choch_price, context.rmq)
+    return choch_bear, choch_bull
+
+
+def choch_points(df_sym: pd.DataFrame, params: StructureParams,
+                 context: StructureContext = None,
+                 metrics: PhaseMetrics = NO_METRICS) -> tuple:
+    """
+    Nur Steps 1-4b: (choch_bear, choch_bull) auf den ganzen Bars, z.B. einmal
+    für mehrere build_structure(choch=...)-Läufe, die sich nur in der
+    Counter-Engulfing-Schwelle unterscheiden (phase1_sweep.py).
+    """
+    if context is None:
+        context = metrics.call("0_structure_context", structure_context, df_sym)
+    return _scan_choch(df_sym, params, context, pre_choch_points(df_sym, params, context, metrics), metrics)
+
+
+def structure_points(df_sym: pd.DataFrame, params: StructureParams,
+                     context: StructureContext = None,
+                     metrics: PhaseMetrics = NO_METRICS,
+                     choch: tuple = None,
+                     pre_choch: StructPoints = None) -> StructPoints:
+    """
+    Steps 1-10: finale StructPoints (ohne Spalten, siehe finish_structure).
+    choch:     (choch_bear, choch_bull) von außen (Positionen relativ zu
+               df_sym), sonst Steps 3-4b hier.
+    pre_choch: Punkte nach Steps 1-2 von außen (pre_choch_points), sonst hier.
+    Zeit-Shards (structure_shards.py) geben beides als Ausschnitt der
+    globalen Läufe.
+    """
+    # Range-Index / Pivot-Fenster / Kerzenfolgen, einmal pro Symbol
+    if context is None:
+        context = metrics.call("0_structure_context", structure_context, df_sym)
+    rmq = context.rmq
+
+    # 1-2) Pivots/Overrides + Zwischen-Swings
+    base_plus_interm1 = pre_choch
+    if base_plus_interm1 is None:
+        base_plus_interm1 = pre_choch_points(df_sym, params, context, metrics)
+
+    # 3-4b) Vor-Klassifikation + CHOCH
+    if choch is None:
+        choch = _scan_choch(df_sym, params, context, base_plus_interm1, metrics)
+    choch_bear, choch_bull = choch
 
     # 4c) Single-Counter-Engulfing (zusätzliche Struktur-L/H)
-    # Hier nutzen wir den dynamisch berechneten sc_threshold_price
-    sc_points = scan_single_counter_engulfing(df_sym, sc_threshold_price)
+    sc_points = metrics.call("4c_counter_engulfing", scan_single_counter_engulfing,
+                             df_sym, params.sc_threshold_price, context.engulf)
 
     # 5) Merge
-    points_with_choch_sc = merge_struct_points(base_plus_interm1, choch_bear, choch_bull, sc_points)
-    interm2 = ensure_intermediate_swings(df_sym, points_with_choch_sc)
-    all_points = merge_struct_points(points_with_choch_sc, interm2)
-    all_points.sort(key=lambda x: x["pos"])
+    points_with_choch_sc = metrics.call("5_merge", merge_struct_points,
+                                        base_plus_interm1, choch_bear, choch_bull, sc_points)
+    interm2 = metrics.call("5_intermediate_swings", ensure_intermediate_swings, df_sym, points_with_choch_sc, rmq)
+    all_points = metrics.call("5_merge_intermediates", merge_struct_points, points_with_choch_sc, interm2)
 
     print(f"Total structural points after CHOCH + SC + intermediates: {len(all_points)}")
 
     # 6) Body-Filter anwenden
-    all_points = apply_body_filter(df_sym, all_points)
+    all_points = metrics.call("6_body_filter", apply_body_filter, df_sym, all_points)
 
     # 7) Temporäre Klassifikation für LH/HL-Refinement
-    df_tmp1 = classify_swings(df_sym, all_points)
+    labels_tmp1 = metrics.call("7_classify_tmp1", classify_swing_labels, all_points)
 
     # 8) LH/HL mit Pivot-Regel verfeinern
-    all_points = refine_LH_HL_with_pivot(df_sym, all_points, df_tmp1, min_swing_price)
+    all_points = metrics.call("8_refine_LH_HL", refine_LH_HL_with_pivot,
+                              df_sym, all_points, labels_tmp1, params.min_swing_price, rmq)
 
     # 9) erneute Klassifikation nach LH/HL-Refinement
-    df_tmp2 = classify_swings(df_sym, all_points)
+    labels_tmp2 = metrics.call("9_classify_tmp2", classify_swing_labels, all_points)
 
     # 10) LL/HH-Merge: keine LL-LL / HH-HH ohne LH/HL dazwischen
-    all_points = merge_consecutive_extremes(df_sym, all_points, df_tmp2)
+    return metrics.call("10_merge_extremes", merge_consecutive_extremes, df_sym, all_points, labels_tmp2)
+
 
+def build_structure(df_sym: pd.DataFrame, params: StructureParams,
+                    context: StructureContext = None,
+                    metrics: PhaseMetrics = NO_METRICS,
+                    choch: tuple = None,
+                    pre_choch: StructPoints = None) -> tuple:
+    """
+    Steps 1-12 auf den Bars EINES Symbols (nach Zeit sortiert).
+    Rückgabe: (df_final mit Swing-/BOS-Spalten, finale StructPoints).
+    context: Vorberechnung aus structure_context(df_sym), sonst hier gebaut.
+    metrics: misst jeden Schritt (phase_metrics.py), Default aus.
+    choch / pre_choch: Zwischenstände von außen, siehe structure_points.
+    """
+    all_points = structure_points(df_sym, params, context, metrics, choch=choch, pre_choch=pre_choch)
+    return finish_structure(df_sym, all_points, metrics), all_points
+
+
+def finish_structure(df_sym: pd.DataFrame, all_points: StructPoints,
+                     metrics: PhaseMetrics = NO_METRICS) -> pd.DataFrame:
+    """Steps 11-12: Labels, Leg-Relabel, Overrides und BOS aus den finalen Punkten."""
     # 11) Finale Klassifikation
-    df_final = classify_swings(df_sym, all_points)
+    df_final = metrics.call("11_classify_swings", classify_swings, df_sym, all_points)
 
     # 11b) HH/LL nur dann, wenn sie wirklich das Leg-High / Leg-Low brechen
-    df_final = relabel_inside_legs(df_final, all_points)
+    df_final = metrics.call("11b_relabel_inside_legs", relabel_inside_legs, df_final, all_points)
 
     # 11c) Single-Counter-Engulfing-Overrides (HL/LH explizit freischalten)
-    df_final = apply_counter_engulf_override(df_final, all_points)
+    df_final = metrics.call("11c_counter_engulf_override", apply_counter_engulf_override, df_final, all_points)
 
     # 12) BOS
-    df_final = detect_bos(df_final, all_points)
+    df_final = metrics.call("12_detect_bos", detect_bos, df_final, all_points)
+    return df_final
+
+
+# Phase-1-Schritte für die Zeit-Shards (structure_shards.py)
+SHARD_STEPS = ShardSteps(
+    pre_choch=pre_choch_points,
+    choch_refs=choch_references,
+    scan_choch=choch_reference_extremes,
+    choch=choch_from_extremes,
+    points=structure_points,
+    finish=finish_structure,
+)
+
+
+def make_structure_engine(symbol: str, lag: int = STREAM_LAG_BARS) -> StructureEngine:
+    """Live-Engine für ein Symbol (Bars per push, Parameter wie im Batch-Lauf)."""
+    return StructureEngine(structure_params_for_symbol(symbol),
+                           left=LEFT_LOOKBACK, right=RIGHT_LOOKFORWARD, lag=lag)
+
+
+# ---------------------------------
+# PIPELINE WRAPPER
+# ---------------------------------
+
+def phase1_input_file(symbol: str) -> str:
+    # Datasets ohne Endung (Format siehe storage.py / STORAGE_FORMAT)
+    return os.path.join(DATA_DIR, f"data_{symbol}_M5_phase0_enriched")
+
+
+def load_symbol_bars(symbol: str, input_file: str):
+    """Phase-0-Bars eines Symbols (Index time_ny, sortiert) oder None, wenn keine da sind."""
+    df_all = read_bars(input_file)
+
+    if df_all.index.name != "time_ny":
+        raise RuntimeError("Column 'time_ny' not found in input file.")
+
+    # Index = time_ny (read_bars)
+    df_all = df_all.sort_index()
+
+    # Filter auf Symbol
+    df_sym = df_all[df_all["symbol"] == symbol].copy()
+    if df_sym.empty:
+        print(f"Warning: No data for {symbol} in dataset.")
+        return None
+
+    print(f"Rows for {symbol}: {len(df_sym)}")
+    return df_sym
+
+
+def run_phase1_for_symbol(symbol: str):
+    print(f"--- Processing Phase 1 for {symbol} ---")
+
+    # Dateinamen dynamisch
+    input_file = phase1_input_file(symbol)
+
+    output_name = f"data_{symbol}_M5_phase1_structure_NY"
+    output_file = os.path.join(DATA_DIR, output_name)
+
+    if not dataset_exists(input_file):
+        print(f"Skipping {symbol}: Input file not found ({input_file})")
+        return
+
+    metrics = PhaseMetrics("phase1", symbol, enabled=METRICS_ENABLED,
+                           profile=METRICS_PROFILE, memory=METRICS_MEMORY)
+
+    print("Loading input file...", input_file)
+    df_sym = metrics.call("load_input", load_symbol_bars, symbol, input_file)
+    if df_sym is None:
+        return
+
+    # --- DYNAMIC PARAMETER CALCULATION ---
+    params = structure_params_for_symbol(symbol)
+
+    # --- CORE LOGIC (Steps 1-12) ---
+    if SHARDED_MODE:
+        # Schritte laufen in den Shard-Prozessen -> nur als Ganzes gemessen
+        df_final, _, shard_report = metrics.call(
+            "1-12_sharded", build_structure_sharded, SHARD_STEPS, params, df_sym,
+            months=SHARD_MONTHS, halo=SHARD_HALO_BARS,
+            max_workers=SHARD_WORKERS, verify=SHARD_VERIFY)
+        print_boundary_report(symbol, shard_report)
+    else:
+        df_final, _ = build_structure(df_sym, params, metrics=metrics)
 
     # 13) Speichern
     print(f"Saving to {output_file} ...")
-    df_final.to_csv(output_file, index=True)
+    metrics.call("13_save", write_bars, df_final, output_file)
+
+    if metrics:
+        metrics.print_table()
+        for path in metrics.write():
+            print(f"Metrics written: {path}")
+
+    if VERIFY_STREAMING:
+        report = compare_with_batch(build_structure, params, df_sym,
+                                    left=LEFT_LOOKBACK, right=RIGHT_LOOKFORWARD,
+                                    lag=STREAM_LAG_BARS, batch=df_final)
+        print_comparison(symbol, report)
     print(f"Done for {symbol}.\n")
 
 
@@ -1393,8 +1282,8 @@ def run_phase1_for_symbol(symbol: str):
 # ---------------------------------
 
 def main():
-    for sym in SYMBOLS:
-        run_phase1_for_symbol(sym)
+    results = run_for_symbols(run_phase1_for_symbol, SYMBOLS)
+    print_summary(results, "Phase 1")
 
 
 if __name__ == "__main__":
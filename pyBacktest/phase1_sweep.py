@@ -0,0 +1,271 @@
+import contextlib
+import importlib.util
+import io
+import itertools
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from config import PIP_SIZE_MAP
+from storage import dataset_exists, write_bars
+from symbol_runner import resolve_worker_count
+from vola_store import load_vola_ratio
+
+# ---------------------------------
+# PARAMETER-SWEEP FÜR DIE PHASE-1-SCHWELLEN
+# ---------------------------------
+#
+# Statt BASE_*-Konstanten im Phase-1-Skript zu ändern und alle Symbole neu
+# zu rechnen, nimmt sweep_symbol ein Gitter der vier Schwellen (in EURUSD-
+# Pips, skaliert wie in Phase 1 mit Pip-Size und Vola-Ratio) und rechnet je
+# Symbol:
+#   - einmal: Bars laden, structure_context (Range-Index, Pivot-Fenster,
+#     Counter-Engulfing-Kerzenfolgen / Richtungs-Masken)
+#   - je Gruppe gleicher (min_swing, skip, choch): Steps 1-4b einmal
+#     (choch_points), die Gruppe geht als Ganzes an einen Worker
+#   - je Kombination der Gruppe: build_structure(choch=...) mit diesem
+#     Kontext; nur die Counter-Engulfing-Schwelle ändert sich
+#   Prozess-Pool über die Gruppen, Bars + Kontext einmal pro Worker.
+#
+# Ergebnis: data/sweeps/phase1_sweep_<SYMBOL>.csv mit einer Zeile je
+# Kombination (Punkte, Labels, CHOCH, Counter-Engulfing, BOS, Laufzeit;
+# choch_seconds = Steps 1-4b der Gruppe, einmal für alle ihre Zeilen).
+# Mit SWEEP_WRITE_STRUCTURE zusätzlich das komplette Phase-1-Dataset je
+# Kombination (data/sweeps/data_<SYMBOL>_M5_phase1_structure_<tag>).
+
+PHASE1_SCRIPT = "phase1_structure_bos_base-eurusd-vola-ny-8am-12pm.py"
+PHASE1_MODULE = "phase1_structure"
+
+SWEEP_SYMBOLS = ["EURUSD"]
+
+# Gitter in EURUSD-Pips; fehlende Schwellen = Wert aus dem Phase-1-Skript
+SWEEP_GRID = {
+    "BASE_MIN_SWING_PIPS": [2.0, 2.5, 3.0, 3.5, 4.0],
+    "BASE_CHOCH_PIPS": [1.0, 1.5],
+    "BASE_SKIP_PIPS": [1.5],
+    "BASE_SINGLE_COUNTER_ENGULFING": [3.0, 3.5, 4.0, 4.5, 5.0],
+}
+
+SWEEP_WORKERS = None            # None = CPU-/RAM-Limit aus symbol_runner
+SWEEP_WRITE_STRUCTURE = False   # je Kombination das volle Phase-1-Dataset schreiben
+SWEEP_DIR = os.path.join("data", "sweeps")
+
+# Gitter-Schlüssel -> Argument von StructureParams.from_pips
+GRID_KEYS = {
+    "BASE_MIN_SWING_PIPS": "min_swing_pips",
+    "BASE_CHOCH_PIPS": "choch_pips",
+    "BASE_SKIP_PIPS": "skip_pips",
+    "BASE_SINGLE_COUNTER_ENGULFING": "sc_pips",
+}
+
+# Schwellen, von denen Steps 1-4b (choch_points) abhängen -> Gruppen-Schlüssel
+CHOCH_KEYS = ["BASE_MIN_SWING_PIPS", "BASE_SKIP_PIPS", "BASE_CHOCH_PIPS"]
+
+
+def load_phase1():
+    """Phase-1-Skript als Modul (Dateiname mit Bindestrichen -> importlib)."""
+    if PHASE1_MODULE in sys.modules:
+        return sys.modules[PHASE1_MODULE]
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), PHASE1_SCRIPT)
+    spec = importlib.util.spec_from_file_location(PHASE1_MODULE, path)
+    module = importlib.util.module_from_spec(spec)
+    # vor exec registrieren: Klassen daraus (StructureContext) bleiben picklebar
+    sys.modules[PHASE1_MODULE] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+# Auf Modul-Ebene laden, damit auch Worker-Prozesse (spawn) es kennen
+phase1 = load_phase1()
+
+
+def _check_keys(keys) -> None:
+    unknown = set(keys) - set(GRID_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown sweep parameter(s): {sorted(unknown)}")
+
+
+def grid_combinations(grid: dict) -> list:
+    """Alle Kombinationen des Gitters als Dicts {BASE_*: Wert}, fehlende Schlüssel mit Skript-Default."""
+    _check_keys(grid)
+    keys = list(GRID_KEYS)
+    values = [list(grid.get(k, [getattr(phase1, k)])) for k in keys]
+    return [dict(zip(keys, combo)) for combo in itertools.product(*values)]
+
+
+def group_combinations(combos: list) -> list:
+    """Kombinationen nach (min_swing, skip, choch) gruppiert, Reihenfolge wie in combos."""
+    groups = {}
+    for combo in combos:
+        groups.setdefault(tuple(combo[k] for k in CHOCH_KEYS), []).append(combo)
+    return list(groups.values())
+
+
+def combo_tag(combo: dict) -> str:
+    """Kurzname einer Kombination für Dateinamen, z.B. ms3_ch1.5_sk1.5_sc4 (fehlende Schlüssel mit Skript-Default)."""
+    _check_keys(combo)
+    combo = {k: combo.get(k, getattr(phase1, k)) for k in GRID_KEYS}
+    short = {"BASE_MIN_SWING_PIPS": "ms", "BASE_CHOCH_PIPS": "ch",
+             "BASE_SKIP_PIPS": "sk", "BASE_SINGLE_COUNTER_ENGULFING": "sc"}
+    return "_".join(f"{short[k]}{combo[k]:g}" for k in GRID_KEYS)
+
+
+def summarize_structure(df_final: pd.DataFrame, points) -> dict:
+    """Kennzahlen eines build_structure-Ergebnisses."""
+    out = {
+        "points": len(points),
+        "points_L": int(points.is_low.sum()),
+        "points_H": int(points.is_high.sum()),
+        "choch_bear": int(points.source_is("bear_choch_LL").sum()),
+        "choch_bull": int(points.source_is("bull_choch_HH").sum()),
+        "counter_engulf": int(points.source_startswith("counter_engulf").sum()),
+        "bos_up": int(df_final["bos_up"].sum()),
+        "bos_down": int(df_final["bos_down"].sum()),
+    }
+    for col in ("swing_low_label", "swing_high_label"):
+        counts = df_final[col].value_counts()
+        for label, cnt in counts.items():
+            out[f"label_{label}"] = int(cnt)
+    return out
+
+
+# ---------------------------------
+# WORKER
+# ---------------------------------
+
+# je Worker-Prozess einmal gesetzt (_init_worker)
+_worker_state = {}
+
+
+def _init_worker(symbol, df_sym, context, pip_size, vola_ratio, write_structure, out_dir):
+    _worker_state.update(symbol=symbol, df=df_sym, context=context, pip_size=pip_size,
+                         vola_ratio=vola_ratio, write_structure=write_structure, out_dir=out_dir)
+
+
+def _params(combo: dict):
+    st = _worker_state
+    return phase1.StructureParams.from_pips(
+        st["pip_size"], st["vola_ratio"], **{GRID_KEYS[k]: v for k, v in combo.items()})
+
+
+def _evaluate(combo: dict, choch: tuple = None, choch_seconds: float = None) -> dict:
+    st = _worker_state
+    params = _params(combo)
+
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        df_final, points = phase1.build_structure(st["df"], params, context=st["context"], choch=choch)
+    seconds = time.perf_counter() - t0
+
+    row = {"tag": combo_tag(combo), **combo, **summarize_structure(df_final, points),
+           "seconds": round(seconds, 3)}
+    if choch_seconds is not None:
+        row["choch_seconds"] = round(choch_seconds, 3)
+    if st["write_structure"]:
+        path = os.path.join(st["out_dir"], f"data_{st['symbol']}_M5_phase1_structure_{row['tag']}")
+        with contextlib.redirect_stdout(io.StringIO()):
+            write_bars(df_final, path)
+    return row
+
+
+def _evaluate_group(group: list) -> list:
+    """Eine Gruppe gleicher (min_swing, skip, choch): Steps 1-4b einmal, dann je Kombination."""
+    st = _worker_state
+    t0 = time.perf_counter()
+    choch = phase1.choch_points(st["df"], _params(group[0]), context=st["context"])
+    choch_seconds = time.perf_counter() - t0
+    return [_evaluate(combo, choch, choch_seconds) for combo in group]
+
+
+# ---------------------------------
+# SWEEP JE SYMBOL
+# ---------------------------------
+
+def sweep_bars(symbol: str, df_sym: pd.DataFrame, context, pip_size: float, vola_ratio: float,
+               combos: list, max_workers: int = None,
+               write_structure: bool = False, out_dir: str = SWEEP_DIR) -> pd.DataFrame:
+    """
+    Alle combos auf schon geladenen Bars + structure_context(df_sym).
+    Rückgabe: eine Zeile je Kombination, Reihenfolge wie combos.
+    """
+    groups = group_combinations(combos)
+    init_args = (symbol, df_sym, context, pip_size, vola_ratio, write_structure, out_dir)
+    workers = resolve_worker_count(len(groups), max_workers if max_workers is not None else SWEEP_WORKERS)
+    print(f"Evaluating {len(groups)} CHOCH group(s) with {workers} worker(s) ...")
+
+    if workers <= 1:
+        _init_worker(*init_args)
+        results = [_evaluate_group(group) for group in groups]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=init_args) as pool:
+            results = list(pool.map(_evaluate_group, groups))
+
+    by_tag = {row["tag"]: row for rows in results for row in rows}
+    summary = pd.DataFrame([by_tag[combo_tag(combo)] for combo in combos])
+    label_cols = [c for c in summary.columns if c.startswith("label_")]
+    summary[label_cols] = summary[label_cols].fillna(0).astype(int)
+    return summary
+
+
+def sweep_symbol(symbol: str,
+                 grid: dict = None,
+                 max_workers: int = None,
+                 write_structure: bool = None,
+                 out_dir: str = SWEEP_DIR) -> pd.DataFrame:
+    """
+    Alle Kombinationen von grid (Default SWEEP_GRID) für ein Symbol.
+    Rückgabe: Zusammenfassung je Kombination (auch als CSV in out_dir).
+    """
+    grid = SWEEP_GRID if grid is None else grid
+    write_structure = SWEEP_WRITE_STRUCTURE if write_structure is None else write_structure
+    combos = grid_combinations(grid)
+
+    input_file = phase1.phase1_input_file(symbol)
+    if not dataset_exists(input_file):
+        print(f"Skipping {symbol}: Input file not found ({input_file})")
+        return pd.DataFrame()
+
+    print(f"--- Phase 1 sweep for {symbol}: {len(combos)} combination(s) ---")
+    t0 = time.perf_counter()
+    df_sym = phase1.load_symbol_bars(symbol, input_file)
+    if df_sym is None:
+        return pd.DataFrame()
+
+    # Parameter-unabhängig, einmal pro Symbol
+    context = phase1.structure_context(df_sym)
+    pip_size = PIP_SIZE_MAP.get(symbol, 0.0001)
+    vola_ratio = load_vola_ratio(symbol)
+    print(f"Shared precomputation: {time.perf_counter() - t0:.2f}s (vola ratio {vola_ratio:.4f})")
+
+    os.makedirs(out_dir, exist_ok=True)
+    t1 = time.perf_counter()
+    summary = sweep_bars(symbol, df_sym, context, pip_size, vola_ratio, combos,
+                         max_workers=max_workers, write_structure=write_structure, out_dir=out_dir)
+
+    out_file = os.path.join(out_dir, f"phase1_sweep_{symbol}.csv")
+    summary.to_csv(out_file, index=False)
+    print(f"Sweep done: {len(combos)} combination(s) in {time.perf_counter() - t1:.1f}s "
+          f"(+{t1 - t0:.1f}s shared), saved to {out_file}")
+    return summary
+
+
+# ---------------------------------
+# MAIN
+# ---------------------------------
+
+def main():
+    for symbol in SWEEP_SYMBOLS:
+        sweep_symbol(symbol)
+
+
+if __name__ == "__main__":
+    print("Entering main() ...")
+    try:
+        main()
+    except Exception:
+        import traceback
+        print("ERROR in phase1_sweep.py:")
+        traceback.print_exc()
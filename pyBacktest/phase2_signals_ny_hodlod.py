@@ -2,8 +2,11 @@ print("phase2_signals_ny_hodlod.py - starting up...")
 
 import pandas as pd
 import os
-import json
 import numpy as np
+from session_calendar import DayIndex
+from storage import dataset_exists, read_bars, write_bars
+from symbol_runner import print_summary, run_for_symbols
+from vola_store import load_vola_ratio
 
 try:
     from config import START_DATE, END_DATE, PIP_SIZE_MAP
@@ -37,6 +40,18 @@ SETUP_TF_MINUTES = 5         # Dauer einer Kerze in Minuten (für End-Zeit-Berec
 BASE_DATA_DIR = "data"             # Hier liegt der Phase 1 Output
 CHART_DATA_DIR = "charting/data"   # Hierhin schreiben wir für die HTML
 
+# Spalten, die Phase 2 (und danach Phase 3) aus dem Phase-1-Dataset braucht.
+# Nur diese werden geladen (Spalten-Projektion, storage.py).
+PHASE2_INPUT_COLUMNS = [
+    "open", "high", "low", "close",
+    "hour_ny", "minute_ny", "date_ny", "symbol",
+    "is_day_high_bar", "is_day_low_bar",
+    "has_broken_london_high", "has_broken_london_low",
+    "london_high", "london_low",
+    "swing_low_price", "swing_low_label",
+    "swing_high_price", "swing_high_label",
+]
+
 # ---------------------------------
 # BASE CONFIG (EURUSD BASELINE)
 # ---------------------------------
@@ -129,24 +144,6 @@ def _scan_bull_fvgs_for_leg(highs, lows, start_pos: int, end_pos: int, pip_size:
                 sizes.append(size_price / pip_size)
     return sizes
 
-# ---------------------------------
-# LOAD VOLA RATIO
-# ---------------------------------
-
-def load_vola_ratio(symbol: str) -> float:
-    # Explizit das NY Ratio File laden
-    ratio_file = os.path.join(BASE_DATA_DIR, "volatility_ratios_NY.json") # BASE_DATA_DIR ist "data"
-    
-    if not os.path.exists(ratio_file):
-        return 1.0
-    try:
-        with open(ratio_file, "r") as f:
-            data = json.load(f)
-        return data.get(symbol, 1.0)
-    except:
-        return 1.0
-
-
 # ---------------------------------
 # SELL-Setup: HOD (HH) -> Break of prev HL (Close)
 # ---------------------------------
@@ -408,17 +405,18 @@ def run_phase2_one_leg_for_symbol(symbol: str):
         os.makedirs(CHART_DATA_DIR)
 
     # Dateinamen dynamisch: INPUT kommt von Phase 1 (behält _NY suffix)
-    input_filename = f"data_{symbol}_M5_phase1_structure{PHASE1_INPUT_SUFFIX}.csv"
-    input_file = os.path.join(BASE_DATA_DIR, input_filename)
+    # (Bar-Datasets ohne Endung, Format siehe storage.py / STORAGE_FORMAT)
+    input_name = f"data_{symbol}_M5_phase1_structure{PHASE1_INPUT_SUFFIX}"
+    input_file = os.path.join(BASE_DATA_DIR, input_name)
 
     # Dateinamen dynamisch: OUTPUT ist vereinfacht!
-    output_bars_filename = f"data_{symbol}_M5_signals_{SETUP_NAME}.csv"
-    output_bars_file = os.path.join(CHART_DATA_DIR, output_bars_filename)
+    output_bars_name = f"data_{symbol}_M5_signals_{SETUP_NAME}"
+    output_bars_file = os.path.join(CHART_DATA_DIR, output_bars_name)
 
     output_setups_filename = f"data_{symbol}_M5_setups_{SETUP_NAME}.csv"
     output_setups_file = os.path.join(CHART_DATA_DIR, output_setups_filename)
 
-    if not os.path.exists(input_file):
+    if not dataset_exists(input_file):
         print(f"Skipping {symbol}: Input file not found ({input_file})")
         return
 
@@ -427,10 +425,11 @@ def run_phase2_one_leg_for_symbol(symbol: str):
         return
     pip_size = PIP_SIZE_MAP[symbol]
 
-    print(f"Loading input file {input_file} ...")
-    df = pd.read_csv(input_file)
+    print(f"Loading input file {input_file} ({START_DATE_NY} -> {END_DATE_NY}) ...")
+    # Zeitraum wird schon beim Lesen angewendet (nur betroffene Monats-Partitionen)
+    df = read_bars(input_file, columns=PHASE2_INPUT_COLUMNS, start=START_DATE_NY, end=END_DATE_NY)
 
-    if "time_ny" not in df.columns:
+    if df.index.name != "time_ny":
         raise RuntimeError("Column 'time_ny' not found in input file.")
 
     df = _ensure_time_columns(df)
@@ -476,8 +475,11 @@ def run_phase2_one_leg_for_symbol(symbol: str):
 
     print(f"Scanning for {SETUP_NAME} setups...")
     
-    for day, df_day in df_sym.groupby("date_ny"):
-        df_day = df_day.sort_index()
+    # Tages-Slices über den Tages-Index (df_sym ist nach Zeit sortiert)
+    day_index = DayIndex.from_frame(df_sym)
+
+    for day, start, end in day_index.iter_days():
+        df_day = df_sym.iloc[start:end]
 
         sell_setup = find_sell_setup_for_day(
             df_sym=df_sym,
@@ -524,7 +526,7 @@ def run_phase2_one_leg_for_symbol(symbol: str):
     print(f"Total setups found: {len(setups)}")
 
     print(f"Saving bars with signals to {output_bars_file} ...")
-    df_sym.to_csv(output_bars_file, index=True)
+    write_bars(df_sym, output_bars_file)
     
     if setups:
         df_setups = pd.DataFrame(setups)
@@ -542,8 +544,8 @@ def run_phase2_one_leg_for_symbol(symbol: str):
 
 
 def main():
-    for sym in SYMBOLS:
-        run_phase2_one_leg_for_symbol(sym)
+    results = run_for_symbols(run_phase2_one_leg_for_symbol, SYMBOLS)
+    print_summary(results, "Phase 2")
 
 
 if __name__ == "__main__":
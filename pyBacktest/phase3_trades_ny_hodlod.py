@@ -5,9 +5,12 @@ from typing import Optional, Any, Dict, List
 import pandas as pd
 import numpy as np
 import os
-import json
 import random
-from config import PIP_SIZE_MAP
+from config import PIP_SIZE_MAP, START_DATE, END_DATE
+from session_calendar import DayIndex
+from storage import dataset_exists, read_bars
+from symbol_runner import print_summary, run_for_symbols
+from vola_store import load_vola_ratio
 
 # ==============================================================================
 # 1. CONFIGURATION & PARAMETERS
@@ -22,6 +25,14 @@ SETUP_NAME = "ny_hodlod"
 # --- PATHS ---
 CHART_DATA_DIR = "charting/data"
 
+# Spalten, die aus dem Phase-2-Bar-Dataset geladen werden (Spalten-Projektion)
+PHASE3_BAR_COLUMNS = [
+    "high", "low", "close",
+    "hour_ny", "minute_ny", "minute_of_day", "date_ny", "symbol",
+    "london_high", "london_low",
+    "swing_low_label", "swing_high_label",
+]
+
 # --- RISK & TRADE PARAMETERS ---
 SCENARIO_ID = "london_target_min_max_rr"
 
@@ -205,22 +216,6 @@ def calculate_safe_risk_per_trade(win_rate: float, avg_win_R: float, avg_loss_R:
     # Safety Cap final anwenden
     return min(best_risk, MAX_RISK_PER_TRADE)
 
-# Hilfsvariable für Pfad zu Ratios (liegt im Haupt 'data' Ordner, nicht 'charting/data')
-ROOT_DATA_DIR = "data"
-
-def load_vola_ratio(symbol: str) -> float:
-    # Explizit das NY Ratio File laden
-    ratio_file = os.path.join(ROOT_DATA_DIR, "volatility_ratios_NY.json")
-    
-    if not os.path.exists(ratio_file):
-        return 1.0
-    try:
-        with open(ratio_file, "r") as f:
-            data = json.load(f)
-        return data.get(symbol, 1.0)
-    except:
-        return 1.0
-
 def _get_unique_filepath(path: str) -> str:
     if not os.path.exists(path): 
         return path
@@ -823,8 +818,9 @@ def run_phase3_one_leg_for_symbol(symbol: str):
     print(f"--- Processing Phase 3 (One Leg) for {symbol} ---")
 
     # Dateinamen dynamisch bauen (Input: Phase 2 Output, simplified)
-    input_bars_filename = f"data_{symbol}_M5_signals_{SETUP_NAME}.csv"
-    input_bars_file = os.path.join(CHART_DATA_DIR, input_bars_filename)
+    # (Bar-Dataset ohne Endung, Format siehe storage.py / STORAGE_FORMAT)
+    input_bars_name = f"data_{symbol}_M5_signals_{SETUP_NAME}"
+    input_bars_file = os.path.join(CHART_DATA_DIR, input_bars_name)
 
     input_setups_filename = f"data_{symbol}_M5_setups_{SETUP_NAME}.csv"
     input_setups_file = os.path.join(CHART_DATA_DIR, input_setups_filename)
@@ -839,12 +835,14 @@ def run_phase3_one_leg_for_symbol(symbol: str):
     # Stats: data_EURGBP_M5_stats_ny_hodlod.csv
     output_stats_file = os.path.join(stats_dir, f"data_{symbol}_M5_stats_{SETUP_NAME}.csv")
 
-    if not os.path.exists(input_bars_file) or not os.path.exists(input_setups_file):
+    if not dataset_exists(input_bars_file) or not os.path.exists(input_setups_file):
         print(f"Skipping {symbol}: Input files not found. Run Phase 2 first.")
         print(f"Expected: {input_bars_file}")
         return
 
-    df_bars = pd.read_csv(input_bars_file)
+    # Phase-2-Output ist bereits auf START_DATE/END_DATE gefiltert; der Zeitraum
+    # begrenzt hier zusätzlich die gelesenen Partitionen
+    df_bars = read_bars(input_bars_file, columns=PHASE3_BAR_COLUMNS, start=START_DATE, end=END_DATE)
     df_bars = _ensure_time_columns(df_bars)
     df_setups = pd.read_csv(input_setups_file)
 
@@ -856,12 +854,17 @@ def run_phase3_one_leg_for_symbol(symbol: str):
     exit_variants = ["exit_4pm", "exit_2pm", "exit_unmanaged"]
     stats_per_exit = {}
 
+    # Tages-Index einmal pro Symbol -> Tages-Bars je Setup per O(1)-Lookup
+    if not df_bars.index.is_monotonic_increasing:
+        df_bars = df_bars.sort_index(kind="mergesort")
+    day_index = DayIndex.from_frame(df_bars)
+
     for exit_mode in exit_variants:
         results = []
         
         for i, row in df_setups.iterrows():
             date_ny = row["date_ny"]
-            df_day = df_bars[df_bars["date_ny"].astype(str) == str(date_ny)].copy()
+            df_day = day_index.frame(df_bars, date_ny)
             if df_day.empty: continue
             
             expiration_str = f"{date_ny} {ENTRY_CUTOFF_HOUR:02d}:{ENTRY_CUTOFF_MINUTE:02d}:00"
@@ -1022,8 +1025,8 @@ def run_phase3_one_leg_for_symbol(symbol: str):
     print(f"Done for {symbol}.\n")
 
 def main():
-    for sym in SYMBOLS:
-        run_phase3_one_leg_for_symbol(sym)
+    results = run_for_symbols(run_phase3_one_leg_for_symbol, SYMBOLS)
+    print_summary(results, "Phase 3")
 
 
 if __name__ == "__main__":
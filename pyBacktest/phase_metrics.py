@@ -0,0 +1,210 @@
+import cProfile
+import csv
+import json
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+from struct_points import StructPoints
+
+try:
+    import resource
+except ImportError:     # Windows
+    resource = None
+
+# ---------------------------------
+# SCHRITT-METRIKEN FÜR DIE PHASEN (ZEIT, CPU, SPEICHER, PUNKTE)
+# ---------------------------------
+#
+# PhaseMetrics misst jeden Pipeline-Schritt, der über metrics.call(...)
+# läuft:
+#   - wall_s / cpu_s:       Wandzeit / CPU-Zeit des Prozesses
+#   - max_rss_mb:           Max-RSS des Prozesses nach dem Schritt
+#                           (getrusage, Hochwassermarke, kostet nichts)
+#   - peak_mem_mb:          nur mit memory=True: Spitzen-Speicher über dem
+#                           Stand vor dem Schritt (tracemalloc, erfasst auch
+#                           NumPy-Puffer)
+#   - rows:                 Länge des ersten DataFrame-Arguments
+#   - points_in/points_out: Länge des ersten Punkt-Arguments (StructPoints,
+#                           Label-Array) bzw. des Ergebnisses
+#
+# write() legt pro Lauf data/metrics/<phase>_<symbol>_<zeit>.json und .csv
+# ab, mit profile=True zusätzlich ein cProfile-Dump (.prof) über alle
+# gemessenen Schritte (z.B. snakeviz / pstats).
+#
+# Eingeschaltet über den Parameter bzw. die Umgebungsvariablen
+# PYBT_METRICS=1, PYBT_METRICS_MEMORY=1 und PYBT_PROFILE=1. Ausgeschaltet
+# kostet call() nur den Funktionsaufruf.
+#
+# tracemalloc und cProfile hängen sich in jede Allokation bzw. jeden
+# Funktionsaufruf: Python-Schleifen werden damit um ein Vielfaches
+# langsamer als NumPy-Schritte, die Zeiten und die Rangfolge der Schritte
+# stimmen dann nicht mehr (gemessen: Body-Filter 36 % statt 5 % der Phase).
+# Deshalb sind beide opt-in; für Zeiten ohne memory / profile laufen lassen,
+# Speicher bzw. Profil in einem eigenen Lauf.
+
+METRICS_DIR = os.path.join("data", "metrics")
+
+ENV_METRICS = "PYBT_METRICS"
+ENV_MEMORY = "PYBT_METRICS_MEMORY"
+ENV_PROFILE = "PYBT_PROFILE"
+
+CSV_FIELDS = ["step", "wall_s", "cpu_s", "max_rss_mb", "peak_mem_mb", "rows", "points_in", "points_out"]
+
+# ru_maxrss: Linux in KB, macOS in Bytes
+_RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+def env_flag(name: str) -> bool:
+    return os.environ.get(name, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def _count(obj) -> Optional[int]:
+    """Anzahl Punkte: StructPoints / Label-Arrays -> len(), Tupel -> letztes Element, sonst None."""
+    if isinstance(obj, (StructPoints, np.ndarray)):
+        return len(obj)
+    if isinstance(obj, tuple) and obj:
+        return _count(obj[-1])
+    return None
+
+
+def max_rss_mb() -> Optional[float]:
+    """Max-RSS des Prozesses in MB (None ohne resource-Modul)."""
+    if resource is None:
+        return None
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _RSS_UNIT / 1024 ** 2, 1)
+
+
+class PhaseMetrics:
+    """
+    Metriken eines Phasen-Laufs für ein Symbol.
+
+    enabled=None / memory=None / profile=None: aus PYBT_METRICS /
+    PYBT_METRICS_MEMORY / PYBT_PROFILE.
+    """
+
+    def __init__(self, phase: str, symbol: str,
+                 enabled: Optional[bool] = None,
+                 profile: Optional[bool] = None,
+                 out_dir: str = METRICS_DIR,
+                 memory: Optional[bool] = None):
+        self.phase = phase
+        self.symbol = symbol
+        self.enabled = env_flag(ENV_METRICS) if enabled is None else enabled
+        memory = env_flag(ENV_MEMORY) if memory is None else memory
+        self.memory = self.enabled and memory
+        profile = env_flag(ENV_PROFILE) if profile is None else profile
+        self.profile = self.enabled and profile
+        self.out_dir = out_dir
+        self.started = datetime.now()
+        self.steps = []
+        self._profiler = cProfile.Profile() if self.profile else None
+
+    def __bool__(self) -> bool:
+        return self.enabled
+
+    def call(self, step: str, func: Callable, *args, **kwargs):
+        """func(*args, **kwargs) als gemessenen Schritt ausführen, Ergebnis durchreichen."""
+        if not self.enabled:
+            return func(*args, **kwargs)
+
+        rows = next((len(a) for a in args if isinstance(a, pd.DataFrame)), None)
+        points_in = next((c for c in map(_count, args) if c is not None), None)
+
+        own_trace = self.memory and not tracemalloc.is_tracing()
+        if own_trace:
+            tracemalloc.start()
+        if self.memory:
+            mem_before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        cpu0 = time.process_time()
+        t0 = time.perf_counter()
+        if self._profiler is not None:
+            self._profiler.enable()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            if self._profiler is not None:
+                self._profiler.disable()
+            wall = time.perf_counter() - t0
+            cpu = time.process_time() - cpu0
+            peak = None
+            if self.memory:
+                peak = max(tracemalloc.get_traced_memory()[1] - mem_before, 0) / 1024 ** 2
+            if own_trace:
+                tracemalloc.stop()
+
+        self.steps.append({
+            "step": step,
+            "wall_s": round(wall, 6),
+            "cpu_s": round(cpu, 6),
+            "max_rss_mb": max_rss_mb(),
+            "peak_mem_mb": None if peak is None else round(peak, 3),
+            "rows": rows,
+            "points_in": points_in,
+            "points_out": _count(result),
+        })
+        return result
+
+    # --- Ausgabe ---
+
+    def total(self, field: str) -> float:
+        return float(sum(s[field] or 0 for s in self.steps))
+
+    def summary(self) -> dict:
+        return {
+            "phase": self.phase,
+            "symbol": self.symbol,
+            "started": self.started.isoformat(timespec="seconds"),
+            "total_wall_s": round(self.total("wall_s"), 6),
+            "total_cpu_s": round(self.total("cpu_s"), 6),
+            "memory_traced": self.memory,
+            "profiled": self.profile,
+            "steps": self.steps,
+        }
+
+    def write(self) -> list:
+        """JSON + CSV (+ .prof) nach out_dir; Rückgabe: geschriebene Pfade."""
+        if not self.enabled:
+            return []
+        os.makedirs(self.out_dir, exist_ok=True)
+        stem = os.path.join(self.out_dir,
+                            f"{self.phase}_{self.symbol}_{self.started.strftime('%Y%m%d_%H%M%S')}")
+
+        paths = [stem + ".json", stem + ".csv"]
+        with open(paths[0], "w") as f:
+            json.dump(self.summary(), f, indent=2)
+        with open(paths[1], "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+            writer.writerows(self.steps)
+        if self._profiler is not None:
+            paths.append(stem + ".prof")
+            self._profiler.dump_stats(paths[-1])
+        return paths
+
+    def print_table(self) -> None:
+        if not self.enabled or not self.steps:
+            return
+        total = self.total("wall_s") or 1.0
+        print(f"Step metrics ({self.phase}, {self.symbol}):")
+        print(f"  {'step':<34}{'wall s':>9}{'share':>7}{'cpu s':>9}{'rss MB':>9}{'peak MB':>9}"
+              f"{'pts in':>9}{'pts out':>9}")
+        for s in self.steps:
+            rss, peak, pin, pout = ("" if s[k] is None else s[k]
+                                    for k in ("max_rss_mb", "peak_mem_mb", "points_in", "points_out"))
+            print(f"  {s['step']:<34}{s['wall_s']:>9.3f}{s['wall_s'] / total:>7.1%}{s['cpu_s']:>9.3f}"
+                  f"{rss:>9}{peak:>9}{pin:>9}{pout:>9}")
+        if self.memory or self.profile:
+            print("  (timings include tracemalloc / cProfile overhead)")
+        print(f"  {'total':<34}{self.total('wall_s'):>9.3f}{'':>7}{self.total('cpu_s'):>9.3f}")
+
+
+# Ausgeschaltete Instanz als Default-Argument (call() reicht nur durch)
+NO_METRICS = PhaseMetrics("none", "none", enabled=False, profile=False)
@@ -0,0 +1,202 @@
+import numpy as np
+
+# ---------------------------------
+# RANGE-MIN/MAX-INDEX (SPARSE TABLE) FÜR OHLC-ARRAYS
+# ---------------------------------
+#
+# Einmal pro Symbol über highs / lows aufgebaut (O(n log n)), danach
+# beantwortet jede Anfrage "max High / min Low über Bars [a, b)" samt
+# Position in O(1) - statt df.iloc[a:b]["low"].idxmin() o.ä. in Schleifen.
+#
+# Bereiche sind halboffen wie Python-Slices: [start, end).
+# Bei gleichen Werten gewinnt die erste Position (wie numpy argmin /
+# pandas idxmin). NaN wird übersprungen (wie pandas, skipna).
+#
+# SegmentScan / OhlcRangeIndex.segments: gleiche Antworten ohne Tabelle
+# für sortierte, nicht überlappende Bereiche (ein Durchlauf, O(n)).
+
+
+def _index_dtype(n: int):
+    return np.int32 if n < np.iinfo(np.int32).max else np.int64
+
+
+class SparseTable:
+    """
+    Argmin- (mode="min") bzw. Argmax-Tabelle (mode="max") über values.
+
+    Level l: Position des Extremums in [i, i + 2**l) für alle i mit
+    i + 2**l <= n.
+    """
+
+    def __init__(self, values: np.ndarray, mode: str = "min"):
+        if mode not in ("min", "max"):
+            raise ValueError(f"mode must be 'min' or 'max', got {mode!r}")
+        self.values = np.asarray(values, dtype=np.float64)
+        self.mode = mode
+
+        # Vergleichsschlüssel: immer "kleiner ist besser", NaN nie
+        key = self.values if mode == "min" else -self.values
+        self._key = np.where(np.isnan(key), np.inf, key)
+
+        n = len(self.values)
+        self.levels = [np.arange(n, dtype=_index_dtype(n))]
+        width = 1
+        while 2 * width <= n:
+            prev = self.levels[-1]
+            left = prev[:-width]
+            right = prev[width:]
+            self.levels.append(np.where(self._key[right] < self._key[left], right, left))
+            width *= 2
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def level_values(self, level: int) -> np.ndarray:
+        """Extremwerte (als Vergleichsschlüssel) aller Blöcke der Breite 2**level."""
+        return self._key[self.levels[level]]
+
+    # --- Einzelabfragen ---
+
+    def arg(self, start: int, end: int) -> int:
+        """Erste Position des Extremums in [start, end) (-1 bei leerem Bereich)."""
+        start, end = int(start), int(end)
+        if end <= start:
+            return -1
+        level = (end - start).bit_length() - 1
+        table = self.levels[level]
+        left = int(table[start])
+        right = int(table[end - (1 << level)])
+        return right if self._key[right] < self._key[left] else left
+
+    def value(self, start: int, end: int) -> float:
+        """Extremum in [start, end) (NaN bei leerem Bereich)."""
+        pos = self.arg(start, end)
+        return float(self.values[pos]) if pos >= 0 else np.nan
+
+    # --- Vektorisiert ---
+
+    def arg_many(self, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        """arg() für viele Bereiche gleichzeitig (-1 für leere Bereiche)."""
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        out = np.full(len(starts), -1, dtype=np.int64)
+        valid = ends > starts
+        if not valid.any():
+            return out
+
+        s = starts[valid]
+        e = ends[valid]
+        lengths = e - s
+        # floor(log2(Länge)), exakt über den Exponenten
+        level = np.frexp(lengths.astype(np.float64))[1].astype(np.int64) - 1
+
+        res = np.empty(len(s), dtype=np.int64)
+        for lv in np.unique(level).tolist():
+            sel = np.flatnonzero(level == lv)
+            table = self.levels[lv]
+            left = table[s[sel]].astype(np.int64)
+            right = table[e[sel] - (1 << lv)].astype(np.int64)
+            res[sel] = np.where(self._key[right] < self._key[left], right, left)
+
+        out[valid] = res
+        return out
+
+    def value_many(self, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        """value() für viele Bereiche gleichzeitig (NaN für leere Bereiche)."""
+        pos = self.arg_many(starts, ends)
+        return np.where(pos >= 0, self.values[np.maximum(pos, 0)], np.nan)
+
+
+class SegmentScan:
+    """
+    arg_many wie SparseTable, aber ohne Tabelle: ein O(n)-Durchlauf über
+    Bereiche, die nach start sortiert sind und sich nicht überlappen (z.B.
+    Paare aufeinanderfolgender Strukturpunkte). Lohnt, wenn der Index nur
+    für eine solche Abfrage gebraucht wird (Aufbau O(n log n) entfällt).
+    """
+
+    def __init__(self, values: np.ndarray, mode: str = "min"):
+        if mode not in ("min", "max"):
+            raise ValueError(f"mode must be 'min' or 'max', got {mode!r}")
+        self.values = np.asarray(values, dtype=np.float64)
+        self.mode = mode
+        key = self.values if mode == "min" else -self.values
+        self._key = np.where(np.isnan(key), np.inf, key)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def arg_many(self, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        """Erste Position des Extremums je Bereich [start, end) (-1 für leere Bereiche)."""
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        out = np.full(len(starts), -1, dtype=np.int64)
+        valid = ends > starts
+        if not valid.any():
+            return out
+
+        s = starts[valid]
+        e = ends[valid]
+        if (s[1:] < e[:-1]).any():
+            raise ValueError("ranges must be sorted and must not overlap")
+        lengths = e - s
+        # Alle Bereichs-Positionen hintereinander, je Bereich das Minimum
+        # des Schlüssels; erste Position mit diesem Wert = erster Treffer
+        offsets = np.cumsum(lengths) - lengths
+        flat = np.repeat(s - offsets, lengths) + np.arange(int(lengths.sum()), dtype=np.int64)
+        key = self._key[flat]
+        best = np.minimum.reduceat(key, offsets)
+        hits = np.flatnonzero(key == np.repeat(best, lengths))
+        out[valid] = flat[hits[np.searchsorted(hits, offsets)]]
+        return out
+
+
+class OhlcRangeIndex:
+    """
+    Max-High- / Min-Low-Abfragen über Bar-Bereiche eines Symbols.
+
+    highs / lows: Spalten-Arrays (Positionen 0 .. n-1 in Zeitreihenfolge)
+    """
+
+    def __init__(self, highs: np.ndarray, lows: np.ndarray):
+        if len(highs) != len(lows):
+            raise ValueError("highs and lows must have the same length")
+        self.high_max = SparseTable(highs, mode="max")
+        self.low_min = SparseTable(lows, mode="min")
+
+    @classmethod
+    def from_frame(cls, df) -> "OhlcRangeIndex":
+        return cls(df["high"].to_numpy(dtype=np.float64), df["low"].to_numpy(dtype=np.float64))
+
+    @classmethod
+    def segments(cls, highs: np.ndarray, lows: np.ndarray) -> "OhlcRangeIndex":
+        """Nur für arg_many über sortierte, nicht überlappende Bereiche (SegmentScan), ohne Tabellen."""
+        if len(highs) != len(lows):
+            raise ValueError("highs and lows must have the same length")
+        index = cls.__new__(cls)
+        index.high_max = SegmentScan(highs, mode="max")
+        index.low_min = SegmentScan(lows, mode="min")
+        return index
+
+    def __len__(self) -> int:
+        return len(self.low_min)
+
+    @property
+    def highs(self) -> np.ndarray:
+        return self.high_max.values
+
+    @property
+    def lows(self) -> np.ndarray:
+        return self.low_min.values
+
+    def max_high(self, start: int, end: int) -> float:
+        return self.high_max.value(start, end)
+
+    def min_low(self, start: int, end: int) -> float:
+        return self.low_min.value(start, end)
+
+    def argmax_high(self, start: int, end: int) -> int:
+        return self.high_max.arg(start, end)
+
+    def argmin_low(self, start: int, end: int) -> int:
+        return self.low_min.arg(start, end)
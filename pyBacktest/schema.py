@@ -0,0 +1,156 @@
+import numpy as np
+import pandas as pd
+
+# ---------------------------------
+# DTYPE-SCHEMA FÜR DIE M5-BAR-FRAMES (PHASE 0a – 2)
+# ---------------------------------
+#
+# Alle Phasen schreiben/lesen denselben (wachsenden) M5-Frame. Ohne Schema
+# landen Datum, Symbol und Swing-Labels als Python-Strings (object dtype)
+# im Speicher, Stunden/Minuten als int64 und konstante Spalten werden
+# mitgeschleppt. read_bars_csv / write_bars_csv erzwingen das Schema beim
+# Laden und Speichern.
+#
+# Preise bleiben float64: Struktur- und Break-Logik vergleichen Preise und
+# Preis-Differenzen exakt mit Schwellen (Pips * Ratio * PipSize); float32
+# würde diese Vergleiche und damit die Ergebnisse verändern.
+# Volumen wird nur durchgereicht -> float32 reicht.
+
+PRICE_DTYPE = "float64"
+VOLUME_DTYPE = "float32"
+
+SWING_LOW_LABELS = ["LL", "HL", "L_eq", "L0"]
+SWING_HIGH_LABELS = ["HH", "LH", "H_eq", "H0"]
+
+BAR_SCHEMA = {
+    # Preise
+    "open": PRICE_DTYPE,
+    "high": PRICE_DTYPE,
+    "low": PRICE_DTYPE,
+    "close": PRICE_DTYPE,
+    "day_high": PRICE_DTYPE,
+    "day_low": PRICE_DTYPE,
+    "london_high": PRICE_DTYPE,
+    "london_low": PRICE_DTYPE,
+    "swing_low_price": PRICE_DTYPE,
+    "swing_high_price": PRICE_DTYPE,
+    # Volumen
+    "tick_volume": VOLUME_DTYPE,
+    # Zeit
+    "hour_ny": "int8",
+    "minute_ny": "int8",
+    "minute_of_day": "int16",
+    "date_ny": "datetime64[ns]",
+    # Kategorien
+    "symbol": "category",
+    "swing_low_label": pd.CategoricalDtype(SWING_LOW_LABELS),
+    "swing_high_label": pd.CategoricalDtype(SWING_HIGH_LABELS),
+    # Flags
+    "is_london_session": "bool",
+    "is_ny_entry_window": "bool",
+    "has_london_range": "bool",
+    "is_day_high_bar": "bool",
+    "is_day_low_bar": "bool",
+    "is_london_high_bar": "bool",
+    "is_london_low_bar": "bool",
+    "has_broken_london_high": "bool",
+    "has_broken_london_low": "bool",
+    "bos_up": "bool",
+    "bos_down": "bool",
+    "sell_signal_top": "bool",
+    "sell_signal_bottom": "bool",
+    "buy_signal_bottom": "bool",
+    "buy_signal_top": "bool",
+}
+
+# Konstante bzw. nirgends gelesene Spalten (alte Schemata) -> werden verworfen
+DEAD_COLUMNS = ["spread", "real_volume", "london_high_raw", "london_low_raw"]
+
+# Diese Spalten werden beim CSV-Lesen nicht per dtype=... gelesen,
+# sondern erst danach konvertiert (Datum parsen, NaN in Flags)
+_POST_CAST = {"date_ny", "minute_of_day"}
+
+# Zeilen pro Block beim CSV-Lesen
+READ_CHUNK_ROWS = 20_000
+
+
+def _is_bool(dtype) -> bool:
+    return isinstance(dtype, str) and dtype == "bool"
+
+
+def enforce_bar_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Bringt einen M5-Bar-Frame ins Schema (in place, gibt df zurück):
+      - DEAD_COLUMNS entfernen
+      - bekannte Spalten casten, unbekannte Spalten bleiben unverändert
+      - Flags: fehlende Werte -> False
+      - Labels: unbekannte Werte (z.B. "") -> NaN
+    """
+    dead = [c for c in DEAD_COLUMNS if c in df.columns]
+    if dead:
+        df.drop(columns=dead, inplace=True)
+
+    for col, dtype in BAR_SCHEMA.items():
+        if col not in df.columns:
+            continue
+        s = df[col]
+        if _is_bool(dtype):
+            if s.dtype != bool:
+                df[col] = s.fillna(False).astype(bool)
+        elif dtype == "datetime64[ns]":
+            if s.dtype != np.dtype("datetime64[ns]"):
+                df[col] = pd.to_datetime(s)
+        elif s.dtype != dtype:
+            if s.dtype == object and not isinstance(dtype, pd.CategoricalDtype) and dtype != "category":
+                # z.B. Swing-Preise mit pd.NA (object) -> NaN
+                s = s.where(s.notna(), np.nan)
+            df[col] = s.astype(dtype)
+    return df
+
+
+def read_bars_csv(path: str, usecols=None) -> pd.DataFrame:
+    """
+    Liest einen M5-Bar-CSV im Schema: Index time_ny (datetime64),
+    dtypes laut BAR_SCHEMA, DEAD_COLUMNS werden gar nicht erst gelesen.
+    usecols: optionale Spaltenauswahl.
+
+    Gelesen wird blockweise (READ_CHUNK_ROWS), jeder Block wird sofort ins
+    Schema gebracht -> die object-Zwischenstände des Parsers existieren nie
+    für die ganze Datei gleichzeitig (Peak-RSS).
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    columns = [c for c in header if c not in DEAD_COLUMNS]
+    if usecols is not None:
+        wanted = set(usecols) | {"time_ny"}
+        columns = [c for c in columns if c in wanted]
+
+    dtype = {}
+    for col in columns:
+        spec = BAR_SCHEMA.get(col)
+        if spec is None or col in _POST_CAST or _is_bool(spec):
+            continue
+        dtype[col] = spec
+
+    def _prepare(chunk: pd.DataFrame) -> pd.DataFrame:
+        if "time_ny" in chunk.columns:
+            chunk["time_ny"] = pd.to_datetime(chunk["time_ny"])
+            chunk = chunk.set_index("time_ny")
+        return enforce_bar_schema(chunk)
+
+    reader = pd.read_csv(path, usecols=columns, dtype=dtype, chunksize=READ_CHUNK_ROWS)
+    parts = [_prepare(chunk) for chunk in reader]
+    if not parts:
+        # nur Header, keine Zeilen
+        parts = [_prepare(pd.read_csv(path, usecols=columns, dtype=dtype, nrows=0))]
+
+    df = pd.concat(parts) if len(parts) > 1 else parts[0]
+    del parts
+
+    # Kategorien mit blockweise unterschiedlichen Werten (z.B. symbol)
+    # werden von concat zu object -> nochmal ins Schema
+    return enforce_bar_schema(df)
+
+
+def write_bars_csv(df: pd.DataFrame, path: str) -> None:
+    """Schreibt einen M5-Bar-Frame (Index time_ny) im Schema als CSV."""
+    enforce_bar_schema(df).to_csv(path, index=True)
@@ -0,0 +1,175 @@
+import numpy as np
+
+from ohlc_aggregation import NS_PER_DAY, NS_PER_HOUR
+
+# ---------------------------------
+# SESSION-KALENDER (TRADING-TAGE)
+# ---------------------------------
+#
+# Trading-Tag = 17:00 NY des Vortags bis 16:59 des Tages (FX-Rollover).
+# Statt einer Python-date-Spalte + groupby wird jeder Bar eine int32
+# Trading-Tag-ID zugeordnet (Tage seit 1970-01-01 von t + 7h).
+#
+# Da die Bars zeitlich sortiert sind, bilden die Bars eines Tages einen
+# zusammenhängenden Block. Tages-Kennzahlen (High/Low, London-Range ...)
+# sind dann Segment-Reduktionen (ufunc.reduceat) über diese Blöcke und
+# werden per np.repeat wieder auf die Bars verteilt.
+#
+# Fehlende Werte sind float64-NaN (kein pd.NA / object dtype).
+
+# 17:00 NY + 7h = 00:00 des Trading-Tags
+DAY_SHIFT_NS = 7 * NS_PER_HOUR
+
+
+def trading_day_ids(times_ns: np.ndarray) -> np.ndarray:
+    """int32 Trading-Tag-ID je Bar (times_ns = int64 naive NY-Zeit in ns)."""
+    times_ns = np.asarray(times_ns, dtype=np.int64)
+    return ((times_ns + DAY_SHIFT_NS) // NS_PER_DAY).astype(np.int32)
+
+
+def trading_day_dates(day_ids: np.ndarray) -> np.ndarray:
+    """Trading-Tag-ID -> Datum (datetime64[ns], 00:00)."""
+    return (np.asarray(day_ids, dtype=np.int64) * NS_PER_DAY).view("datetime64[ns]")
+
+
+def day_blocks(day_ids: np.ndarray):
+    """
+    Zusammenhängende Tages-Blöcke einer sortierten ID-Folge.
+    Rückgabe: (starts, lengths) als int64-Arrays.
+    """
+    day_ids = np.asarray(day_ids)
+    n = len(day_ids)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    if np.any(np.diff(day_ids) < 0):
+        raise ValueError("day_ids must be sorted ascending")
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(day_ids)) + 1))
+    lengths = np.diff(np.append(starts, n))
+    return starts, lengths
+
+
+def block_max(values: np.ndarray, starts: np.ndarray, mask=None) -> np.ndarray:
+    """Maximum je Block (NaN-ignorierend), optional nur über Bars mit mask."""
+    vals = np.asarray(values, dtype=np.float64)
+    if mask is not None:
+        vals = np.where(mask, vals, np.nan)
+    if len(starts) == 0:
+        return np.zeros(0, dtype=np.float64)
+    return np.fmax.reduceat(vals, starts)
+
+
+def block_min(values: np.ndarray, starts: np.ndarray, mask=None) -> np.ndarray:
+    """Minimum je Block (NaN-ignorierend), optional nur über Bars mit mask."""
+    vals = np.asarray(values, dtype=np.float64)
+    if mask is not None:
+        vals = np.where(mask, vals, np.nan)
+    if len(starts) == 0:
+        return np.zeros(0, dtype=np.float64)
+    return np.fmin.reduceat(vals, starts)
+
+
+def broadcast_blocks(block_values: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Block-Werte zurück auf die Bars verteilen."""
+    return np.repeat(block_values, lengths)
+
+
+# ---------------------------------
+# TAGES-INDEX (O(1) TAGES-SLICES)
+# ---------------------------------
+#
+# Einmal pro Symbol gebaut; ersetzt groupby("date_ny") und das Filtern
+# df[df["date_ny"] == tag] pro Setup. Tag -> Block über eine Lookup-Tabelle
+# (Tag - erster Tag), Slices sind Views auf die sortierten Bars.
+
+def date_to_day_id(date) -> int:
+    """Datum (str, date, Timestamp, datetime64) -> Tag-ID (Tage seit 1970-01-01)."""
+    return int(np.datetime64(date, "D").astype(np.int64))
+
+
+class DayIndex:
+    """
+    Start-/End-Offsets je Trading-Tag über zeitlich sortierten Bars.
+
+    times_ns: int64 naive NY-Zeit je Bar (sortiert)
+    day_ids:  Tag-ID je Bar (None -> trading_day_ids(times_ns))
+    """
+
+    def __init__(self, times_ns: np.ndarray, day_ids=None):
+        self.times_ns = np.asarray(times_ns, dtype=np.int64)
+        if day_ids is None:
+            day_ids = trading_day_ids(self.times_ns)
+        day_ids = np.asarray(day_ids, dtype=np.int64)
+        if len(day_ids) != len(self.times_ns):
+            raise ValueError("times_ns and day_ids must have the same length")
+
+        starts, lengths = day_blocks(day_ids)
+        self.days = day_ids[starts].astype(np.int32)
+        self.starts = starts
+        self.ends = starts + lengths
+
+        # Lookup-Tabelle: (Tag - erster Tag) -> Block-Nr. bzw. -1
+        if len(self.days):
+            self.first_day = int(self.days[0])
+            self._lut = np.full(int(self.days[-1]) - self.first_day + 1, -1, dtype=np.int32)
+            self._lut[self.days - self.first_day] = np.arange(len(self.days), dtype=np.int32)
+        else:
+            self.first_day = 0
+            self._lut = np.zeros(0, dtype=np.int32)
+
+    @classmethod
+    def from_frame(cls, df, date_col: str = "date_ny") -> "DayIndex":
+        """Aus einem Bar-Frame (Index time_ny); Tage aus date_col, sonst aus der Zeit."""
+        times_ns = np.asarray(df.index.values, dtype="datetime64[ns]").view(np.int64)
+        day_ids = None
+        if date_col in df.columns:
+            dates = np.asarray(df[date_col].values, dtype="datetime64[D]")
+            day_ids = dates.astype(np.int64)
+        return cls(times_ns, day_ids)
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    def block(self, date) -> int:
+        """Block-Nr. des Tages oder -1 (O(1))."""
+        pos = date_to_day_id(date) - self.first_day
+        if pos < 0 or pos >= len(self._lut):
+            return -1
+        return int(self._lut[pos])
+
+    def bounds(self, date):
+        """(start, end) des Tages als Bar-Offsets, (0, 0) wenn der Tag fehlt."""
+        b = self.block(date)
+        if b < 0:
+            return 0, 0
+        return int(self.starts[b]), int(self.ends[b])
+
+    def range_bounds(self, first_date, last_date):
+        """(start, end) über alle Tage first_date ... last_date (inklusive)."""
+        lo = date_to_day_id(first_date)
+        hi = date_to_day_id(last_date)
+        a = int(np.searchsorted(self.days, lo, side="left"))
+        b = int(np.searchsorted(self.days, hi, side="right"))
+        if a >= b:
+            return 0, 0
+        return int(self.starts[a]), int(self.ends[b - 1])
+
+    def view(self, values: np.ndarray, date) -> np.ndarray:
+        """Zero-Copy-View der Bars eines Tages aus einem Spalten-Array."""
+        start, end = self.bounds(date)
+        return values[start:end]
+
+    def frame(self, df, date):
+        """Bars eines Tages als DataFrame-Slice (iloc, keine Suche über df)."""
+        start, end = self.bounds(date)
+        return df.iloc[start:end]
+
+    def frame_range(self, df, first_date, last_date):
+        """Bars mehrerer aufeinanderfolgender Tage als DataFrame-Slice."""
+        start, end = self.range_bounds(first_date, last_date)
+        return df.iloc[start:end]
+
+    def iter_days(self):
+        """(Datum als datetime64[ns], start, end) je Tag in zeitlicher Reihenfolge."""
+        dates = trading_day_dates(self.days)
+        for d, start, end in zip(dates, self.starts, self.ends):
+            yield d, int(start), int(end)
@@ -0,0 +1,317 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from schema import enforce_bar_schema, read_bars_csv, write_bars_csv
+
+try:
+    from config import EXPORT_CSV, STORAGE_FORMAT
+except ImportError:
+    STORAGE_FORMAT = "npy"
+    EXPORT_CSV = False
+
+# ---------------------------------
+# SPALTEN-SPEICHER FÜR ZWISCHENERGEBNISSE
+# ---------------------------------
+#
+# Übergabe der M5-Bar-Frames zwischen den Phasen als typisierte Spalten
+# statt als CSV. Ein Dataset wird über seinen Basis-Pfad ohne Endung
+# angesprochen, z.B. data/data_EURUSD_M5_phase1_structure_NY.
+#
+# Formate:
+#   "npy"     -> Ordner <basis>.cols/, partitioniert nach Jahr/Monat (time_ny):
+#                  <basis>.cols/catalog.json
+#                  <basis>.cols/2024/03/<spalte>.npy ...
+#                catalog.json: Spalten (Reihenfolge, dtypes, Kategorien) und
+#                je Partition min/max time_ny + Zeilenzahl. Immer verfügbar.
+#   "parquet" -> <basis>.parquet (benötigt pyarrow)
+#   "csv"     -> <basis>.csv, nur noch als Export (EXPORT_CSV) für Viewer /
+#                zum Reinschauen, bzw. Lesen alter Outputs
+#
+# read_bars(basis, columns=[...], start=..., end=...) liest nur die
+# angeforderten Spalten und (npy) nur die Partitionen, die [start, end)
+# überlappen. Die Datasets sind pro Symbol, die Partitionierung ist damit
+# Symbol/Jahr/Monat.
+# Existieren mehrere Formate, gewinnt die jüngste Datei.
+
+FORMAT_EXTENSIONS = {
+    "npy": ".cols",
+    "parquet": ".parquet",
+    "csv": ".csv",
+}
+
+NPY_CATALOG_FILENAME = "catalog.json"
+NPY_CATALOG_VERSION = 2
+INDEX_FILENAME = "__index__.npy"
+
+try:
+    import pyarrow  # noqa: F401
+    HAS_PARQUET = True
+except ImportError:
+    HAS_PARQUET = False
+
+
+def dataset_file(path_base: str, fmt: str) -> str:
+    return path_base + FORMAT_EXTENSIONS[fmt]
+
+
+def _resolve_format(fmt=None) -> str:
+    fmt = fmt or STORAGE_FORMAT
+    if fmt not in FORMAT_EXTENSIONS:
+        raise ValueError(f"Unknown storage format: {fmt}")
+    if fmt == "parquet" and not HAS_PARQUET:
+        print("WARN: pyarrow not installed, falling back to npy storage.")
+        fmt = "npy"
+    return fmt
+
+
+def _format_mtime(path_base: str, fmt: str):
+    path = dataset_file(path_base, fmt)
+    if fmt == "npy":
+        path = os.path.join(path, NPY_CATALOG_FILENAME)
+    if not os.path.exists(path):
+        return None
+    return os.path.getmtime(path)
+
+
+def stored_format(path_base: str):
+    """Format der jüngsten vorhandenen Variante des Datasets (oder None)."""
+    best, best_mtime = None, None
+    for fmt in FORMAT_EXTENSIONS:
+        if fmt == "parquet" and not HAS_PARQUET:
+            continue
+        mtime = _format_mtime(path_base, fmt)
+        if mtime is not None and (best_mtime is None or mtime > best_mtime):
+            best, best_mtime = fmt, mtime
+    return best
+
+
+def dataset_exists(path_base: str) -> bool:
+    return stored_format(path_base) is not None
+
+
+# ---------------------------------
+# NPY (PARTITIONIERTE SPALTEN-DATEIEN)
+# ---------------------------------
+
+def _column_arrays(df: pd.DataFrame):
+    """Spalten -> (Katalog-Einträge, {name: np.ndarray}, {name: Null-Maske})."""
+    entries, arrays, masks = [], {}, {}
+    for col in df.columns:
+        s = df[col]
+        entry = {"name": col}
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            entry["kind"] = "category"
+            entry["categories"] = [str(c) for c in s.cat.categories]
+            values = s.cat.codes.to_numpy()
+        elif s.dtype == object:
+            # Freitext-Spalten (nicht im Schema): Strings + Null-Maske
+            entry["kind"] = "string"
+            mask = s.isna().to_numpy()
+            values = s.where(~mask, "").astype(str).to_numpy().astype("U")
+            masks[col] = mask
+        else:
+            entry["kind"] = "plain"
+            values = s.to_numpy()
+        entry["dtype"] = str(values.dtype)
+        entries.append(entry)
+        arrays[col] = values
+    return entries, arrays, masks
+
+
+def _month_blocks(times: np.ndarray):
+    """Zusammenhängende Monats-Blöcke eines sortierten datetime64-Arrays."""
+    months = times.astype("datetime64[M]")
+    if len(months) == 0:
+        return []
+    starts = np.concatenate(([0], np.flatnonzero(months[1:] != months[:-1]) + 1))
+    ends = np.append(starts[1:], len(months))
+    return [(months[a], a, b) for a, b in zip(starts, ends)]
+
+
+def _write_npy(df: pd.DataFrame, folder: str) -> None:
+    # Alten Stand komplett entfernen (sonst bleiben Partitionen / Spalten liegen)
+    if os.path.exists(folder):
+        shutil.rmtree(folder)
+    os.makedirs(folder)
+
+    if not df.index.is_monotonic_increasing:
+        df = df.sort_index(kind="mergesort")
+
+    times = df.index.values.astype("datetime64[ns]")
+    entries, arrays, masks = _column_arrays(df)
+
+    partitions = []
+    for month, a, b in _month_blocks(times):
+        year_str, month_str = str(month).split("-")
+        rel_path = f"{year_str}/{month_str}"
+        part_dir = os.path.join(folder, year_str, month_str)
+        os.makedirs(part_dir)
+
+        np.save(os.path.join(part_dir, INDEX_FILENAME), times[a:b])
+        for col, values in arrays.items():
+            np.save(os.path.join(part_dir, f"{col}.npy"), values[a:b])
+        for col, mask in masks.items():
+            np.save(os.path.join(part_dir, f"{col}.isna.npy"), mask[a:b])
+
+        partitions.append({
+            "path": rel_path,
+            "year": int(year_str),
+            "month": int(month_str),
+            "rows": int(b - a),
+            "min_time": str(times[a]),
+            "max_time": str(times[b - 1]),
+        })
+
+    # catalog.json zuletzt -> ein abgebrochener Schreibvorgang gilt nie als gültig
+    catalog = {
+        "version": NPY_CATALOG_VERSION,
+        "rows": len(df),
+        "index": df.index.name,
+        "columns": entries,
+        "partitions": partitions,
+    }
+    with open(os.path.join(folder, NPY_CATALOG_FILENAME), "w") as f:
+        json.dump(catalog, f, indent=2)
+
+
+def read_catalog(path_base: str) -> dict:
+    """catalog.json eines npy-Datasets (Spalten + Partitionen)."""
+    folder = dataset_file(path_base, "npy")
+    with open(os.path.join(folder, NPY_CATALOG_FILENAME), "r") as f:
+        catalog = json.load(f)
+    if catalog.get("version") != NPY_CATALOG_VERSION:
+        raise RuntimeError(f"Unsupported dataset version in {folder} (re-run the producing phase)")
+    return catalog
+
+
+def _select_partitions(partitions: list, start=None, end=None) -> list:
+    """Partitionen, die [start, end) überlappen (Prädikat-Pushdown)."""
+    selected = []
+    for part in partitions:
+        if start is not None and pd.Timestamp(part["max_time"]) < start:
+            continue
+        if end is not None and pd.Timestamp(part["min_time"]) >= end:
+            continue
+        selected.append(part)
+    return selected
+
+
+def _read_npy(path_base: str, columns=None, start=None, end=None) -> pd.DataFrame:
+    folder = dataset_file(path_base, "npy")
+    catalog = read_catalog(path_base)
+
+    entries = catalog["columns"]
+    if columns is not None:
+        wanted = set(columns)
+        entries = [e for e in entries if e["name"] in wanted]
+
+    parts = _select_partitions(catalog["partitions"], start, end)
+    part_dirs = [os.path.join(folder, *p["path"].split("/")) for p in parts]
+
+    def load(filename: str, dtype: str) -> np.ndarray:
+        if not part_dirs:
+            return np.zeros(0, dtype=dtype)
+        return np.concatenate([np.load(os.path.join(d, filename)) for d in part_dirs])
+
+    times = load(INDEX_FILENAME, "datetime64[ns]")
+    keep = None
+    if start is not None or end is not None:
+        keep = np.ones(len(times), dtype=bool)
+        if start is not None:
+            keep &= times >= np.datetime64(pd.Timestamp(start))
+        if end is not None:
+            keep &= times < np.datetime64(pd.Timestamp(end))
+        if keep.all():
+            keep = None
+        else:
+            times = times[keep]
+
+    data = {}
+    for e in entries:
+        col = e["name"]
+        values = load(f"{col}.npy", e["dtype"])
+        if keep is not None:
+            values = values[keep]
+        if e["kind"] == "category":
+            data[col] = pd.Categorical.from_codes(values, categories=e["categories"])
+        elif e["kind"] == "string":
+            mask = load(f"{col}.isna.npy", "bool")
+            if keep is not None:
+                mask = mask[keep]
+            obj = values.astype(object)
+            obj[mask] = np.nan
+            data[col] = obj
+        else:
+            data[col] = values
+
+    index = pd.DatetimeIndex(times, name=catalog["index"])
+    return pd.DataFrame(data, index=index, columns=[e["name"] for e in entries])
+
+
+# ---------------------------------
+# ÖFFENTLICHE API
+# ---------------------------------
+
+def write_bars(df: pd.DataFrame, path_base: str, fmt=None, export_csv=None) -> str:
+    """
+    Speichert einen M5-Bar-Frame (Index time_ny) im Bar-Schema.
+    export_csv=None -> EXPORT_CSV aus config.py.
+    Rückgabe: Pfad der geschriebenen Binär-Datei / des Ordners.
+    """
+    fmt = _resolve_format(fmt)
+    export_csv = EXPORT_CSV if export_csv is None else export_csv
+    enforce_bar_schema(df)
+
+    # CSV zuerst, damit die Binär-Variante die jüngste ist
+    if export_csv or fmt == "csv":
+        write_bars_csv(df, dataset_file(path_base, "csv"))
+    if fmt == "csv":
+        return dataset_file(path_base, "csv")
+
+    target = dataset_file(path_base, fmt)
+    if fmt == "parquet":
+        df.to_parquet(target, index=True)
+    else:
+        _write_npy(df, target)
+    return target
+
+
+def read_bars(path_base: str, columns=None, start=None, end=None) -> pd.DataFrame:
+    """
+    Lädt ein Dataset (jüngstes vorhandenes Format) im Bar-Schema.
+    columns:    nur diese Spalten lesen (Index time_ny kommt immer mit)
+    start, end: nur Bars mit start <= time_ny < end. Bei npy werden nur
+                die betroffenen Monats-Partitionen geöffnet.
+    """
+    fmt = stored_format(path_base)
+    if fmt is None:
+        raise FileNotFoundError(f"No dataset found for {path_base}")
+
+    path = dataset_file(path_base, fmt)
+    if fmt == "npy":
+        # Zeitfilter passiert bereits beim Lesen der Partitionen
+        return enforce_bar_schema(_read_npy(path_base, columns, start, end))
+
+    if fmt == "parquet":
+        if columns is not None:
+            import pyarrow.parquet as pq
+            available = set(pq.ParquetFile(path).schema_arrow.names)
+            columns = [c for c in columns if c in available]
+        filters = []
+        if start is not None:
+            filters.append(("time_ny", ">=", pd.Timestamp(start)))
+        if end is not None:
+            filters.append(("time_ny", "<", pd.Timestamp(end)))
+        df = pd.read_parquet(path, columns=columns, filters=filters or None)
+    else:
+        df = read_bars_csv(path, usecols=columns)
+
+    if start is not None:
+        df = df.loc[df.index >= start]
+    if end is not None:
+        df = df.loc[df.index < end]
+    return enforce_bar_schema(df)
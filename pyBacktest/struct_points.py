@@ -0,0 +1,185 @@
+import numpy as np
+
+# ---------------------------------
+# STRUKTURPUNKTE ALS PARALLELE ARRAYS (PHASE 1)
+# ---------------------------------
+#
+# Ein Strukturpunkt = (pos, kind, price, source) mit
+#   pos:    Bar-Position im Symbol-Frame (0 .. n-1)
+#   kind:   KIND_L / KIND_H
+#   price:  Low bzw. High des Punkts
+#   source: Code in SOURCES ("pivot", "bear_choch_LL", ...)
+#
+# StructPoints hält diese Felder als NumPy-Arrays, immer sortiert nach pos.
+# Bei gleicher pos bleibt die Reihenfolge der Entstehung erhalten
+# (Basis-Pivots vor Zwischen-Swings vor CHOCH vor Counter-Engulfing),
+# damit alle Schritte die Punkte in derselben Folge sehen wie früher die
+# Dict-Listen nach sorted(..., key=pos).
+
+KIND_L = 0
+KIND_H = 1
+KIND_NAMES = ("L", "H")
+
+SOURCES = (
+    "pivot",
+    "override_prev_drop_L",
+    "override_prev_spike_H",
+    "intermediate_L_between_HH",
+    "intermediate_H_between_LL",
+    "bear_choch_LL",
+    "bull_choch_HH",
+    "counter_engulf_L",
+    "counter_engulf_L_high",
+    "counter_engulf_H",
+    "counter_engulf_H_low",
+)
+SOURCE_CODES = {name: code for code, name in enumerate(SOURCES)}
+
+# Swing-Labels (Ergebnis der Klassifikation, je Punkt ein Code)
+SWING_LABELS = ("L0", "HL", "LL", "L_eq", "H0", "HH", "LH", "H_eq")
+LABEL_CODES = {name: code for code, name in enumerate(SWING_LABELS)}
+
+
+def source_code(name: str) -> int:
+    if name not in SOURCE_CODES:
+        raise ValueError(f"Unknown struct point source: {name!r}")
+    return SOURCE_CODES[name]
+
+
+def label_code(name: str) -> int:
+    if name not in LABEL_CODES:
+        raise ValueError(f"Unknown swing label: {name!r}")
+    return LABEL_CODES[name]
+
+
+def label_names(codes: np.ndarray) -> np.ndarray:
+    """Label-Codes -> Namen (object array)."""
+    return np.asarray(SWING_LABELS, dtype=object)[np.asarray(codes)]
+
+
+def source_codes_with_prefix(prefix: str) -> np.ndarray:
+    """Alle Source-Codes, deren Name mit prefix beginnt."""
+    return np.array([c for c, name in enumerate(SOURCES) if name.startswith(prefix)], dtype=np.int16)
+
+
+class StructPoints:
+    """
+    Strukturpunkte eines Symbols als parallele Arrays, sortiert nach pos.
+
+    Konstruktor übernimmt die Arrays unverändert (Reihenfolge muss bereits
+    stimmen); from_unsorted / merge sortieren selbst.
+    """
+
+    __slots__ = ("pos", "kind", "price", "source")
+
+    def __init__(self, pos, kind, price, source):
+        self.pos = np.asarray(pos, dtype=np.int64)
+        n = len(self.pos)
+        self.kind = np.broadcast_to(np.asarray(kind, dtype=np.int8), (n,)).copy()
+        self.price = np.asarray(price, dtype=np.float64)
+        self.source = np.broadcast_to(np.asarray(source, dtype=np.int16), (n,)).copy()
+        if not (len(self.kind) == len(self.price) == len(self.source) == n):
+            raise ValueError("StructPoints arrays must have the same length")
+
+    # --- Konstruktion ---
+
+    @classmethod
+    def empty(cls) -> "StructPoints":
+        return cls(np.zeros(0, dtype=np.int64), KIND_L, np.zeros(0), 0)
+
+    @classmethod
+    def from_positions(cls, pos, kind: int, values: np.ndarray, source: str) -> "StructPoints":
+        """Punkte einer Art / Quelle an den (sortierten) Positionen pos, Preis = values[pos]."""
+        pos = np.asarray(pos, dtype=np.int64)
+        return cls(pos, kind, np.asarray(values, dtype=np.float64)[pos], source_code(source))
+
+    @classmethod
+    def concat(cls, *parts: "StructPoints") -> "StructPoints":
+        """Aneinanderhängen ohne Sortierung / Dedup."""
+        parts = [p for p in parts if len(p)]
+        if not parts:
+            return cls.empty()
+        return cls(
+            np.concatenate([p.pos for p in parts]),
+            np.concatenate([p.kind for p in parts]),
+            np.concatenate([p.price for p in parts]),
+            np.concatenate([p.source for p in parts]),
+        )
+
+    @classmethod
+    def from_unsorted(cls, *parts: "StructPoints") -> "StructPoints":
+        """Aneinanderhängen + stabil nach pos sortieren (ohne Dedup)."""
+        out = cls.concat(*parts)
+        return out.take(np.argsort(out.pos, kind="stable"))
+
+    @classmethod
+    def merge(cls, *parts: "StructPoints") -> "StructPoints":
+        """
+        Punkte mehrerer Sets mergen, Duplikate (pos, kind) entfernen.
+        Es gewinnt das erste Vorkommen (frühestes Set); Ergebnis nach pos
+        sortiert, bei gleicher pos in Merge-Reihenfolge.
+        """
+        out = cls.from_unsorted(*parts)
+        if len(out) < 2:
+            return out
+        key = out.pos * 2 + out.kind
+        _, first = np.unique(key, return_index=True)
+        keep = np.zeros(len(out), dtype=bool)
+        keep[first] = True
+        return out.filter(keep)
+
+    # --- Zugriff ---
+
+    def __len__(self) -> int:
+        return len(self.pos)
+
+    def __repr__(self) -> str:
+        return f"StructPoints(n={len(self)}, L={int(self.is_low.sum())}, H={int(self.is_high.sum())})"
+
+    def take(self, indexer) -> "StructPoints":
+        """Teilmenge per Positions-Array (Reihenfolge wie indexer)."""
+        return StructPoints(self.pos[indexer], self.kind[indexer], self.price[indexer], self.source[indexer])
+
+    def filter(self, mask: np.ndarray) -> "StructPoints":
+        """Teilmenge per Bool-Maske (Reihenfolge bleibt)."""
+        mask = np.asarray(mask, dtype=bool)
+        if len(mask) != len(self):
+            raise ValueError("mask length does not match StructPoints")
+        return self.take(mask)
+
+    @property
+    def is_low(self) -> np.ndarray:
+        return self.kind == KIND_L
+
+    @property
+    def is_high(self) -> np.ndarray:
+        return self.kind == KIND_H
+
+    def source_is(self, name: str) -> np.ndarray:
+        return self.source == source_code(name)
+
+    def source_startswith(self, prefix: str) -> np.ndarray:
+        return np.isin(self.source, source_codes_with_prefix(prefix))
+
+    def source_names(self) -> np.ndarray:
+        return np.asarray(SOURCES, dtype=object)[self.source]
+
+    def kind_names(self) -> np.ndarray:
+        return np.asarray(KIND_NAMES, dtype=object)[self.kind]
+
+    def times(self, index):
+        """Zeitstempel der Punkte aus dem Index des Symbol-Frames."""
+        return index[self.pos]
+
+    def to_records(self, index) -> list:
+        """Als Liste von Dicts {"idx", "kind", "price", "pos", "source"} (Debug / Export)."""
+        return [
+            {"idx": idx, "kind": kind, "price": price, "pos": pos, "source": source}
+            for idx, kind, price, pos, source in zip(
+                self.times(index).tolist(),
+                self.kind_names().tolist(),
+                self.price.tolist(),
+                self.pos.tolist(),
+                self.source_names().tolist(),
+            )
+        ]
@@ -0,0 +1,1046 @@
+import contextlib
+import heapq
+import io
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from schema import BAR_SCHEMA
+from struct_points import KIND_H, KIND_L, KIND_NAMES, SOURCES, source_code
+
+# ---------------------------------
+# ONLINE-STRUKTUR-ENGINE (PHASE 1 BAR FÜR BAR)
+# ---------------------------------
+#
+# StructureEngine rechnet die Phase-1-Struktur (Steps 1-12 aus
+# build_structure) inkrementell: jede neue Bar (M5 oder M1, die Logik ist
+# timeframe-neutral) läuft einmal durch dieselben Schritte, als Stufen
+# mit eigenem Zustand statt als Pässe über die ganze Historie:
+#
+#   1  Pivots / Overrides        an Bar t-R, sobald RIGHT_LOOKFORWARD da ist
+#   2  Zwischen-Swings           je Paar aufeinanderfolgender Basis-Punkte
+#   3  Vor-Klassifikation        vorheriger Punkt gleicher Art
+#   4  CHOCH                     offene HL/L0- bzw. LH/H0-Referenzen, jede
+#                                neue Bar prüft Break und Base-Candle
+#   4c Counter-Engulfing         an Bar t-1
+#   5  Merge + Zwischen-Swings   je Paar im gemergten Set
+#   6-7  Body-Filter + Labels    kausal (letzte akzeptierte H/L)
+#   8  LH/HL-Refinement          wartet auf den nächsten High/Low-Swing
+#   9-10 Labels + LL/HH-Merge    wartet auf den nächsten Low/High-Swing
+#   11 Labels, Leg-Relabel, Counter-Engulf-Override, 12 BOS (kausal)
+#
+# Jede Stufe führt eine Frontier F: Punkte mit pos < F ändern sich nie
+# mehr (alle Eingaben dort final, alle Vorgriffe aufgelöst). Alles ab F
+# wird je Bar vorläufig nachgerechnet, so als endete die Historie jetzt.
+# Die Sicht der Engine nach Bar t ist damit exakt build_structure auf
+# den Bars 0..t (vorläufig) bzw. auf der ganzen Historie (final).
+#
+# Ausgabe: jede Bar wird genau einmal nach `lag` Folgebars ausgegeben
+# (Spalten + Events), mit ihrem Stand zu diesem Zeitpunkt. Ändert sich
+# eine schon ausgegebene Bar danach noch (typisch: später CHOCH, ein
+# LH/HL fällt beim Refinement weg, ein LL/HH beim Merge), kommt für sie
+# ein "revision"-Event mit ihren neuen Events; EngineOutput.revised
+# enthält die neuen Spalten. Ausgegebene Bars + Revisionen ergeben exakt
+# den Batch-Lauf (compare_with_batch, tests/test_structure_engine.py).
+#
+# Bestätigungs-Lag: Default 12 Bars (1 Stunde M5). Gemessen auf den
+# M5-Daten EURUSD / GBPUSD / USDJPY (75k-150k Bars, Default-Schwellen):
+#   lag=0   ca. 48 % der Bars werden nachträglich revidiert
+#   lag=12  0.03-0.06 %, Revision spätestens 20 Bars nach der Bar
+#   lag=24  keine Revision
+# Auf dem synthetischen Random Walk der Tests (viel Rauschen um die
+# Schwellen) sind es mit lag=12 je nach Schwellen 1-20 %. Der Batch-Lauf
+# wird in jedem Fall exakt erreicht, der Lag bestimmt nur, wie oft eine
+# Bar per "revision" korrigiert wird.
+#
+# Zustand: die Bars ab dem ältesten offenen Anker (Frontier, offene
+# CHOCH-Base, Body-Filter-Referenz) plus die noch nicht gebrochenen
+# CHOCH-Referenzen (nur Schwellenpreis) - unabhängig von der
+# Historienlänge. Gekürzt wird erst ab _TRIM_MIN_BARS alten Bars am
+# Stück, max_buffered liegt damit auf den echten Daten bei ca. 4100.
+
+DEFAULT_LAG_BARS = 12
+
+STRUCTURE_COLUMNS = ["swing_low_price", "swing_high_price",
+                     "swing_low_label", "swing_high_label",
+                     "bos_up", "bos_down"]
+
+_CHOCH_SOURCES = {source_code("bear_choch_LL"): "choch_bear",
+                  source_code("bull_choch_HH"): "choch_bull"}
+
+_SRC_PIVOT = source_code("pivot")
+_SRC_DROP_L = source_code("override_prev_drop_L")
+_SRC_SPIKE_H = source_code("override_prev_spike_H")
+_SRC_INTERM_L = source_code("intermediate_L_between_HH")
+_SRC_INTERM_H = source_code("intermediate_H_between_LL")
+_SRC_BEAR_CHOCH = source_code("bear_choch_LL")
+_SRC_BULL_CHOCH = source_code("bull_choch_HH")
+_SRC_ENGULF_L = source_code("counter_engulf_L")
+_SRC_ENGULF_L_HIGH = source_code("counter_engulf_L_high")
+_SRC_ENGULF_H = source_code("counter_engulf_H")
+_SRC_ENGULF_H_LOW = source_code("counter_engulf_H_low")
+_ENGULF_SOURCES = {_SRC_ENGULF_L, _SRC_ENGULF_L_HIGH, _SRC_ENGULF_H, _SRC_ENGULF_H_LOW}
+
+# Label je Art: (erster, höher, tiefer, gleich)
+_LABELS = {KIND_L: ("L0", "HL", "LL", "L_eq"), KIND_H: ("H0", "HH", "LH", "H_eq")}
+
+_FX_ROLLOVER = pd.Timedelta(hours=17)
+
+# Abgeschnittene Bars erst ab dieser Menge wirklich löschen (amortisiert)
+_TRIM_MIN_BARS = 4096
+
+
+@dataclass
+class EngineOutput:
+    """
+    Ergebnis eines push / flush:
+      bars:    neu ausgegebene Bars (Index time_ny, STRUCTURE_COLUMNS)
+      revised: schon früher ausgegebene Bars mit geänderten Werten (letzter Stand)
+      events:  Events in Entstehungsreihenfolge
+    """
+    bars: pd.DataFrame
+    revised: pd.DataFrame
+    events: list = field(default_factory=list)
+
+
+def _label(kind: int, price: float, prev) -> str:
+    first, higher, lower, equal = _LABELS[kind]
+    if prev is None:
+        return first
+    if price > prev:
+        return higher
+    if price < prev:
+        return lower
+    return equal
+
+
+# ---------------------------------
+# BAR-BUFFER
+# ---------------------------------
+
+class _Bars:
+    """OHLC, Zeit und FX-Tag ab der absoluten Position base (ältere Bars abgeschnitten)."""
+
+    def __init__(self):
+        self.base = 0
+        self.n = 0
+        self.open, self.high, self.low, self.close = [], [], [], []
+        self.time, self.fx_day = [], []
+        # Präfixzähler je Position p: bear/doji- bzw. bull/doji-Candles in [0, p)
+        self.bear_or_doji = [0]
+        self.bull_or_doji = [0]
+
+    def append(self, time, fx_day, o: float, h: float, l: float, c: float) -> None:
+        self.open.append(o)
+        self.high.append(h)
+        self.low.append(l)
+        self.close.append(c)
+        self.time.append(time)
+        self.fx_day.append(fx_day)
+        self.bear_or_doji.append(self.bear_or_doji[-1] + (c <= o))
+        self.bull_or_doji.append(self.bull_or_doji[-1] + (c >= o))
+        self.n += 1
+
+    def trim(self, keep_from: int) -> None:
+        drop = keep_from - self.base
+        if drop < max(_TRIM_MIN_BARS, self.n - self.base - drop):
+            return
+        for values in (self.open, self.high, self.low, self.close, self.time, self.fx_day,
+                       self.bear_or_doji, self.bull_or_doji):
+            del values[:drop]
+        self.base = keep_from
+
+    # --- Zugriff über absolute Positionen ---
+
+    def o(self, p: int) -> float:
+        return self.open[p - self.base]
+
+    def h(self, p: int) -> float:
+        return self.high[p - self.base]
+
+    def l(self, p: int) -> float:
+        return self.low[p - self.base]
+
+    def c(self, p: int) -> float:
+        return self.close[p - self.base]
+
+    def argmin_low(self, start: int, end: int) -> int:
+        """Erste Position des Min-Low in [start, end) (-1 bei leerem Bereich)."""
+        best, best_pos = np.inf, -1
+        values = self.low
+        for p in range(start, end):
+            v = values[p - self.base]
+            if v < best:
+                best, best_pos = v, p
+        return best_pos
+
+    def argmax_high(self, start: int, end: int) -> int:
+        """Erste Position des Max-High in [start, end) (-1 bei leerem Bereich)."""
+        best, best_pos = -np.inf, -1
+        values = self.high
+        for p in range(start, end):
+            v = values[p - self.base]
+            if v > best:
+                best, best_pos = v, p
+        return best_pos
+
+    def has_bear_or_doji(self, start: int, end: int) -> bool:
+        """Mind. eine Candle mit close <= open in [start, end]."""
+        return self.bear_or_doji[end + 1 - self.base] > self.bear_or_doji[start - self.base]
+
+    def has_bull_or_doji(self, start: int, end: int) -> bool:
+        """Mind. eine Candle mit close >= open in [start, end]."""
+        return self.bull_or_doji[end + 1 - self.base] > self.bull_or_doji[start - self.base]
+
+
+def _intermediate(bars: _Bars, a: tuple, b: tuple):
+    """
+    Zwischen-Swing für das Paar a, b gleicher Art (ensure_intermediate_swings):
+    L zwischen zwei H bzw. H zwischen zwei L in [a.pos, b.pos), die linke
+    Bar nur, wenn sie gegen die Richtung schließt. None, wenn leer.
+    """
+    if a[1] == KIND_H:
+        first = a[0] if bars.c(a[0]) < bars.o(a[0]) else a[0] + 1
+        pos = bars.argmin_low(first, b[0])
+        return None if pos < 0 else (pos, KIND_L, bars.l(pos), _SRC_INTERM_L)
+    first = a[0] if bars.c(a[0]) > bars.o(a[0]) else a[0] + 1
+    pos = bars.argmax_high(first, b[0])
+    return None if pos < 0 else (pos, KIND_H, bars.h(pos), _SRC_INTERM_H)
+
+
+def _with_intermediates(bars: _Bars, items: list) -> list:
+    """items (nach pos sortiert) + Zwischen-Swings je Paar, Merge-Reihenfolge wie merge_struct_points."""
+    out = []
+    prev = None
+    kinds_at_prev = set()
+    for b in items:
+        if prev is not None and b[0] > prev[0]:
+            if prev[1] == b[1]:
+                add = _intermediate(bars, prev, b)
+                # bereits vorhandene (pos, kind) überspringen; nur prev.pos kann belegt sein
+                if add is not None and not (add[0] == prev[0] and add[1] in kinds_at_prev):
+                    out.append(add)
+            kinds_at_prev = set()
+        kinds_at_prev.add(b[1])
+        out.append(b)
+        prev = b
+    return out
+
+
+# ---------------------------------
+# CHOCH-REFERENZEN
+# ---------------------------------
+
+class _ChochScan:
+    """
+    Offene CHOCH-Referenzen einer Seite (scan_bearish_choch / scan_bullish_choch):
+      bearish: HL/L0, Break = bearische Candle mit low <= Swing - choch,
+               Base = close >= open, Ergebnis = erstes minLow in [Break..Base]
+      bullish: LH/H0 gespiegelt (bullisch, high >= Swing + choch, maxHigh)
+    """
+
+    def __init__(self, bearish: bool, choch_price: float):
+        self.bearish = bearish
+        self.choch_price = choch_price
+        self.waiting = []      # Heap: noch nicht gebrochen (höchste bzw. tiefste Schwelle zuerst)
+        self.broken = []       # Break-Bars j, deren Base-Candle noch fehlt
+        self.found = {}        # Ergebnis pos -> Preis (ab der Merge-Frontier)
+        self._seq = 0
+
+    def _is_break(self, bars: _Bars, k: int, threshold: float) -> bool:
+        if self.bearish:
+            return bars.c(k) < bars.o(k) and bars.l(k) <= threshold
+        return bars.c(k) > bars.o(k) and bars.h(k) >= threshold
+
+    def _is_base(self, bars: _Bars, k: int) -> bool:
+        return bars.c(k) >= bars.o(k) if self.bearish else bars.c(k) <= bars.o(k)
+
+    def _resolve(self, bars: _Bars, j: int, k: int) -> None:
+        if self.bearish:
+            pos = bars.argmin_low(j, k + 1)
+            self.found[pos] = bars.l(pos)
+        else:
+            pos = bars.argmax_high(j, k + 1)
+            self.found[pos] = bars.h(pos)
+
+    def add(self, bars: _Bars, pos: int, price: float) -> None:
+        """Neue Referenz; die Bars pos+1 .. jetzt werden nachgeholt."""
+        if price != price:
+            return
+        threshold = price - self.choch_price if self.bearish else price + self.choch_price
+        for j in range(pos + 1, bars.n):
+            if self._is_break(bars, j, threshold):
+                for k in range(j, bars.n):
+                    if self._is_base(bars, k):
+                        self._resolve(bars, j, k)
+                        return
+                self.broken.append(j)
+                return
+        self._seq += 1
+        heapq.heappush(self.waiting, (-threshold if self.bearish else threshold, self._seq))
+
+    def on_bar(self, bars: _Bars, k: int) -> None:
+        """Neue Bar k gegen alle offenen Referenzen."""
+        if self.broken and self._is_base(bars, k):
+            for j in sorted(set(self.broken)):
+                self._resolve(bars, j, k)
+            self.broken = []
+        if not self.waiting:
+            return
+        if self.bearish:
+            if bars.c(k) < bars.o(k) and -self.waiting[0][0] >= bars.l(k):
+                while self.waiting and -self.waiting[0][0] >= bars.l(k):
+                    heapq.heappop(self.waiting)
+                self.broken.append(k)
+        elif bars.c(k) > bars.o(k) and self.waiting[0][0] <= bars.h(k):
+            while self.waiting and self.waiting[0][0] <= bars.h(k):
+                heapq.heappop(self.waiting)
+            self.broken.append(k)
+
+    def open_from(self):
+        """Früheste Position, an der noch ein Ergebnis entstehen kann (None = erst künftige Bars)."""
+        return min(self.broken) if self.broken else None
+
+
+# ---------------------------------
+# STUFEN NACH DEM MERGE (6-11)
+# ---------------------------------
+
+def _body_filter(bars: _Bars, items: list, state: list) -> list:
+    """
+    apply_body_filter + Klassifikation (Step 7) über items; state =
+    [last_H, prev_H, last_L, prev_L, letzter L-Preis, letzter H-Preis]
+    wird fortgeschrieben. Rückgabe: akzeptierte Punkte mit Label.
+    """
+    kinds_at = {}
+    for p in items:
+        kinds_at.setdefault(p[0], set()).add(p[1])
+
+    out = []
+    for p in items:
+        pos, kind, price, src = p
+        accept = True
+        if src not in _ENGULF_SOURCES and (KIND_H if kind == KIND_L else KIND_L) not in kinds_at[pos]:
+            if kind == KIND_L:
+                last, prev = state[0], state[1]
+            else:
+                last, prev = state[2], state[3]
+            ref = None
+            if last is not None:
+                if last < pos:
+                    ref = last
+                elif last == pos and prev is not None and prev < pos:
+                    ref = prev
+            if ref is not None:
+                if kind == KIND_L:
+                    accept = bars.has_bear_or_doji(ref, pos)
+                else:
+                    accept = bars.has_bull_or_doji(ref, pos)
+        if not accept:
+            continue
+        if kind == KIND_L:
+            state[3], state[2] = state[2], pos
+            label = _label(kind, price, state[4])
+            state[4] = price
+        else:
+            state[1], state[0] = state[0], pos
+            label = _label(kind, price, state[5])
+            state[5] = price
+        out.append((pos, kind, price, src, label))
+    return out
+
+
+def _classify(items: list, state: list) -> list:
+    """Label je Punkt ggü. dem vorherigen gleicher Art; state = [letzter L-Preis, letzter H-Preis]."""
+    out = []
+    for pos, kind, price, src in items:
+        out.append((pos, kind, price, src, _label(kind, price, state[kind])))
+        state[kind] = price
+    return out
+
+
+def _lookahead(items: list, k: int, counter_kind: int, counter_label: str):
+    """
+    Nächster Punkt gleicher Art nach items[k] und die Gegen-Punkte mit
+    counter_label auf dem Weg dorthin: (next oder None, [pos der Gegen-Punkte > pos]).
+    """
+    pos, kind = items[k][0], items[k][1]
+    counters = []
+    for q in items[k + 1:]:
+        if q[1] == kind:
+            return q, [c for c in counters if c < q[0]]
+        if q[1] == counter_kind and q[4] == counter_label and q[0] > pos:
+            counters.append(q[0])
+    return None, counters
+
+
+def _refine_keep(engine, items: list, k: int, n: int, final: bool):
+    """
+    refine_LH_HL_with_pivot für items[k]: True/False (behalten/verwerfen),
+    None, solange der nächste Swing gleicher Art (final=True) noch offen ist.
+    """
+    pos, kind, price, src, label = items[k]
+    if kind == KIND_H and label == "LH":
+        nxt, counters = _lookahead(items, k, KIND_L, "LL")
+    elif kind == KIND_L and label == "HL":
+        nxt, counters = _lookahead(items, k, KIND_H, "HH")
+    else:
+        return True
+
+    if counters:
+        return True
+    if nxt is None and final:
+        return None
+    # Pivot-Kriterium braucht RIGHT_LOOKFORWARD Bars nach pos (sonst nie Pivot)
+    if pos + engine.right > n - 1:
+        return None if final else False
+    return engine._pivot_confirmed(pos, kind == KIND_H)
+
+
+def _merge_keep(items: list, k: int, final: bool):
+    """
+    merge_consecutive_extremes für items[k]: das frühere LL eines LL-LL-Paars
+    ohne LH dazwischen fällt weg (HH gespiegelt, außer HH+HL auf einer Candle).
+    None, solange der nächste Swing gleicher Art (final=True) noch offen ist.
+    """
+    pos, kind, price, src, label = items[k]
+    if kind == KIND_L and label == "LL":
+        nxt, counters = _lookahead(items, k, KIND_H, "LH")
+    elif kind == KIND_H and label == "HH":
+        # HL auf derselben Candle -> bleibt
+        for step in (-1, 1):
+            j = k + step
+            while 0 <= j < len(items) and items[j][0] == pos:
+                if items[j][1] == KIND_L and items[j][4] == "HL":
+                    return True
+                j += step
+        nxt, counters = _lookahead(items, k, KIND_L, "HL")
+    else:
+        return True
+
+    if counters:
+        return True
+    if nxt is None:
+        return None if final else True
+    return nxt[4] != label
+
+
+def _decide(items: list, keep_fn) -> tuple:
+    """
+    Entscheidungen über die finalen items in Reihenfolge: (behaltene Punkte
+    vor der ersten offenen Position, Index ab dem alles offen bleibt).
+    """
+    decisions = []
+    for k in range(len(items)):
+        keep = keep_fn(items, k)
+        if keep is None:
+            # ganze Position offen lassen (Punkte einer Bar werden gemeinsam final)
+            while k > 0 and items[k - 1][0] == items[k][0]:
+                k -= 1
+            del decisions[k:]
+            break
+        decisions.append(keep)
+    kept = [p for p, keep in zip(items, decisions) if keep]
+    return kept, len(decisions)
+
+
+def _relabel(point: tuple, fx_day, state: list) -> str:
+    """
+    relabel_inside_legs für einen Punkt; state = [fx_day, bear_anchor_high,
+    bull_anchor_low, last_LL, last_HH, last_high, last_low].
+    """
+    pos, kind, price, src, label = point
+    if state[0] is None:
+        state[0] = fx_day
+    elif fx_day != state[0]:
+        state[:] = [fx_day, None, None, None, None, None, None]
+    _, bear_anchor_high, bull_anchor_low, last_LL, last_HH, last_high, last_low = state
+
+    if kind == KIND_H:
+        if label == "HH" and last_low is not None:
+            bull_anchor_low = last_low
+        if bear_anchor_high is not None and label == "HH":
+            if price <= bear_anchor_high:
+                label = "LH"
+            else:
+                bear_anchor_high = price
+        if label == "HH":
+            if last_HH is not None and price <= last_HH:
+                label = "LH"
+            else:
+                last_HH = price
+                if last_low is not None:
+                    last_LL = last_low
+        last_high = price
+    else:
+        if label == "LL" and last_high is not None:
+            bear_anchor_high = last_high
+        if bull_anchor_low is not None and label == "LL":
+            if price >= bull_anchor_low:
+                label = "HL"
+            else:
+                bull_anchor_low = price
+        if label == "LL":
+            if last_LL is not None and price >= last_LL:
+                label = "HL"
+            else:
+                last_LL = price
+                if last_high is not None:
+                    last_HH = last_high
+        last_low = price
+
+    state[1:] = [bear_anchor_high, bull_anchor_low, last_LL, last_HH, last_high, last_low]
+    return label
+
+
+def _engulf_override(point: tuple, label: str, state: list) -> str:
+    """apply_counter_engulf_override für einen Punkt; state = [letztes Low, letztes High]."""
+    pos, kind, price, src = point[:4]
+    if kind == KIND_L:
+        if src == _SRC_ENGULF_L and state[0] is not None and price > state[0]:
+            state[0] = price
+            return "HL"
+        state[0] = price
+    else:
+        if src == _SRC_ENGULF_H and state[1] is not None and price < state[1]:
+            state[1] = price
+            return "LH"
+        state[1] = price
+    return label
+
+
+# ---------------------------------
+# ENGINE
+# ---------------------------------
+
+class StructureEngine:
+    """
+    Phase-1-Struktur Bar für Bar (siehe Modulkopf).
+
+    params: Schwellen (StructureParams aus dem Phase-1-Skript)
+    left / right: LEFT_LOOKBACK / RIGHT_LOOKFORWARD (beide >= 1)
+    lag:    Bars bis zur (vorläufigen) Ausgabe einer Bar
+    """
+
+    def __init__(self, params, left: int = 1, right: int = 1, lag: int = DEFAULT_LAG_BARS):
+        if left < 1 or right < 1:
+            raise ValueError("left and right lookback must be >= 1")
+        if lag < 0:
+            raise ValueError("lag must be >= 0")
+        self.params = params
+        self.left = left
+        self.right = right
+        self.lag = lag
+
+        self._bars = _Bars()
+        self._index_name = None
+
+        # 1-3) Basis-Punkte + erste Zwischen-Swings + Vor-Klassifikation
+        self._last_base = None          # letzter Basis-Punkt
+        self._base_kinds_at_last = set()
+        self._pre_state = [None, None]
+        self._bpi1 = []                 # Punkte ab der Merge-Frontier
+        # 4) CHOCH + Counter-Engulfing
+        self._bear = _ChochScan(True, params.choch_price)
+        self._bull = _ChochScan(False, params.choch_price)
+        self._sc = []
+        # 5-11) Frontiers, offene (finale) Eingaben, Zustände
+        self._f_merge = 0
+        self._interm_pending = []
+        self._f_interm = 0
+        self._body_state = [None] * 6
+        self._refine_pending = []
+        self._f_refine = 0
+        self._tmp2_state = [None, None]
+        self._merge_pending = []
+        self._f_final = 0
+        self._final_state = [None, None]
+        self._relabel_state = [None] * 7
+        self._override_state = [None, None]
+        # 12) Ausgabe
+        self._recent = []               # finale Punkte ab _out_lo (mit Label)
+        self._levels = [None, None]     # BOS-Level (letztes L / H vor _out_lo)
+        self._out_lo = 0                # erste Bar ohne finalen Stand
+        self._ready = deque()           # finale, noch nicht ausgegebene Bars (pos, record)
+        self._sent = {}                 # ausgegebene, noch nicht finale Bars: pos -> record
+        self._emitted_end = 0           # Bars < _emitted_end sind ausgegeben
+        self._last_tail = []            # vorläufige Punkte des letzten Schritts (für flush)
+        self.revisions = 0
+        self.max_buffered = 0
+
+    # --- Zustand ---
+
+    @property
+    def bars_seen(self) -> int:
+        return self._bars.n
+
+    @property
+    def bars_emitted(self) -> int:
+        return self._emitted_end
+
+    @property
+    def bars_final(self) -> int:
+        """Bars < bars_final ändern sich nicht mehr."""
+        return self._out_lo
+
+    @property
+    def bars_buffered(self) -> int:
+        return self._bars.n - self._bars.base
+
+    def __repr__(self) -> str:
+        return (f"StructureEngine(seen={self.bars_seen}, emitted={self._emitted_end}, "
+                f"final={self._out_lo}, buffered={self.bars_buffered}, lag={self.lag})")
+
+    # --- Eingabe ---
+
+    def push(self, bars: pd.DataFrame) -> EngineOutput:
+        """
+        Neue Bars (Index time_ny, open/high/low/close; zeitlich nach allen
+        bisherigen) verarbeiten. Rückgabe: dadurch ausgegebene Bars,
+        Revisionen und Events (ggf. leer).
+        """
+        if not len(bars):
+            return self._output([], {}, [])
+        if self._bars.n and bars.index[0] <= self._bars.time[-1]:
+            raise ValueError("bars must be appended in strictly increasing time order")
+        if self._index_name is None:
+            self._index_name = bars.index.name
+
+        # FX-Tag wie relabel_inside_legs (Datum nach Shift um 17h)
+        fx_days = np.asarray((bars.index - _FX_ROLLOVER).normalize(), dtype="datetime64[ns]").view(np.int64)
+        columns = zip(bars.index, fx_days.tolist(),
+                      bars["open"].to_numpy(dtype=float).tolist(),
+                      bars["high"].to_numpy(dtype=float).tolist(),
+                      bars["low"].to_numpy(dtype=float).tolist(),
+                      bars["close"].to_numpy(dtype=float).tolist())
+
+        emitted, revised, events = [], {}, []
+        for time, fx_day, o, h, l, c in columns:
+            self._bars.append(time, fx_day, o, h, l, c)
+            self._step(emitted, revised, events, self._bars.n - self.lag)
+        return self._output(emitted, revised, events)
+
+    def flush(self) -> EngineOutput:
+        """
+        Alle noch nicht ausgegebenen Bars sofort ausgeben (z.B. Historien-Ende).
+        Ihre Werte sind vorläufig und werden ggf. später revidiert.
+        """
+        emitted, revised, events = [], {}, []
+        if self._bars.n > self._emitted_end:
+            self._emit(self._tail_records(self._last_tail), emitted, revised, events, self._bars.n)
+        return self._output(emitted, revised, events)
+
+    # --- Schritte je Bar ---
+
+    def _step(self, emitted: list, revised: dict, events: list, emit_end: int) -> None:
+        bars = self._bars
+        t = bars.n - 1
+
+        # 4) offene CHOCH-Referenzen gegen die neue Bar
+        self._bear.on_bar(bars, t)
+        self._bull.on_bar(bars, t)
+        # 4c) Counter-Engulfing an t-1 (Impuls-Candle t)
+        self._counter_engulfing(t - 1)
+        # 1-3) Basis-Punkte an t-R, Zwischen-Swings, Vor-Klassifikation, neue CHOCH-Referenzen
+        for point in self._base_points(t - self.right):
+            self._add_base(point)
+
+        # 5) Merge: final bis zur letzten Basis-Position / offenen CHOCH-Base
+        f_base = self._last_base[0] if self._last_base is not None else t - self.right + 1
+        f_merge = min(f_base, t)
+        for scan in (self._bear, self._bull):
+            j = scan.open_from()
+            if j is not None:
+                f_merge = min(f_merge, j)
+        final, tail = self._merge_sources(f_merge)
+
+        # 5b) Zwischen-Swings im gemergten Set
+        final, tail = self._interm_stage(final, tail)
+        # 6-7) Body-Filter + Klassifikation (kausal)
+        final = _body_filter(bars, final, self._body_state)
+        tail = _body_filter(bars, tail, list(self._body_state))
+        # 8) LH/HL-Refinement
+        final, tail = self._refine_stage(final, tail)
+        # 9-10) Klassifikation + LL/HH-Merge
+        final, tail = self._merge_extremes_stage(final, tail)
+        # 11) finale Labels, Leg-Relabel, Counter-Engulf-Override
+        final = self._final_labels(final, self._final_state, self._relabel_state, self._override_state)
+        self._recent.extend(final)
+
+        # 12) Bar-Werte ab der ersten nicht finalen Bar, Ausgabe / Revisionen
+        self._last_tail = tail
+        records = self._tail_records(tail)
+        self._emit(records, emitted, revised, events, emit_end)
+        self._advance(records)
+        self._trim()
+
+    def _base_points(self, i: int) -> list:
+        """Pivot-L/H + Drop/Spike-Overrides an Position i (PivotWindows, eine Position)."""
+        L, R = self.left, self.right
+        if i < L:
+            return []
+        bars = self._bars
+        low, high = bars.l(i), bars.h(i)
+        window_low = min(bars.low[i - L - bars.base:i + R + 1 - bars.base])
+        window_high = max(bars.high[i - L - bars.base:i + R + 1 - bars.base])
+        left_high = max(bars.high[i - L - bars.base:i - bars.base])
+        left_low = min(bars.low[i - L - bars.base:i - bars.base])
+        right_high = max(bars.high[i + 1 - bars.base:i + R + 1 - bars.base])
+        right_low = min(bars.low[i + 1 - bars.base:i + R + 1 - bars.base])
+
+        # min(a, b) wie _python_min: b nur, wenn b < a
+        a, b = left_high - low, right_high - low
+        depth_min = b if b < a else a
+        a, b = high - left_low, high - right_low
+        height_min = b if b < a else a
+
+        p = self.params
+        pivot_low = low == window_low and depth_min >= p.min_swing_price
+        pivot_high = high == window_high and height_min >= p.min_swing_price
+        override_low = not pivot_low and bars.l(i - 1) - low >= p.skip_price and right_low >= low
+        override_high = not pivot_high and high - bars.h(i - 1) >= p.skip_price and right_high <= high
+
+        points = []
+        if pivot_low:
+            points.append((i, KIND_L, low, _SRC_PIVOT))
+        if pivot_high:
+            points.append((i, KIND_H, high, _SRC_PIVOT))
+        if override_low:
+            points.append((i, KIND_L, low, _SRC_DROP_L))
+        if override_high:
+            points.append((i, KIND_H, high, _SRC_SPIKE_H))
+        return points
+
+    def _add_base(self, point: tuple) -> None:
+        """Basis-Punkt anhängen: ggf. Zwischen-Swing zum vorherigen, dann Vor-Klassifikation."""
+        a = self._last_base
+        if a is not None and point[0] > a[0]:
+            if a[1] == point[1]:
+                add = _intermediate(self._bars, a, point)
+                if add is not None and not (add[0] == a[0] and add[1] in self._base_kinds_at_last):
+                    self._add_bpi1(add)
+            self._base_kinds_at_last = set()
+        self._base_kinds_at_last.add(point[1])
+        self._last_base = point
+        self._add_bpi1(point)
+
+    def _add_bpi1(self, point: tuple) -> None:
+        pos, kind, price, src = point
+        label = _label(kind, price, self._pre_state[kind])
+        self._pre_state[kind] = price
+        self._bpi1.append(point)
+        if kind == KIND_L and label in ("HL", "L0"):
+            self._bear.add(self._bars, pos, price)
+        elif kind == KIND_H and label in ("LH", "H0"):
+            self._bull.add(self._bars, pos, price)
+
+    def _counter_engulfing(self, i: int) -> None:
+        """scan_single_counter_engulfing an Position i (Kontext i-1, Impuls j=i+1)."""
+        if i < 1:
+            return
+        bars = self._bars
+        j = i + 1
+        threshold = self.params.sc_threshold_price
+        bull = [bars.c(k) > bars.o(k) for k in (i - 1, i, j)]
+        bear = [bars.c(k) < bars.o(k) for k in (i - 1, i, j)]
+        if (bull[0] and bear[1] and bull[2] and bars.h(j) > bars.h(i)
+                and bars.h(j) - bars.o(j) >= threshold):
+            self._sc.append((i, KIND_L, bars.l(i), _SRC_ENGULF_L))
+            self._sc.append((i, KIND_H, bars.h(i), _SRC_ENGULF_L_HIGH))
+        if (bear[0] and bull[1] and bear[2] and bars.l(j) < bars.l(i)
+                and bars.o(j) - bars.l(j) >= threshold):
+            self._sc.append((i, KIND_H, bars.h(i), _SRC_ENGULF_H))
+            self._sc.append((i, KIND_L, bars.l(i), _SRC_ENGULF_H_LOW))
+
+    def _merge_sources(self, f_merge: int) -> tuple:
+        """
+        merge(Basis + Zwischen-Swings, CHOCH-LL, CHOCH-HH, Counter-Engulfing)
+        über alle offenen Punkte: (neu finale Punkte < f_merge, Rest).
+        """
+        candidates = [(p[0], 0, k, p) for k, p in enumerate(self._bpi1)]
+        candidates += [(pos, 1, 0, (pos, KIND_L, price, _SRC_BEAR_CHOCH)) for pos, price in self._bear.found.items()]
+        candidates += [(pos, 2, 0, (pos, KIND_H, price, _SRC_BULL_CHOCH)) for pos, price in self._bull.found.items()]
+        candidates += [(p[0], 3, k, p) for k, p in enumerate(self._sc)]
+        candidates.sort(key=lambda c: c[:3])
+
+        if candidates and candidates[0][0] < self._f_merge:
+            raise RuntimeError("structure point behind the merge frontier")
+
+        seen = set()
+        final, tail = [], []
+        for pos, _, _, point in candidates:
+            key = (pos, point[1])
+            if key in seen:
+                continue
+            seen.add(key)
+            (final if pos < f_merge else tail).append(point)
+
+        self._bpi1 = [p for p in self._bpi1 if p[0] >= f_merge]
+        self._sc = [p for p in self._sc if p[0] >= f_merge]
+        for scan in (self._bear, self._bull):
+            scan.found = {pos: price for pos, price in scan.found.items() if pos >= f_merge}
+        self._f_merge = max(self._f_merge, f_merge)
+        return final, tail
+
+    def _interm_stage(self, final: list, tail: list) -> tuple:
+        """Zwischen-Swings (Step 5): final bis zur Position des letzten finalen Eingabe-Punkts."""
+        done = self._interm_pending + final
+        out = _with_intermediates(self._bars, done + tail)
+        if done:
+            self._f_interm = done[-1][0]
+        f = self._f_interm
+        self._interm_pending = [p for p in done if p[0] >= f]
+        return [p for p in out if p[0] < f], [p for p in out if p[0] >= f]
+
+    def _refine_stage(self, final: list, tail: list) -> tuple:
+        n = self._bars.n
+        done = self._refine_pending + final
+        kept, cut = _decide(done, lambda items, k: _refine_keep(self, items, k, n, True))
+        self._refine_pending = done[cut:]
+        self._f_refine = done[cut][0] if cut < len(done) else self._f_interm
+
+        rest = self._refine_pending + tail
+        tail_kept = [p for k, p in enumerate(rest) if _refine_keep(self, rest, k, n, False)]
+        return [p[:4] for p in kept], [p[:4] for p in tail_kept]
+
+    def _merge_extremes_stage(self, final: list, tail: list) -> tuple:
+        done = self._merge_pending + _classify(final, self._tmp2_state)
+        kept, cut = _decide(done, lambda items, k: _merge_keep(items, k, True))
+        self._merge_pending = done[cut:]
+        self._f_final = done[cut][0] if cut < len(done) else self._f_refine
+
+        rest = self._merge_pending + _classify(tail, list(self._tmp2_state))
+        tail_kept = [p for k, p in enumerate(rest) if _merge_keep(rest, k, False)]
+        return [p[:4] for p in kept], [p[:4] for p in tail_kept]
+
+    def _final_labels(self, items: list, final_state: list, relabel_state: list, override_state: list) -> list:
+        out = []
+        fx_day = self._bars.fx_day
+        base = self._bars.base
+        for point in _classify(items, final_state):
+            label = _relabel(point, fx_day[point[0] - base], relabel_state)
+            label = _engulf_override(point, label, override_state)
+            out.append(point[:4] + (label,))
+        return out
+
+    # --- Bar-Werte + Ausgabe ---
+
+    def _tail_records(self, tail: list) -> list:
+        """
+        (pos, record) je Bar ab _out_lo bis zur letzten Bar; record =
+        (low_price, low_label, high_price, high_label, bos_up, bos_down, Punkte).
+        tail: vorläufige Punkte nach der finalen Frontier (ohne finale Labels).
+        """
+        tail = self._final_labels(tail, list(self._final_state), list(self._relabel_state),
+                                  list(self._override_state))
+        points = self._recent + tail
+        bars = self._bars
+        levels = list(self._levels)
+        records = []
+        k = 0
+        for p in range(self._out_lo, bars.n):
+            close = bars.c(p)
+            # Punkte auf Bar p wirken erst ab p+1 (detect_bos)
+            bos_up = levels[KIND_H] is not None and close > levels[KIND_H]
+            bos_down = levels[KIND_L] is not None and close < levels[KIND_L]
+            on_bar = []
+            low_price = low_label = high_price = high_label = None
+            while k < len(points) and points[k][0] == p:
+                _, kind, price, src, label = points[k]
+                on_bar.append((kind, price, src, label))
+                if kind == KIND_L:
+                    low_price, low_label = price, label
+                else:
+                    high_price, high_label = price, label
+                levels[kind] = price
+                k += 1
+            records.append((p, (low_price, low_label, high_price, high_label, bos_up, bos_down, tuple(on_bar))))
+        return records
+
+    def _emit(self, records: list, emitted: list, revised: dict, events: list, emit_end: int) -> None:
+        """Bars < emit_end ausgeben (final aus _ready oder vorläufig), Änderungen an ausgegebenen als Revision."""
+        while self._ready and self._ready[0][0] < emit_end:
+            self._emit_bar(*self._ready.popleft(), emitted, events)
+
+        for pos, record in records:
+            if pos < self._emitted_end:
+                if record != self._sent[pos]:
+                    self._sent[pos] = record
+                    revised[pos] = (self._bars.time[pos - self._bars.base], record)
+                    self.revisions += 1
+                    events.append(self._event("revision", pos))
+                    events.extend(self._record_events(pos, record))
+            elif pos < emit_end:
+                self._emit_bar(pos, record, emitted, events)
+                self._sent[pos] = record
+            elif pos < self._f_final:
+                # final, aber noch im Lag: ab jetzt nicht mehr nachgerechnet
+                self._ready.append((pos, record))
+            else:
+                break
+        self._emitted_end = max(self._emitted_end, emit_end)
+
+    def _emit_bar(self, pos: int, record: tuple, emitted: list, events: list) -> None:
+        emitted.append((self._bars.time[pos - self._bars.base], record))
+        events.extend(self._record_events(pos, record))
+
+    def _advance(self, records: list) -> None:
+        """Bars < Frontier sind final: BOS-Level fortschreiben, nicht mehr nachrechnen."""
+        new_lo = max(self._f_final, self._out_lo)
+        for pos, record in records:
+            if pos >= new_lo:
+                break
+            self._sent.pop(pos, None)
+            for kind, price, _, _ in record[6]:
+                self._levels[kind] = price
+        self._recent = [p for p in self._recent if p[0] >= new_lo]
+        self._out_lo = new_lo
+
+    def _trim(self) -> None:
+        anchors = [self._bars.n - self.left - self.right - 2, self._f_merge, self._f_interm,
+                   self._f_refine - self.left, self._out_lo]
+        if self._last_base is not None:
+            anchors.append(self._last_base[0])
+        for scan in (self._bear, self._bull):
+            j = scan.open_from()
+            if j is not None:
+                anchors.append(j)
+        if self._ready:
+            anchors.append(self._ready[0][0])
+        anchors += [p for p in self._body_state[:4] if p is not None]
+        self._bars.trim(max(min(anchors), 0))
+        self.max_buffered = max(self.max_buffered, self.bars_buffered)
+
+    def _pivot_confirmed(self, pos: int, high: bool) -> bool:
+        """pivot_confirmed für eine Position (Fenster vollständig vorhanden)."""
+        bars, L, R = self._bars, self.left, self.right
+        lo, hi = pos - L - bars.base, pos + R + 1 - bars.base
+        if high:
+            value = bars.h(pos)
+            window = max(bars.high[lo:hi])
+            a = value - min(bars.low[lo:pos - bars.base])
+            b = value - min(bars.low[pos + 1 - bars.base:hi])
+        else:
+            value = bars.l(pos)
+            window = min(bars.low[lo:hi])
+            a = max(bars.high[lo:pos - bars.base]) - value
+            b = max(bars.high[pos + 1 - bars.base:hi]) - value
+        amplitude = b if b < a else a
+        return value == window and amplitude >= self.params.min_swing_price
+
+    # --- Events / Frames ---
+
+    def _event(self, name: str, pos: int, kind=None, price=None, label=None, source=None) -> dict:
+        return {"event": name, "time": self._bars.time[pos - self._bars.base], "kind": kind,
+                "price": price, "label": label, "source": source}
+
+    def _record_events(self, pos: int, record: tuple) -> list:
+        """Je Bar: Swings (in Punkt-Reihenfolge) + CHOCH, dann BOS."""
+        events = []
+        for kind, price, src, label in record[6]:
+            base = dict(kind=KIND_NAMES[kind], price=price, label=label, source=SOURCES[src])
+            events.append(self._event("swing", pos, **base))
+            if src in _CHOCH_SOURCES:
+                events.append(self._event(_CHOCH_SOURCES[src], pos, **base))
+        close = self._bars.c(pos)
+        if record[4]:
+            events.append(self._event("bos_up", pos, price=close))
+        if record[5]:
+            events.append(self._event("bos_down", pos, price=close))
+        return events
+
+    def _frame(self, items: list) -> pd.DataFrame:
+        """(time, record)-Paare als Frame mit STRUCTURE_COLUMNS (Schema-Dtypes)."""
+        index = pd.DatetimeIndex([time for time, _ in items], name=self._index_name)
+        rec = [r for _, r in items]
+        return pd.DataFrame({
+            "swing_low_price": np.array([r[0] if r[0] is not None else np.nan for r in rec], dtype=float),
+            "swing_high_price": np.array([r[2] if r[2] is not None else np.nan for r in rec], dtype=float),
+            "swing_low_label": pd.Categorical([r[1] for r in rec], dtype=BAR_SCHEMA["swing_low_label"]),
+            "swing_high_label": pd.Categorical([r[3] for r in rec], dtype=BAR_SCHEMA["swing_high_label"]),
+            "bos_up": np.array([r[4] for r in rec], dtype=bool),
+            "bos_down": np.array([r[5] for r in rec], dtype=bool),
+        }, index=index)
+
+    def _output(self, emitted: list, revised: dict, events: list) -> EngineOutput:
+        return EngineOutput(self._frame(emitted), self._frame([revised[pos] for pos in sorted(revised)]), events)
+
+
+# ---------------------------------
+# ÄQUIVALENZ ZUM BATCH-LAUF
+# ---------------------------------
+
+def replay(engine: StructureEngine, df: pd.DataFrame, block: int = 288) -> tuple:
+    """
+    Historie blockweise durch die Engine schieben, am Ende flush.
+    Rückgabe: (Stand aller Bars nach allen Revisionen, Anzahl revidierter
+    Bars, Bars, deren erste Ausgabe vom Endstand abweicht).
+    """
+    outputs = [engine.push(df.iloc[i:i + block]) for i in range(0, len(df), block)]
+    outputs.append(engine.flush())
+
+    first = pd.concat([o.bars for o in outputs])
+    revised = pd.concat([o.revised for o in outputs])
+    # Revisionen in Reihenfolge anwenden (letzter Stand gewinnt)
+    current = pd.concat([first, revised])
+    current = current[~current.index.duplicated(keep="last")].sort_index()
+    n_revised = int(revised.index.nunique())
+    return current, n_revised, diff_structure(first, current)
+
+
+def diff_structure(a: pd.DataFrame, b: pd.DataFrame) -> np.ndarray:
+    """Positionen, an denen sich zwei gleich lange Frames in STRUCTURE_COLUMNS unterscheiden."""
+    if len(a) != len(b):
+        raise ValueError("frames must have the same length")
+    bad = np.zeros(len(a), dtype=bool)
+    for col in STRUCTURE_COLUMNS:
+        x = a[col].to_numpy(dtype=object)
+        y = b[col].to_numpy(dtype=object)
+        same = (x == y) | (pd.isna(x) & pd.isna(y))
+        bad |= ~same.astype(bool)
+    return np.flatnonzero(bad)
+
+
+def compare_with_batch(build: Callable, params, df: pd.DataFrame,
+                       left: int = 1, right: int = 1,
+                       lag: int = DEFAULT_LAG_BARS,
+                       block: int = 288,
+                       batch: pd.DataFrame = None) -> dict:
+    """
+    Engine-Lauf vs. Batch-Lauf (build, z.B. build_structure) auf derselben
+    Historie. diff_bars: Bars, deren Endstand (Ausgabe + Revisionen) vom
+    Batch abweicht - muss 0 sein. revised_bars: Bars, die nach der
+    Ausgabe (lag Bars) noch korrigiert wurden.
+    batch: optional bereits vorhandenes build()-Ergebnis (df_final) für df.
+    """
+    if batch is None:
+        with contextlib.redirect_stdout(io.StringIO()):
+            batch, _ = build(df, params)
+
+    engine = StructureEngine(params, left=left, right=right, lag=lag)
+    current, n_revised, changed = replay(engine, df, block)
+    if not current.index.equals(batch.index):
+        raise RuntimeError("streamed bars are not aligned with the batch frame")
+
+    bad = diff_structure(current, batch)
+    return {
+        "bars": len(df),
+        "diff_bars": int(len(bad)),
+        "diff_positions": bad.tolist(),
+        "revised_bars": int(n_revised),
+        "revised_rate": float(n_revised / len(df)) if len(df) else 0.0,
+        "first_emission_diff": int(len(changed)),
+        "revision_events": engine.revisions,
+        "lag": lag,
+        "max_buffered": engine.max_buffered,
+    }
+
+
+def print_comparison(symbol: str, report: dict) -> None:
+    status = "OK" if report["diff_bars"] == 0 else "MISMATCH"
+    print(f"Streaming vs batch for {symbol}: {report['bars']} bars (lag {report['lag']}), "
+          f"{report['diff_bars']} differ after revisions [{status}], "
+          f"{report['revised_bars']} revised after emission ({report['revised_rate']:.4%})")
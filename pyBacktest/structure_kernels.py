@@ -0,0 +1,461 @@
+import numpy as np
+
+from range_query import OhlcRangeIndex, SparseTable
+from struct_points import KIND_H, KIND_L, StructPoints, label_code, source_code
+
+# ---------------------------------
+# ARRAY-KERNEL FÜR DIE MARKTSTRUKTUR (PHASE 1)
+# ---------------------------------
+#
+# Die Phase-1-Schritte arbeiten auf den OHLC-Arrays eines Symbols
+# (Positionen 0 .. n-1 = M5-Bars in Zeitreihenfolge) statt Bar für Bar
+# in Python-Schleifen. Ergebnisse sind Positionen / Masken, die Phase 1
+# wieder auf den Zeit-Index abbildet.
+
+def _python_min(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Elementweise wie min(a, b) in Python (a, außer b < a; NaN-Verhalten inklusive)."""
+    return np.where(b < a, b, a)
+
+
+def _window_reduce(values: np.ndarray, width: int, first: int, count: int, ufunc) -> np.ndarray:
+    """
+    ufunc.reduce über values[j:j+width] für j = first .. first+count-1,
+    als width verschobene Array-Vergleiche (schnell für kleine Fenster).
+    """
+    out = values[first:first + count].copy()
+    for k in range(1, width):
+        ufunc(out, values[first + k:first + k + count], out=out)
+    return out
+
+
+class PivotWindows:
+    """
+    Parameter-unabhängiger Teil von pivot_struct_points: Fenster-Extrema,
+    Tiefe / Höhe und Drop / Spike ggü. der Vor-Candle je Kandidat
+    i = left .. n-right-1. Einmal pro Symbol (und left/right) berechnet,
+    danach liefert points() die Punkte für beliebige Schwellen.
+    """
+
+    def __init__(self, highs: np.ndarray, lows: np.ndarray, left: int, right: int):
+        highs = np.asarray(highs, dtype=np.float64)
+        lows = np.asarray(lows, dtype=np.float64)
+        n = len(highs)
+        L, R = int(left), int(right)
+        self.left, self.right = L, R
+
+        count = max(n - R - L, 0)
+        # Kandidaten i = L .. n-R-1
+        self.pos = np.arange(L, L + count, dtype=np.int64)
+        if count == 0:
+            return
+        pos = self.pos
+        self.low_val = lows[pos]
+        self.high_val = highs[pos]
+
+        # Fenster [i-L, i+R] inkl. i
+        window_low_min = _window_reduce(lows, L + R + 1, 0, count, np.minimum)
+        window_high_max = _window_reduce(highs, L + R + 1, 0, count, np.maximum)
+        self.is_window_low = self.low_val == window_low_min
+        self.is_window_high = self.high_val == window_high_max
+
+        # Links [i-L, i-1]; bei L == 0 wie bisher die Vor-Candle (i-1, bei i=0 -> letzte Bar)
+        if L > 0:
+            left_high = _window_reduce(highs, L, 0, count, np.maximum)
+            left_low = _window_reduce(lows, L, 0, count, np.minimum)
+        else:
+            left_high = highs[pos - 1]
+            left_low = lows[pos - 1]
+
+        # Rechts [i+1, i+R]; bei R == 0 die Folge-Candle (bzw. i selbst am Ende)
+        if R > 0:
+            self.right_high = _window_reduce(highs, R, L + 1, count, np.maximum)
+            self.right_low = _window_reduce(lows, R, L + 1, count, np.minimum)
+        else:
+            nxt = np.minimum(pos + 1, n - 1)
+            self.right_high = highs[nxt]
+            self.right_low = lows[nxt]
+
+        # Pivot-Tiefe / -Höhe (Vergleich mit min_swing_price)
+        self.depth_min = _python_min(left_high - self.low_val, self.right_high - self.low_val)
+        self.height_min = _python_min(self.high_val - left_low, self.high_val - self.right_low)
+
+        # Drop / Spike ggü. der Vor-Candle (Vergleich mit skip_price)
+        self.drop = lows[pos - 1] - self.low_val
+        self.spike = self.high_val - highs[pos - 1]
+
+    def __len__(self) -> int:
+        return len(self.pos)
+
+    def points(self, min_swing_price: float, skip_price: float):
+        """Rückgabe wie pivot_struct_points."""
+        count = len(self.pos)
+        if count == 0:
+            return StructPoints.empty(), 0, 0, 0, 0
+        pos = self.pos
+
+        # --- Pivots ---
+        pivot_low = self.is_window_low & (self.depth_min >= min_swing_price)
+        pivot_high = self.is_window_high & (self.height_min >= min_swing_price)
+
+        # --- Overrides (nur mit rechtem Fenster, d.h. R > 0) ---
+        if self.right > 0:
+            override_low = ~pivot_low & (self.drop >= skip_price) & (self.right_low >= self.low_val)
+            override_high = ~pivot_high & (self.spike >= skip_price) & (self.right_high <= self.high_val)
+        else:
+            override_low = np.zeros(count, dtype=bool)
+            override_high = np.zeros(count, dtype=bool)
+
+        groups = [
+            (pivot_low, KIND_L, self.low_val, "pivot"),
+            (pivot_high, KIND_H, self.high_val, "pivot"),
+            (override_low, KIND_L, self.low_val, "override_prev_drop_L"),
+            (override_high, KIND_H, self.high_val, "override_prev_spike_H"),
+        ]
+
+        # Gruppen nacheinander, stabil nach pos sortiert -> Reihenfolge s.o.
+        points = StructPoints.from_unsorted(*[
+            StructPoints(pos[mask], kind, prices[mask], source_code(source))
+            for mask, kind, prices, source in groups
+        ])
+
+        return (points,
+                int(pivot_low.sum()), int(pivot_high.sum()),
+                int(override_low.sum()), int(override_high.sum()))
+
+
+def pivot_struct_points(highs: np.ndarray,
+                        lows: np.ndarray,
+                        left: int,
+                        right: int,
+                        min_swing_price: float,
+                        skip_price: float):
+    """
+    Pivot-Swings + Drop/Spike-Overrides ggü. der Vor-Candle (Logik siehe
+    detect_struct_points in Phase 1), für beliebige left/right.
+
+    Rückgabe: (points, n_pivot_low, n_pivot_high, n_override_low, n_override_high)
+    points: StructPoints (struct_points.py), sortiert nach pos; bei gleicher pos in der
+    Reihenfolge Pivot-L, Pivot-H, Override-L, Override-H.
+    """
+    return PivotWindows(highs, lows, left, right).points(min_swing_price, skip_price)
+
+
+# ---------------------------------
+# SINGLE-COUNTER-ENGULFING-KANDIDATEN
+# ---------------------------------
+
+class CounterEngulfCandidates:
+    """
+    Kerzenfolgen (i-1, i, j=i+1) für scan_single_counter_engulfing in Phase 1,
+    ohne Schwelle: Muster-Masken und Impulsstrecke der Candle j.
+    points(threshold) wendet nur noch die Mindeststrecke an.
+    """
+
+    def __init__(self, opens: np.ndarray, closes: np.ndarray, highs: np.ndarray, lows: np.ndarray):
+        opens = np.asarray(opens, dtype=np.float64)
+        closes = np.asarray(closes, dtype=np.float64)
+        self.highs = np.asarray(highs, dtype=np.float64)
+        self.lows = np.asarray(lows, dtype=np.float64)
+        n = len(opens)
+
+        # Kandidaten i = 1 .. n-2 (i-1 für den Kontext, j = i+1 als Impuls)
+        i = np.arange(1, max(n - 1, 1))
+        prev = i - 1
+        j = i + 1
+        self.pos = i
+
+        bull = closes > opens
+        bear = closes < opens
+
+        # prev bull, i bear, j bull, high_j strikt > high_i; Strecke high_j - open_j
+        self.bull_pattern = bull[prev] & bear[i] & bull[j] & (self.highs[j] > self.highs[i])
+        self.bull_impulse = self.highs[j] - opens[j]
+
+        # prev bear, i bull, j bear, low_j strikt < low_i; Strecke open_j - low_j
+        self.bear_pattern = bear[prev] & bull[i] & bear[j] & (self.lows[j] < self.lows[i])
+        self.bear_impulse = opens[j] - self.lows[j]
+
+    def positions(self, threshold_price: float):
+        """(bull_pos, bear_pos): Candles i mit bullischem / bearischem Sonderfall."""
+        bull_case = self.bull_pattern & (self.bull_impulse >= threshold_price)
+        bear_case = self.bear_pattern & (self.bear_impulse >= threshold_price)
+        return self.pos[bull_case], self.pos[bear_case]
+
+
+# ---------------------------------
+# SWING-KLASSIFIKATION (HH/HL/LH/LL)
+# ---------------------------------
+
+def swing_label_codes(points: StructPoints) -> np.ndarray:
+    """
+    Label-Code je Punkt (struct_points.SWING_LABELS): jeder Punkt wird mit
+    dem vorherigen Punkt gleicher Art verglichen (ein verschobener
+    Vergleich je Art), der erste L/H eines Sets ist L0/H0.
+
+      L: höher -> HL, tiefer -> LL, sonst L_eq
+      H: höher -> HH, tiefer -> LH, sonst H_eq
+    """
+    out = np.empty(len(points), dtype=np.int8)
+    groups = [
+        (KIND_L, "L0", "HL", "LL", "L_eq"),
+        (KIND_H, "H0", "HH", "LH", "H_eq"),
+    ]
+    for kind, first, higher, lower, equal in groups:
+        sel = np.flatnonzero(points.kind == kind)
+        if len(sel) == 0:
+            continue
+        price = points.price[sel]
+        prev, cur = price[:-1], price[1:]
+
+        codes = np.full(len(sel), label_code(equal), dtype=np.int8)
+        codes[1:][cur > prev] = label_code(higher)
+        codes[1:][cur < prev] = label_code(lower)
+        codes[0] = label_code(first)
+        out[sel] = codes
+    return out
+
+
+# ---------------------------------
+# PIVOT-PRÜFUNG FÜR EINZELNE POSITIONEN
+# ---------------------------------
+
+def pivot_confirmed(rmq: OhlcRangeIndex,
+                    pos: np.ndarray,
+                    left: int,
+                    right: int,
+                    min_swing_price: float,
+                    high: bool) -> np.ndarray:
+    """
+    Pivot-Kriterium (wie in pivot_struct_points) nur an den Positionen pos,
+    Fenster per Range-Index:
+      high=True:  high[i] = max(high[i-L..i+R]) und
+                  min(high[i] - min(low links), high[i] - min(low rechts)) >= min_swing_price
+      high=False: gespiegelt für Lows.
+    Positionen ohne volles Fenster (i < L oder i > n-1-R) sind nie Pivots.
+    """
+    pos = np.asarray(pos, dtype=np.int64)
+    L, R = int(left), int(right)
+    n = len(rmq)
+    out = np.zeros(len(pos), dtype=bool)
+
+    ok = (pos >= L) & (pos <= n - 1 - R)
+    p = pos[ok]
+    if len(p) == 0:
+        return out
+
+    if high:
+        value = rmq.highs[p]
+        window = rmq.high_max.value_many(p - L, p + R + 1)
+        left_ext = rmq.low_min.value_many(p - L, p)
+        right_ext = rmq.low_min.value_many(p + 1, p + 1 + R)
+        amplitude = _python_min(value - left_ext, value - right_ext)
+    else:
+        value = rmq.lows[p]
+        window = rmq.low_min.value_many(p - L, p + R + 1)
+        left_ext = rmq.high_max.value_many(p - L, p)
+        right_ext = rmq.high_max.value_many(p + 1, p + 1 + R)
+        amplitude = _python_min(left_ext - value, right_ext - value)
+
+    out[ok] = (value == window) & (amplitude >= min_swing_price)
+    return out
+
+
+# ---------------------------------
+# ZÄHLEN ZWISCHEN POSITIONEN
+# ---------------------------------
+
+def count_between(sorted_pos: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    """Je Anfrage die Anzahl p in sorted_pos mit lo < p < hi (O(log S) per searchsorted, 0 bei hi <= lo)."""
+    sorted_pos = np.asarray(sorted_pos, dtype=np.int64)
+    return np.maximum(np.searchsorted(sorted_pos, hi, side="left")
+                      - np.searchsorted(sorted_pos, lo, side="right"), 0)
+
+
+# ---------------------------------
+# BOS (BREAK OF STRUCTURE)
+# ---------------------------------
+
+def _last_level_before(n: int, pos: np.ndarray, price: np.ndarray) -> np.ndarray:
+    """
+    Je Bar p der Preis des letzten Punkts mit pos < p (NaN, wenn keiner).
+    Bei mehreren Punkten auf einer Bar gilt der letzte.
+    """
+    level_at = np.full(n, np.nan)
+    is_set = np.zeros(n, dtype=bool)
+    if len(pos):
+        last_on_bar = np.append(pos[1:] != pos[:-1], True)
+        level_at[pos[last_on_bar]] = price[last_on_bar]
+        is_set[pos] = True
+
+    # Position der letzten Aktualisierung bis inkl. p (ffill über Positionen,
+    # damit auch ein NaN-Preis den älteren Level ablöst) ...
+    last_set = np.maximum.accumulate(np.where(is_set, np.arange(n), -1))
+    # ... wirksam erst ab der Folgebar (Vergleich vor dem Update)
+    prev_set = np.concatenate(([-1], last_set[:-1]))
+    return np.where(prev_set >= 0, level_at[np.maximum(prev_set, 0)], np.nan)
+
+
+def break_of_structure(closes: np.ndarray, points: StructPoints):
+    """
+    bos_up[p]:   close[p] > Preis des letzten H vor Bar p
+    bos_down[p]: close[p] < Preis des letzten L vor Bar p
+    (Punkte auf Bar p zählen erst ab p+1.)
+    """
+    closes = np.asarray(closes, dtype=np.float64)
+    n = len(closes)
+    last_high = _last_level_before(n, points.pos[points.is_high], points.price[points.is_high])
+    last_low = _last_level_before(n, points.pos[points.is_low], points.price[points.is_low])
+    return closes > last_high, closes < last_low
+
+
+# ---------------------------------
+# NÄCHSTES EREIGNIS NACH EINER POSITION
+# ---------------------------------
+
+def next_true_index(mask: np.ndarray) -> np.ndarray:
+    """Für jedes i die kleinste Position k >= i mit mask[k] (n, wenn keine)."""
+    mask = np.asarray(mask, dtype=bool)
+    n = len(mask)
+    candidates = np.where(mask, np.arange(n, dtype=np.int64), n)
+    return np.minimum.accumulate(candidates[::-1])[::-1]
+
+
+def first_index_at_or_below(values: np.ndarray, starts: np.ndarray, thresholds: np.ndarray) -> np.ndarray:
+    """
+    Für jede Anfrage q die erste Position k >= starts[q] mit
+    values[k] <= thresholds[q] (-1, wenn keine). NaN in values zählt nie.
+
+    Sparse Table der Minima + binärer Abstieg, für alle Anfragen
+    gleichzeitig: O(n log n) Aufbau, O(log n) je Anfrage.
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    n = len(values)
+    if n == 0 or len(starts) == 0:
+        return np.full(len(starts), -1, dtype=np.int64)
+
+    table = SparseTable(values, mode="min")
+    keys = table.level_values(0)
+    pos = starts.copy()
+
+    # Invariante: die Antwort liegt nie vor pos. Blöcke, deren Minimum
+    # über der Schwelle liegt, werden übersprungen (größte zuerst).
+    for level in range(len(table.levels) - 1, -1, -1):
+        width = 1 << level
+        level_min = table.level_values(level)
+        fits = pos + width <= n
+        probe = np.where(fits, pos, 0)
+        skip = fits & (level_min[probe] > thresholds)
+        pos = np.where(skip, pos + width, pos)
+
+    in_range = pos < n
+    found = in_range & (keys[np.where(in_range, pos, 0)] <= thresholds)
+    return np.where(found, pos, -1)
+
+
+def first_index_at_or_below_scan(values: np.ndarray, starts: np.ndarray, thresholds: np.ndarray,
+                                 block: int = 1024) -> np.ndarray:
+    """
+    Wie first_index_at_or_below, aber ohne Sparse Table: je Anfrage ein
+    Vorwärts-Scan in Blöcken doppelter Größe. Anfragen ohne Treffer fallen
+    vorab über das Suffix-Minimum weg -> Aufwand O(n) + Abstand zum Treffer
+    je Anfrage, kein O(n log n)-Aufbau. Für wenige Anfragen auf langen Arrays.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    starts = np.asarray(starts, dtype=np.int64)
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    n = len(values)
+    out = np.full(len(starts), -1, dtype=np.int64)
+    if n == 0 or len(starts) == 0:
+        return out
+
+    # Minimum von values[i:] (NaN ignoriert; nur NaN -> NaN, zählt nie)
+    suffix_min = np.fmin.accumulate(values[::-1])[::-1]
+    reachable = np.flatnonzero((starts < n) & (suffix_min[np.minimum(starts, n - 1)] <= thresholds))
+    for q in reachable.tolist():
+        a, threshold = int(starts[q]), float(thresholds[q])
+        width = block
+        while a < n:
+            b = min(a + width, n)
+            hit = np.flatnonzero(values[a:b] <= threshold)
+            if len(hit):
+                out[q] = a + hit[0]
+                break
+            a, width = b, width * 2
+    return out
+
+
+def choch_extremes(opens: np.ndarray,
+                   highs: np.ndarray,
+                   lows: np.ndarray,
+                   closes: np.ndarray,
+                   swing_pos: np.ndarray,
+                   swing_price: np.ndarray,
+                   choch_price: float,
+                   bearish: bool,
+                   rmq: OhlcRangeIndex = None,
+                   linear: bool = False) -> np.ndarray:
+    """
+    CHOCH-Extrem je Swing (Logik siehe scan_bearish_choch / scan_bullish_choch):
+
+    bearish=True (HL/L0):
+      j      = erste bearische Candle nach dem Swing mit low <= Swing - choch_price
+      k_base = erste Candle >= j mit close >= open
+      Ergebnis: Position des (ersten) minLow in [j..k_base]
+    bearish=False (LH/H0): gespiegelt mit bullischer Break-Candle,
+      high >= Swing + choch_price, Base close <= open, maxHigh.
+
+    rmq: Range-Index über highs/lows (range_query.py), sonst neu aufgebaut.
+    linear: Break per Vorwärts-Scan, Extremum direkt aus dem Bereich (weder
+            Sparse Table noch Range-Index) - für wenige Swings auf langen
+            Arrays (offene Referenzen nach den Zeit-Shards, structure_shards.py).
+
+    Rückgabe: Position je Swing (-1, wenn kein Break oder keine Base).
+    """
+    opens = np.asarray(opens, dtype=np.float64)
+    closes = np.asarray(closes, dtype=np.float64)
+    swing_pos = np.asarray(swing_pos, dtype=np.int64)
+    swing_price = np.asarray(swing_price, dtype=np.float64)
+    out = np.full(len(swing_pos), -1, dtype=np.int64)
+    if len(swing_pos) == 0:
+        return out
+
+    if bearish:
+        extremes = np.asarray(lows, dtype=np.float64)
+        break_candle = closes < opens
+        # low <= hl - choch
+        search = np.where(break_candle, extremes, np.nan)
+        thresholds = swing_price - choch_price
+        base_candle = closes >= opens
+    else:
+        extremes = np.asarray(highs, dtype=np.float64)
+        break_candle = closes > opens
+        # high >= lh + choch  <=>  -high <= -(lh + choch)
+        search = np.where(break_candle, -extremes, np.nan)
+        thresholds = -(swing_price + choch_price)
+        base_candle = closes <= opens
+
+    n = len(extremes)
+    if linear:
+        j = first_index_at_or_below_scan(search, swing_pos + 1, thresholds)
+    else:
+        j = first_index_at_or_below(search, swing_pos + 1, thresholds)
+    next_base = next_true_index(base_candle)
+
+    hit = np.flatnonzero(j >= 0)
+    k_base = next_base[j[hit]]
+    ok = k_base < n
+    hit, k_base = hit[ok], k_base[ok]
+    if len(hit) == 0:
+        return out
+
+    # Extremum in [j..k_base] (erste Position bei Gleichstand)
+    if linear:
+        pick = np.argmin if bearish else np.argmax
+        out[hit] = [a + pick(extremes[a:b + 1]) for a, b in zip(j[hit].tolist(), k_base.tolist())]
+        return out
+    if rmq is None:
+        rmq = OhlcRangeIndex(highs, lows)
+    table = rmq.low_min if bearish else rmq.high_max
+    out[hit] = table.arg_many(j[hit], k_base + 1)
+    return out
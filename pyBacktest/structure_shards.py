@@ -0,0 +1,437 @@
+import contextlib
+import io
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+from struct_points import StructPoints
+from structure_engine import diff_structure
+from symbol_runner import nested_worker_count
+
+# ---------------------------------
+# ZEIT-SHARDS MIT HALO FÜR PHASE 1 (EIN SYMBOL)
+# ---------------------------------
+#
+# Die Historie eines Symbols wird in Kalender-Shards (je `months` Monate)
+# zerlegt. Gerechnet wird in drei Runden im Prozess-Pool, dazwischen nur
+# kurze globale Schritte im Hauptprozess:
+#
+#   global   Steps 1-3: Punkte nach Steps 1-2 (pre_choch) und die CHOCH-
+#            Referenzen (HL/L0, LH/H0) einmal über die ganze Historie.
+#   Runde 1  Steps 4a/4b: Referenzen je Kern, Suche auf [start, end + halo).
+#            Die Suche läuft nur vorwärts -> jeder Treffer im Fenster ist
+#            exakt. HL/LH-Referenzen bleiben aber offen, bis sie gebrochen
+#            werden (gemessen: > 8000 Bars hinter dem Halo); solche offenen
+#            Referenzen gehen über den Schnitt und werden danach im
+#            Hauptprozess per Vorwärts-Scan zu Ende gesucht (wenige).
+#   Runde 2  Steps 4c-10 je Shard auf [start - halo, end + halo) mit den
+#            globalen Punkten aus Steps 1-2 und den CHOCH-Punkten als
+#            Ausschnitt; übernommen werden die Punkte des Kerns (Abgleich
+#            s.u.). Die übrigen Abhängigkeiten reichen nur bis zum letzten
+#            Strukturpunkt je Art und sind nach dem Halo abgeklungen.
+#   Runde 3  Steps 11-12 (Labels, Leg-Relabel, Overrides, BOS) aus den
+#            zusammengesetzten Punkten, je Segment. Segmentgrenzen liegen
+#            auf dem nächsten FX-Tages-Beginn (17:00 NY) nach einem Schnitt:
+#            dort setzt relabel_inside_legs alle Anker zurück. Übrigen
+#            Zustand (Vorgänger für HH/HL-Labels, letztes L/H für Override
+#            und BOS-Level) trägt der letzte L- und H-Punkt vor der Grenze -
+#            das Segment wird ab dem früheren der beiden mitgerechnet.
+#
+# Boundary-Diff + Abgleich (Runde 2): An jeder Grenze rechnen zwei Shards
+# den Bereich [grenze - halo, grenze + halo) beide (Nachlauf links, Vorlauf
+# rechts), verglichen werden die Punkte (pos, Art, Quelle).
+# Weichen die beiden Läufe innerhalb von `margin` Bars um die Kalender-
+# grenze ab, wird der Schnitt auf die nächste Bar verschoben, um die herum
+# beide Läufe über +-margin übereinstimmen (links davon gilt der linke Lauf,
+# ab dort der rechte). Gibt es im Overlap keine solche Stelle, werden die
+# beiden Kerne zu einem Shard zusammengelegt und neu gerechnet (notfalls
+# bis zum Monolith-Lauf). Der Report zählt je Grenze die abweichenden
+# Overlap-Bars und die Verschiebung des Schnitts.
+#
+# verify=True rechnet zusätzlich den Monolith-Lauf; jede Abweichung ist
+# dann ein Fehler (RuntimeError), es wird nichts Abweichendes geschrieben.
+#
+# Worker: nested_worker_count (symbol_runner.py) - läuft Phase 1 schon im
+# Symbol-Pool, teilen sich die Shards dessen Kern-Budget. Ein Pool für alle
+# drei Runden; Shards bekommen nur die Spalten, die ihre Steps lesen.
+#
+# Aufwand: seriell bleiben Steps 1-3 (ohne Sparse Table, pre_choch_context
+# im Phase-1-Skript), die offenen CHOCH-Referenzen und das Zusammensetzen -
+# gemessen ~20-25% des Monolith-Laufs (M5, 2 Jahre). Die Shard-Runden zusammen
+# kosten etwa einen Monolith-Lauf (Halo, Range-Index je Shard), d.h. mit
+# einem Worker ist der Lauf langsamer als der Monolith, mit w Workern grob
+# seriell + Monolith / w. Lohnt also erst mit mehreren freien Kernen und
+# langen Historien; Shards deutlich größer als der Halo wählen.
+# Messung: python tests/test_structure_shards.py
+
+DEFAULT_SHARD_MONTHS = 3
+DEFAULT_HALO_BARS = 2016
+DEFAULT_MARGIN_BARS = 288
+MIN_CUT_POINTS = 3          # übereinstimmende L- und H-Punkte je Seite des Schnitts
+
+OHLC_COLUMNS = ["open", "high", "low", "close"]    # Eingabe der Steps 1-10
+FINISH_COLUMNS = ["close"]                          # Eingabe der Steps 11-12 (neben dem Zeit-Index)
+FX_ROLLOVER = pd.Timedelta(hours=17)                # FX-Tag wie in relabel_inside_legs
+
+
+@dataclass(frozen=True)
+class ShardSteps:
+    """
+    Pipeline-Schritte für build_structure_sharded als Modul-Funktionen
+    (picklebar für den Prozess-Pool). Phase 1: SHARD_STEPS im Phase-1-Skript.
+    """
+    pre_choch: Callable     # (df, params) -> StructPoints nach Steps 1-2
+    choch_refs: Callable    # (points) -> (bear_refs, bull_refs) als StructPoints
+    scan_choch: Callable    # (df, refs, params, linear=) -> (bear_pos, bull_pos) je Referenz, -1 = keins in df
+    choch: Callable         # (df, (bear_pos, bull_pos)) -> (choch_bear, choch_bull)
+    points: Callable        # (df, params, choch=, pre_choch=) -> finale StructPoints
+    finish: Callable        # (df, points) -> df_final mit Swing-/BOS-Spalten
+
+
+def shard_bounds(index: pd.DatetimeIndex, months: int = DEFAULT_SHARD_MONTHS) -> list:
+    """Kern-Bereiche [start, end) als Bar-Positionen, je `months` Kalendermonate."""
+    n = len(index)
+    if n == 0:
+        return []
+    if months < 1:
+        raise ValueError("months must be >= 1")
+    month_id = index.year.to_numpy() * 12 + index.month.to_numpy() - 1
+    shard_id = (month_id - month_id[0]) // months
+    starts = np.flatnonzero(np.diff(shard_id)) + 1
+    edges = [0] + starts.tolist() + [n]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def fx_day_starts(index: pd.DatetimeIndex) -> np.ndarray:
+    """Positionen der ersten Bar jedes FX-Tags (Rollover 17:00 NY), ohne Position 0."""
+    day = np.asarray((index - FX_ROLLOVER).normalize(), dtype="datetime64[ns]")
+    return np.flatnonzero(day[1:] != day[:-1]) + 1
+
+
+def finish_segments(index: pd.DatetimeIndex, cuts: list) -> list:
+    """Segmente [start, end) für Steps 11-12: jeder Schnitt auf den nächsten FX-Tages-Beginn."""
+    starts = fx_day_starts(index)
+    i = np.searchsorted(starts, np.asarray(cuts, dtype=np.int64))
+    edges = [0] + np.unique(starts[i[i < len(starts)]]).tolist() + [len(index)]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def _slice_points(points: StructPoints, lo: int, hi: int) -> StructPoints:
+    """Punkte mit pos in [lo, hi), pos relativ zu lo."""
+    part = points.filter((points.pos >= lo) & (points.pos < hi))
+    part.pos -= lo
+    return part
+
+
+def _carry_start(points: StructPoints, start: int) -> int:
+    """Erste Bar eines Segments ab start inkl. Zustand: letzter L- / H-Punkt davor (auch der letzte mit Preis)."""
+    before = points.pos < start
+    lo = start
+    for sel in (before & points.is_low, before & points.is_high):
+        for mask in (sel, sel & ~np.isnan(points.price)):
+            idx = np.flatnonzero(mask)
+            if len(idx):
+                lo = min(lo, int(points.pos[idx[-1]]))
+    return lo
+
+
+# ---------------------------------
+# WORKER (Modul-Ebene, picklebar; ohne Log-Ausgabe)
+# ---------------------------------
+
+def _scan_shard(scan: Callable, params, df_part: pd.DataFrame, refs_part: tuple) -> tuple:
+    with contextlib.redirect_stdout(io.StringIO()):
+        return scan(df_part, refs_part, params)
+
+
+def _points_shard(points: Callable, params, df_part: pd.DataFrame, choch_part: tuple,
+                  pre_part: StructPoints) -> StructPoints:
+    with contextlib.redirect_stdout(io.StringIO()):
+        return points(df_part, params, choch=choch_part, pre_choch=pre_part)
+
+
+def _finish_shard(finish: Callable, df_part: pd.DataFrame, points_part: StructPoints, start: int) -> pd.DataFrame:
+    with contextlib.redirect_stdout(io.StringIO()):
+        df_final = finish(df_part, points_part)
+    return df_final.iloc[start:].drop(columns=df_part.columns)
+
+
+def _map(pool, timer: dict, fn: Callable, *iterables) -> list:
+    """fn je Shard, im Pool oder seriell; die Laufzeit zählt als Shard-Anteil."""
+    t0 = time.perf_counter()
+    out = list(map(fn, *iterables)) if pool is None else list(pool.map(fn, *iterables))
+    timer["shards"] += time.perf_counter() - t0
+    return out
+
+
+def _windows(cores: list, halo: int, n: int) -> list:
+    return [(max(s - halo, 0), min(e + halo, n)) for s, e in cores]
+
+
+# ---------------------------------
+# RUNDEN
+# ---------------------------------
+
+def _sharded_choch(steps: ShardSteps, params, df: pd.DataFrame, refs: tuple,
+                   cores: list, halo: int, pool, timer: dict) -> tuple:
+    """Runde 1: CHOCH-Extrem je Referenz je Kern, offene Referenzen danach global. -> (choch, offene)"""
+    n = len(df)
+    ends = [min(e + halo, n) for _, e in cores]
+    ref_parts = [tuple(_slice_points(r, s, e) for r in refs) for s, e in cores]
+    k = len(cores)
+    results = _map(pool, timer, _scan_shard, [steps.scan_choch] * k, [params] * k,
+                   [df.iloc[s:hi] for (s, _), hi in zip(cores, ends)], ref_parts)
+
+    # Treffer auf das ganze Symbol; -1 vor dem Ende der Historie = noch offen
+    extremes, open_masks = [], []
+    for side in range(len(refs)):
+        pos = np.concatenate([np.where(r[side] >= 0, r[side] + s, -1) for r, (s, _) in zip(results, cores)])
+        window_end = np.repeat(ends, [len(p[side]) for p in ref_parts])
+        extremes.append(pos)
+        open_masks.append((pos < 0) & (window_end < n))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        resolved = steps.scan_choch(df, tuple(r.filter(m) for r, m in zip(refs, open_masks)), params, linear=True)
+        for pos, mask, found in zip(extremes, open_masks, resolved):
+            pos[mask] = found
+        choch = steps.choch(df, tuple(extremes))
+    return choch, int(sum(m.sum() for m in open_masks))
+
+
+def _run_points(steps: ShardSteps, params, df: pd.DataFrame, pre: StructPoints, choch_all: tuple,
+                windows: list, pool, timer: dict) -> list:
+    k = len(windows)
+    return _map(pool, timer, _points_shard, [steps.points] * k, [params] * k,
+                [df.iloc[lo:hi] for lo, hi in windows],
+                [tuple(_slice_points(p, lo, hi) for p in choch_all) for lo, hi in windows],
+                [_slice_points(pre, lo, hi) for lo, hi in windows])
+
+
+def _sharded_points(steps: ShardSteps, params, df: pd.DataFrame, pre: StructPoints, choch_all: tuple,
+                    bounds: list, halo: int, margin: int, pool, timer: dict) -> tuple:
+    """Runde 2: Steps 4c-10 je Shard, Schnitte abgleichen, Kern-Punkte zusammensetzen. -> (points, report)"""
+    n = len(df)
+    cores = list(bounds)
+    results = _run_points(steps, params, df, pre, choch_all, _windows(cores, halo, n), pool, timer)
+
+    # --- Schnitte abgleichen; nicht abgleichbare Grenzen -> Kerne zusammenlegen ---
+    merged = 0
+    while True:
+        windows = _windows(cores, halo, n)
+        report = boundary_report(cores, windows, results, df.index, margin)
+        open_ = {i for i, r in enumerate(report["boundaries"]) if not r["reconciled"]}
+        if not open_:
+            break
+        new_cores, new_results, todo = [], [], []
+        i = 0
+        while i < len(cores):
+            j = i
+            while j in open_:
+                j += 1
+            if j > i:
+                todo.append(len(new_cores))
+                merged += j - i
+            new_cores.append((cores[i][0], cores[j][1]))
+            new_results.append(results[i] if j == i else None)
+            i = j + 1
+        print(f"  {len(open_)} boundar(ies) not reconciled -> recomputing {len(todo)} merged shard(s)")
+        cores = new_cores
+        windows = _windows(cores, halo, n)
+        for k, res in zip(todo, _run_points(steps, params, df, pre, choch_all,
+                                            [windows[k] for k in todo], pool, timer)):
+            new_results[k] = res
+        results = new_results
+
+    # --- Punkte der Kerne zusammensetzen ---
+    cuts = [0] + [r["cut_pos"] for r in report["boundaries"]] + [n]
+    core_points = []
+    for (lo, _), points, s, e in zip(windows, results, cuts[:-1], cuts[1:]):
+        core = _slice_points(points, s - lo, e - lo)
+        core.pos += s
+        core_points.append(core)
+    report["merged"] = merged
+    return StructPoints.concat(*core_points), report
+
+
+def _sharded_finish(steps: ShardSteps, df: pd.DataFrame, points: StructPoints, cuts: list,
+                    pool, timer: dict) -> pd.DataFrame:
+    """Runde 3: Steps 11-12 je FX-Tages-Segment, Spalten wie finish(df, points)."""
+    segments = finish_segments(df.index, cuts)
+    starts = [_carry_start(points, s) for s, _ in segments]
+    k = len(segments)
+    frame = df[FINISH_COLUMNS]
+    parts = _map(pool, timer, _finish_shard, [steps.finish] * k,
+                 [frame.iloc[lo:e] for lo, (_, e) in zip(starts, segments)],
+                 [_slice_points(points, lo, e) for lo, (_, e) in zip(starts, segments)],
+                 [s - lo for lo, (s, _) in zip(starts, segments)])
+
+    structure = pd.concat(parts)
+    df_final = df.copy()
+    for col in structure.columns:
+        df_final[col] = structure[col].values
+    return df_final
+
+
+# ---------------------------------
+# SHARDED PHASE 1
+# ---------------------------------
+
+def build_structure_sharded(steps: ShardSteps, params, df: pd.DataFrame,
+                            months: int = DEFAULT_SHARD_MONTHS,
+                            halo: int = DEFAULT_HALO_BARS,
+                            margin: int = DEFAULT_MARGIN_BARS,
+                            max_workers: Optional[int] = None,
+                            verify: bool = False) -> tuple:
+    """
+    Steps 1-12 shardweise, Ergebnis exakt wie der Monolith-Lauf
+    steps.finish(df, steps.points(df, params)) (Phase 1: build_structure):
+    (df_final, StructPoints) + Report (dict).
+    steps: Pipeline-Schritte (Phase 1: SHARD_STEPS).
+    Report: Grenzen, zusammengelegte Kerne ("merged"), über den Schnitt
+    getragene CHOCH-Referenzen ("choch_carried"), Laufzeit gesamt und in
+    den Shard-Runden ("seconds", "seconds_in_shards").
+    """
+    t0 = time.perf_counter()
+    bounds = shard_bounds(df.index, months)
+    if len(bounds) <= 1:
+        with contextlib.redirect_stdout(io.StringIO()):
+            points = steps.points(df, params)
+            df_final = steps.finish(df, points)
+        return df_final, points, {"shards": len(bounds), "halo": halo, "boundaries": [], "merged": 0}
+    if margin > halo:
+        raise ValueError("margin must not exceed halo")
+
+    workers = nested_worker_count(len(bounds), max_workers)
+    print(f"Sharded phase 1: {len(bounds)} shard(s) x {months} month(s), halo {halo} bars, {workers} worker(s)")
+    ohlc = df[OHLC_COLUMNS]
+    timer = {"shards": 0.0}
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        # Steps 1-3 global
+        with contextlib.redirect_stdout(io.StringIO()):
+            pre = steps.pre_choch(ohlc, params)
+            refs = steps.choch_refs(pre)
+
+        choch_all, carried = _sharded_choch(steps, params, ohlc, refs, bounds, halo, pool, timer)
+        points, report = _sharded_points(steps, params, ohlc, pre, choch_all, bounds, halo, margin, pool, timer)
+        df_final = _sharded_finish(steps, df, points, [r["cut_pos"] for r in report["boundaries"]], pool, timer)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    report["halo"] = halo
+    report["workers"] = workers
+    report["choch_carried"] = carried
+    report["seconds"] = time.perf_counter() - t0
+    report["seconds_in_shards"] = timer["shards"]
+    if verify:
+        with contextlib.redirect_stdout(io.StringIO()):
+            mono_points = steps.points(df, params)
+            mono = steps.finish(df, mono_points)
+        bad = diff_structure(df_final, mono)
+        points_equal = bool(
+            len(points) == len(mono_points)
+            and np.array_equal(points.pos, mono_points.pos)
+            and np.array_equal(points.kind, mono_points.kind))
+        report["monolith_diff_bars"] = int(len(bad))
+        report["monolith_diff_positions"] = bad.tolist()
+        report["monolith_points_equal"] = points_equal
+        if len(bad) or not points_equal:
+            raise RuntimeError(f"sharded phase 1 differs from the monolithic run: {len(bad)} bar(s), "
+                               f"first at {bad[:5].tolist()}, points equal: {points_equal}")
+
+    return df_final, points, report
+
+
+# ---------------------------------
+# ABGLEICH DER SCHNITTE (RUNDE 2)
+# ---------------------------------
+
+def _reconciled_cut(bad: np.ndarray, cut: int, c_lo: int, c_hi: int, lo: int, hi: int,
+                    margin: int, lows: np.ndarray, highs: np.ndarray,
+                    min_points: int = MIN_CUT_POINTS) -> Optional[int]:
+    """
+    Nächste Position c zu cut (c_lo <= c < c_hi), um die herum beide Läufe
+    übereinstimmen: keine Abweichung in [c - margin, c + margin) und bis zum
+    min_points-ten L- und H-Punkt auf jeder Seite von c. Das Fenster muss im
+    Overlap [lo, hi) liegen; None, wenn es keine solche Position gibt.
+    bad / lows / highs: sortierte Positionen (Abweichungen, L-/H-Punkte).
+    """
+    def clean(c):
+        a, b = c - margin, c + margin
+        for pos in (lows, highs):
+            i = int(np.searchsorted(pos, c))
+            if i < min_points or len(pos) - i < min_points:
+                return False
+            a = min(a, int(pos[i - min_points]))
+            b = max(b, int(pos[i + min_points - 1]) + 1)
+        if a < lo or b > hi:
+            return False
+        i = np.searchsorted(bad, a)
+        return i == len(bad) or bad[i] >= b
+
+    first, last = max(c_lo, lo), min(c_hi, hi)
+    for d in range(max(cut - first, last - cut) + 1):
+        for c in (cut + d, cut - d) if d else (cut,):
+            if first <= c < last and clean(c):
+                return c
+    return None
+
+
+def _point_diff(a: StructPoints, b: StructPoints) -> np.ndarray:
+    """Positionen, an denen sich zwei Punkt-Sets (pos, Art, Quelle) unterscheiden."""
+    def keys(p):
+        return (p.pos.astype(np.int64) * 4 + p.kind) * 65536 + p.source
+    return np.unique(np.setxor1d(keys(a), keys(b)) // (4 * 65536))
+
+
+def boundary_report(bounds: list, windows: list, results: list, index: pd.DatetimeIndex,
+                    margin: int = DEFAULT_MARGIN_BARS) -> dict:
+    """Overlap-Vergleich der Punkte benachbarter Shards + abgeglichener Schnitt je Grenze."""
+    rows = []
+    prev_cut = 0
+    for i in range(len(bounds) - 1):
+        cut = bounds[i][1]
+        left_lo, left_hi = windows[i]
+        right_lo, _ = windows[i + 1]
+        lo, hi = right_lo, left_hi                  # von beiden gerechnet
+        left = _slice_points(results[i], lo - left_lo, hi - left_lo)
+        right = _slice_points(results[i + 1], lo - right_lo, hi - right_lo)
+        bad = _point_diff(left, right) + lo
+
+        # Schnitt hinter dem vorigen Schnitt und vor dem Ende des rechten Kerns
+        new_cut = _reconciled_cut(bad, cut, prev_cut + 1, bounds[i + 1][1], lo, hi, margin,
+                                  left.pos[left.is_low] + lo, left.pos[left.is_high] + lo)
+        prev_cut = cut if new_cut is None else new_cut
+        rows.append({
+            "boundary": index[cut],
+            "overlap_bars": hi - lo,
+            "diff_bars": int(len(bad)),
+            "nearest_diff_to_cut": int(np.abs(bad - cut).min()) if len(bad) else None,
+            "cut_pos": prev_cut,
+            "cut_shift": 0 if new_cut is None else new_cut - cut,
+            "reconciled": new_cut is not None,
+        })
+    return {"shards": len(bounds), "boundaries": rows}
+
+
+def print_boundary_report(symbol: str, report: dict) -> None:
+    rows = report["boundaries"]
+    n_diff = sum(1 for r in rows if r["diff_bars"])
+    print(f"Boundary diff for {symbol}: {report['shards']} shard(s), {len(rows)} boundar(ies), "
+          f"{n_diff} with overlap differences, {report.get('merged', 0)} merged away")
+    for r in rows:
+        if r["diff_bars"]:
+            print(f"  {r['boundary']}: points differ on {r['diff_bars']} of {r['overlap_bars']} overlap bars, "
+                  f"nearest {r['nearest_diff_to_cut']} bars from the cut, cut shifted by {r['cut_shift']}")
+    if "seconds" in report:
+        print(f"  {report['choch_carried']} CHOCH reference(s) carried across cuts, "
+              f"{report['seconds']:.2f}s ({report['seconds_in_shards']:.2f}s in shard rounds, "
+              f"{report['workers']} worker(s))")
+    if "monolith_diff_bars" in report:
+        print(f"  vs monolithic run: {report['monolith_diff_bars']} bar(s) differ, "
+              f"points equal: {report['monolith_points_equal']}")
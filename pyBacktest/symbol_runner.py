@@ -0,0 +1,173 @@
+import contextlib
+import io
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+try:
+    from config import MAX_WORKERS, MEMORY_PER_SYMBOL_GB
+except ImportError:
+    MAX_WORKERS = None
+    MEMORY_PER_SYMBOL_GB = 1.5
+
+# ---------------------------------
+# PARALLELER SYMBOL-RUNNER
+# ---------------------------------
+#
+# Alle Phasen laufen pro Symbol unabhängig. run_for_symbols verteilt die
+# Symbole auf einen Prozess-Pool:
+#   - Anzahl Worker = min(CPU-Kerne, Symbole, verfügbarer RAM / RAM pro Symbol)
+#   - stdout/stderr jedes Symbols werden im Worker gepuffert und erst nach
+#     Abschluss am Stück ausgegeben (keine vermischten Logs)
+#   - Ergebnis pro Symbol: Erfolg/Fehler, Laufzeit, Rückgabewert
+#
+# Symbol-übergreifende Schritte (z.B. Volatilitäts-Ratios) laufen danach als
+# Reduce-Schritt über die gesammelten Rückgabewerte im Hauptprozess.
+#
+# Pools innerhalb eines Symbol-Workers (z.B. Phase-1-Shards) holen ihre
+# Worker-Zahl über nested_worker_count: das Budget wird durch die Größe
+# des Symbol-Pools geteilt, zusammen laufen nie mehr Prozesse als Kerne.
+
+# Größe des Symbol-Pools, in dem dieser Prozess läuft (1 = Hauptprozess)
+_SYMBOL_POOL_SIZE = 1
+
+
+@dataclass
+class SymbolResult:
+    symbol: str
+    ok: bool
+    seconds: float
+    value: Any = None
+    error: Optional[str] = None
+    log: str = ""
+
+
+def available_memory_bytes() -> Optional[int]:
+    """Freier RAM (Linux) bzw. halber physischer RAM als Schätzung (macOS)."""
+    try:
+        page = os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return None
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * page
+    except (ValueError, OSError):
+        pass
+    try:
+        return os.sysconf("SC_PHYS_PAGES") * page // 2
+    except (ValueError, OSError):
+        return None
+
+
+def resolve_worker_count(n_tasks: int,
+                         max_workers: Optional[int] = None,
+                         memory_per_symbol_gb: Optional[float] = None) -> int:
+    """CPU- und speicherbegrenzte Anzahl paralleler Symbol-Prozesse."""
+    if n_tasks <= 0:
+        return 0
+
+    workers = max_workers if max_workers is not None else MAX_WORKERS
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    per_symbol = memory_per_symbol_gb if memory_per_symbol_gb is not None else MEMORY_PER_SYMBOL_GB
+    avail = available_memory_bytes()
+    if per_symbol and avail is not None:
+        workers = min(workers, max(1, int(avail // (per_symbol * 1024 ** 3))))
+
+    return max(1, min(workers, n_tasks))
+
+
+def nested_worker_count(n_tasks: int,
+                        max_workers: Optional[int] = None,
+                        memory_per_symbol_gb: Optional[float] = None) -> int:
+    """
+    Worker für einen Pool innerhalb eines Symbol-Workers: Budget aus
+    resolve_worker_count geteilt durch die Größe des Symbol-Pools (im
+    Hauptprozess bzw. bei 1 Symbol-Worker das volle Budget).
+    """
+    if n_tasks <= 0:
+        return 0
+    budget = resolve_worker_count(n_tasks * _SYMBOL_POOL_SIZE, max_workers, memory_per_symbol_gb)
+    return max(1, min(n_tasks, budget // _SYMBOL_POOL_SIZE))
+
+
+def _init_symbol_worker(pool_size: int) -> None:
+    global _SYMBOL_POOL_SIZE
+    _SYMBOL_POOL_SIZE = pool_size
+
+
+def _run_one(func: Callable, symbol: str, args: tuple, kwargs: dict) -> SymbolResult:
+    """Führt func(symbol, ...) aus und puffert dabei die komplette Ausgabe."""
+    buf = io.StringIO()
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(buf), contextlib.redirect_stderr(buf):
+        try:
+            value = func(symbol, *args, **kwargs)
+            ok, error = True, None
+        except Exception as e:
+            traceback.print_exc()
+            value, ok, error = None, False, f"{type(e).__name__}: {e}"
+    return SymbolResult(symbol, ok, time.perf_counter() - t0, value, error, buf.getvalue())
+
+
+def _print_block(res: SymbolResult) -> None:
+    status = "OK" if res.ok else "FAILED"
+    print(f"\n[{res.symbol}] {status} after {res.seconds:.1f}s")
+    if res.log:
+        print(res.log.rstrip("\n"))
+
+
+def run_for_symbols(func: Callable,
+                    symbols,
+                    max_workers: Optional[int] = None,
+                    memory_per_symbol_gb: Optional[float] = None,
+                    args: tuple = (),
+                    kwargs: Optional[dict] = None) -> list:
+    """
+    Ruft func(symbol, *args, **kwargs) für jedes Symbol auf – parallel im
+    Prozess-Pool oder (bei 1 Worker) direkt im aktuellen Prozess.
+    func muss auf Modul-Ebene definiert sein (picklebar).
+
+    Rückgabe: Liste von SymbolResult in der Reihenfolge von symbols.
+    """
+    symbols = list(symbols)
+    kwargs = kwargs or {}
+    workers = resolve_worker_count(len(symbols), max_workers, memory_per_symbol_gb)
+    print(f"Running {len(symbols)} symbol(s) with {workers} worker(s) ...")
+
+    results = {}
+    if workers <= 1:
+        for sym in symbols:
+            res = _run_one(func, sym, args, kwargs)
+            _print_block(res)
+            results[sym] = res
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_symbol_worker,
+                                 initargs=(workers,)) as pool:
+            futures = {pool.submit(_run_one, func, sym, args, kwargs): sym for sym in symbols}
+            for fut in as_completed(futures):
+                sym = futures[fut]
+                try:
+                    res = fut.result()
+                except Exception as e:
+                    # z.B. Worker abgestürzt (OOM-Kill) oder Ergebnis nicht picklebar
+                    res = SymbolResult(sym, False, 0.0, None, f"{type(e).__name__}: {e}")
+                _print_block(res)
+                results[sym] = res
+
+    return [results[sym] for sym in symbols]
+
+
+def print_summary(results, title: str = "Run") -> None:
+    print(f"\n=== {title}: summary ===")
+    for res in results:
+        status = "OK    " if res.ok else "FAILED"
+        line = f"  {res.symbol:<8} {status} {res.seconds:8.1f}s"
+        if res.error:
+            line += f"  {res.error}"
+        print(line)
+    n_ok = sum(1 for r in results if r.ok)
+    print(f"  {n_ok}/{len(results)} symbol(s) succeeded.")
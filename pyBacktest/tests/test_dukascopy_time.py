@@ -0,0 +1,152 @@
+import functools
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+# Module liegen eine Ebene höher in pyBacktest/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dukascopy_time import parse_local_time
+
+# ---------------------------------
+# parse_local_time GEGEN DEN BISHERIGEN pd.to_datetime-PFAD
+# ---------------------------------
+#
+# Synthetisches Dukascopy-Jahr: M1, Mo-Fr, "Local time" in Europe/Berlin,
+# also GMT+0100 / GMT+0200 mit beiden DST-Wechseln (31.03. / 27.10.2024).
+# Verglichen werden Timestamps und Gültigkeit mit dem Pfad vor
+# dukascopy_time:
+#   - apply_offset=True:  phase0a (" GMT" -> " ", utc=True)
+#   - apply_offset=False: Chart-Loader (naive Strings, *_M1_raw_for_json.csv)
+# Sonderzeilen werden einzeln an erster Stelle (bestimmt bei pandas das
+# Format) und mitten im Jahr eingestreut. Die Laufzeitmessung läuft nur
+# über __main__ (kein Zeit-Assert im Test, CI-Last).
+#
+#   python -m pytest -q tests                   (aus pyBacktest/)
+#   python tests/test_dukascopy_time.py          (mit Benchmark-Ausgabe, gemessen ~12x)
+
+YEAR = 2024
+LOCAL_TZ = "Europe/Berlin"
+
+ODD_ROWS_OFFSET = [
+    "",
+    "nan",
+    "garbage",
+    "31.02.2024 10:00:00.000 GMT+0100",     # ungültiger Tag
+    "01.01.2024 25:00:00.000 GMT+0100",     # ungültige Stunde
+    "01.01.2024 00:00:00 GMT+0100",         # ohne Millisekunden
+    "1.1.2024 00:00:00.000 GMT+0100",       # einstellige Felder
+    "31.03.2024 02:30:00.000",              # ohne Offset
+    "15.07.2024 10:15:00.000 GMT-0500",     # anderer Offset
+    " 15.07.2024 10:15:00.000 GMT+0200",    # führendes Leerzeichen
+    "2024-03-31 02:30:00",                  # ISO
+]
+
+ODD_ROWS_NAIVE = [
+    "",
+    "nan",
+    "garbage",
+    "31.02.2024 10:00:00.000",
+    "01.01.2024 25:00:00.000",
+    "01.01.2024 00:00:00",
+    "1.1.2024 00:00:00.000",
+    " 15.07.2024 10:15:00.000",
+    "2024-03-31 02:30:00",
+]
+
+
+def reference_parse(values, apply_offset: bool = True):
+    """Bisheriger Pfad (phase0a bzw. Chart-Loader), Rückgabe wie parse_local_time."""
+    raw = pd.Series(np.asarray(values, dtype=object)).astype(str)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)   # "Could not infer format ..."
+        if apply_offset:
+            ts = raw.str.replace(" GMT", " ", regex=False)
+            parsed = pd.to_datetime(ts, dayfirst=True, utc=True, errors="coerce")
+        else:
+            parsed = pd.to_datetime(raw, dayfirst=True, errors="coerce")
+    if isinstance(parsed.dtype, pd.DatetimeTZDtype):
+        parsed = parsed.dt.tz_localize(None)
+    valid = parsed.notna().to_numpy()
+    ns = parsed.to_numpy(dtype="datetime64[ns]").view(np.int64)
+    return np.where(valid, ns, 0), valid
+
+
+@functools.lru_cache(maxsize=None)
+def dukascopy_year(with_offset: bool = True):
+    """(Strings, erwartete ns) für ein M1-Jahr; mit Offset -> UTC, ohne -> Wanduhrzeit."""
+    utc = pd.date_range(f"{YEAR}-01-01", f"{YEAR + 1}-01-01", freq="1min", tz="UTC", inclusive="left")
+    utc = utc[utc.dayofweek < 5]
+    local = utc.tz_convert(LOCAL_TZ)
+    text = local.strftime("%d.%m.%Y %H:%M:%S.000")
+    if with_offset:
+        text = text + " GMT" + local.strftime("%z")
+        expected = utc.asi8
+    else:
+        expected = local.tz_localize(None).asi8
+    return np.asarray(text, dtype=object), expected
+
+
+def assert_same(values, apply_offset: bool):
+    ns, valid = parse_local_time(values, apply_offset=apply_offset)
+    ref_ns, ref_valid = reference_parse(values, apply_offset=apply_offset)
+    bad = np.flatnonzero((valid != ref_valid) | (ns != ref_ns))
+    assert len(bad) == 0, f"{len(bad)} row(s) differ, first: {values[bad[0]]!r}"
+    return ns, valid
+
+
+# ---------------------------------
+# CHECKS
+# ---------------------------------
+
+def test_year_with_offset_matches_reference():
+    values, expected = dukascopy_year(with_offset=True)
+    offsets = {v[-5:] for v in values}
+    assert offsets == {"+0100", "+0200"}, offsets          # beide DST-Wechsel im Jahr
+
+    ns, valid = assert_same(values, apply_offset=True)
+    assert valid.all()
+    assert np.array_equal(ns, expected)
+
+
+def test_year_naive_matches_reference():
+    values, expected = dukascopy_year(with_offset=False)
+    ns, valid = assert_same(values, apply_offset=False)
+    assert valid.all()
+    assert np.array_equal(ns, expected)
+
+
+def test_odd_rows_match_reference():
+    for apply_offset, odd_rows in ((True, ODD_ROWS_OFFSET), (False, ODD_ROWS_NAIVE)):
+        values, _ = dukascopy_year(with_offset=apply_offset)
+        sample = values[::997]
+        mid = len(sample) // 2
+        for odd in odd_rows:
+            assert_same(np.concatenate(([odd], sample)), apply_offset)
+            assert_same(np.concatenate((sample[:mid], [odd], sample[mid:])), apply_offset)
+
+
+def benchmark(apply_offset: bool = True) -> tuple:
+    """(Sekunden parse_local_time, Sekunden bisheriger Pfad) für das ganze Jahr."""
+    values, _ = dukascopy_year(with_offset=apply_offset)
+    t0 = time.perf_counter()
+    parse_local_time(values, apply_offset=apply_offset)
+    t1 = time.perf_counter()
+    reference_parse(values, apply_offset=apply_offset)
+    t2 = time.perf_counter()
+    return t1 - t0, t2 - t1
+
+
+if __name__ == "__main__":
+    test_year_with_offset_matches_reference()
+    test_year_naive_matches_reference()
+    test_odd_rows_match_reference()
+    print("equivalence: OK")
+    for apply_offset in (True, False):
+        values, _ = dukascopy_year(with_offset=apply_offset)
+        fixed_s, reference_s = benchmark(apply_offset)
+        print(f"apply_offset={apply_offset}: {len(values):,} rows, parse_local_time {fixed_s:.2f}s, "
+              f"pd.to_datetime {reference_s:.2f}s ({reference_s / fixed_s:.1f}x)")
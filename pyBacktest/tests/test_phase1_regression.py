@@ -0,0 +1,175 @@
+import contextlib
+import importlib.util
+import io
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Module liegen eine Ebene höher in pyBacktest/
+PYBT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PYBT_DIR)
+from storage import dataset_exists, read_bars
+from structure_engine import STRUCTURE_COLUMNS
+
+# ---------------------------------
+# PHASE 1 GEGEN GESPEICHERTE AUSGABEN (REGRESSION)
+# ---------------------------------
+#
+# 1) Golden File: build_structure auf einer festen synthetischen M5-Reihe
+#    (Random Walk mit Seed, Preise auf 0.1-Pip-Raster -> viele
+#    Gleichstände) für mehrere Schwellen-Sätze, verglichen mit
+#    tests/data/phase1_regression.csv. Gespeichert sind nur die
+#    Strukturpunkt-Bars (Preis/Label) und die Bars, an denen bos_up /
+#    bos_down wechseln. Die Datei stammt aus der Phase 1 vor den
+#    Array-Kerneln (Schleifen-Version) und deckt damit Zwischen-Swings,
+#    Existenz-Prüfungen (count_between), CHOCH, Body-Filter usw. ab.
+#    Nach einer gewollten Verhaltensänderung neu schreiben mit
+#        python tests/test_phase1_regression.py --update
+#
+# 2) Echte Daten (optional): PYBT_PHASE1_BASELINE=<Ordner> mit Kopien von
+#    data_<SYMBOL>_M5_phase1_structure_NY aus einem früheren Lauf; jedes
+#    dort vorhandene Symbol wird gegen data/ verglichen.
+#
+#   python -m pytest -q tests                   (aus pyBacktest/)
+
+PHASE1_SCRIPT = "phase1_structure_bos_base-eurusd-vola-ny-8am-12pm.py"
+PHASE1_MODULE = "phase1_structure"
+
+GOLDEN_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "phase1_regression.csv")
+ENV_BASELINE = "PYBT_PHASE1_BASELINE"
+
+PIP_SIZE = 0.0001
+WEEKS = 4
+SEED = 0
+
+# Schwellen in Pips (Vola-Ratio 1.0)
+PARAM_SETS = {
+    "default": dict(min_swing_pips=3.0, choch_pips=1.5, skip_pips=1.5, sc_pips=4.0),
+    "tight": dict(min_swing_pips=2.0, choch_pips=1.0, skip_pips=1.0, sc_pips=3.0),
+    "wide": dict(min_swing_pips=4.0, choch_pips=2.0, skip_pips=2.0, sc_pips=5.0),
+}
+
+LABEL_COLUMNS = ["swing_low_label", "swing_high_label"]
+BOS_COLUMNS = ["bos_up", "bos_down"]
+
+
+def load_phase1():
+    """Phase-1-Skript als Modul (Dateiname mit Bindestrichen -> importlib)."""
+    if PHASE1_MODULE in sys.modules:
+        return sys.modules[PHASE1_MODULE]
+    spec = importlib.util.spec_from_file_location(PHASE1_MODULE, os.path.join(PYBT_DIR, PHASE1_SCRIPT))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[PHASE1_MODULE] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def synthetic_m5(weeks: int = WEEKS, seed: int = SEED) -> pd.DataFrame:
+    """M5-Bars in NY-Zeit (So 17:00 - Fr 17:00), OHLC auf 0.1-Pip-Raster."""
+    index = pd.date_range("2024-01-07 17:00", periods=weeks * 7 * 288, freq="5min")
+    wd, hour = index.dayofweek, index.hour
+    index = index[~((wd == 5) | ((wd == 4) & (hour >= 17)) | ((wd == 6) & (hour < 17)))]
+
+    n = len(index)
+    rng = np.random.default_rng(seed)
+    close = 110000 + np.cumsum(rng.integers(-15, 16, n))
+    open_ = np.r_[close[0], close[:-1]]
+    high = np.maximum(open_, close) + rng.integers(0, 10, n)
+    low = np.minimum(open_, close) - rng.integers(0, 10, n)
+    return pd.DataFrame({"open": open_ * 1e-5, "high": high * 1e-5,
+                         "low": low * 1e-5, "close": close * 1e-5},
+                        index=pd.DatetimeIndex(index, name="time_ny"))
+
+
+def structure_events(df_final: pd.DataFrame) -> pd.DataFrame:
+    """Strukturpunkt-Bars + Bars mit BOS-Wechsel (pos, STRUCTURE_COLUMNS)."""
+    out = df_final[STRUCTURE_COLUMNS].reset_index(drop=True)
+    for col in LABEL_COLUMNS:
+        out[col] = out[col].astype(object).where(out[col].notna(), "").astype(str)
+    for col in BOS_COLUMNS:
+        out[col] = out[col].astype(bool)
+
+    has_point = out["swing_low_price"].notna() | out["swing_high_price"].notna()
+    bos_change = (out[BOS_COLUMNS] != out[BOS_COLUMNS].shift()).any(axis=1)
+    out = out[has_point | bos_change]
+    out.insert(0, "pos", out.index.to_numpy(dtype=np.int64))
+    return out.reset_index(drop=True)
+
+
+def current_events() -> pd.DataFrame:
+    """Events aller PARAM_SETS mit dem aktuellen build_structure."""
+    phase1 = load_phase1()
+    df = synthetic_m5()
+    frames = []
+    for name, pips in PARAM_SETS.items():
+        params = phase1.StructureParams.from_pips(PIP_SIZE, 1.0, **pips)
+        with contextlib.redirect_stdout(io.StringIO()):
+            df_final, _ = phase1.build_structure(df, params)
+        events = structure_events(df_final)
+        events.insert(0, "param_set", name)
+        frames.append(events)
+    return pd.concat(frames, ignore_index=True)
+
+
+def read_golden() -> pd.DataFrame:
+    golden = pd.read_csv(GOLDEN_FILE, float_precision="round_trip",
+                         dtype={col: str for col in LABEL_COLUMNS}, keep_default_na=False,
+                         na_values={"swing_low_price": [""], "swing_high_price": [""]})
+    for col in BOS_COLUMNS:
+        golden[col] = golden[col].astype(bool)
+    return golden
+
+
+def write_golden(events: pd.DataFrame) -> None:
+    os.makedirs(os.path.dirname(GOLDEN_FILE), exist_ok=True)
+    events.to_csv(GOLDEN_FILE, index=False)
+
+
+# ---------------------------------
+# CHECKS
+# ---------------------------------
+
+def test_build_structure_matches_golden_file():
+    golden = read_golden()
+    current = current_events()
+    for name in PARAM_SETS:
+        expected = golden[golden["param_set"] == name].reset_index(drop=True)
+        actual = current[current["param_set"] == name].reset_index(drop=True)
+        assert len(expected), f"no golden rows for {name}"
+        pd.testing.assert_frame_equal(actual, expected, check_exact=True, obj=f"phase1 events ({name})")
+
+
+def test_phase1_outputs_match_stored_baseline():
+    baseline_dir = os.environ.get(ENV_BASELINE)
+    if not baseline_dir:
+        import pytest
+        pytest.skip(f"{ENV_BASELINE} not set")
+
+    phase1 = load_phase1()
+    # Dataset-Namen ohne Endung (Format siehe storage.py)
+    names = sorted({f.split(".")[0] for f in os.listdir(baseline_dir) if "_M5_phase1_structure_NY" in f})
+    checked = 0
+    for name in names:
+        base = os.path.join(baseline_dir, name)
+        current = os.path.join(PYBT_DIR, phase1.DATA_DIR, name)
+        if not dataset_exists(base) or not dataset_exists(current):
+            continue
+        expected = read_bars(base)
+        actual = read_bars(current)
+        pd.testing.assert_frame_equal(actual[STRUCTURE_COLUMNS], expected[STRUCTURE_COLUMNS], obj=name)
+        checked += 1
+    assert checked, f"no phase 1 datasets found in {baseline_dir}"
+
+
+if __name__ == "__main__":
+    if "--update" in sys.argv:
+        write_golden(current_events())
+        print(f"written: {GOLDEN_FILE}")
+    else:
+        test_build_structure_matches_golden_file()
+        print("golden file: OK")
+        if os.environ.get(ENV_BASELINE):
+            test_phase1_outputs_match_stored_baseline()
+            print("stored baseline: OK")
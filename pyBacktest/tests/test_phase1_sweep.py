@@ -0,0 +1,112 @@
+import contextlib
+import io
+import os
+import sys
+
+import pytest
+
+# Module liegen eine Ebene höher in pyBacktest/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import phase1_sweep as sweep
+from test_phase1_regression import PIP_SIZE, synthetic_m5
+
+# ---------------------------------
+# PARAMETER-SWEEP GEGEN DIREKTE build_structure-LÄUFE
+# ---------------------------------
+#
+#   - grid_combinations / combo_tag: unbekannte Schlüssel -> ValueError,
+#     fehlende Schlüssel -> Default aus dem Phase-1-Skript
+#   - group_combinations: eine Gruppe je (min_swing, skip, choch)
+#   - sweep_bars (CHOCH einmal je Gruppe, build_structure(choch=...)):
+#     jede Zeile == summarize_structure eines direkten build_structure-
+#     Laufs, seriell und im Prozess-Pool
+#
+#   python -m pytest -q tests                   (aus pyBacktest/)
+
+WEEKS = 2
+VOLA_RATIO = 1.0
+
+# 2 CHOCH-Gruppen x 2 Counter-Engulfing-Schwellen, Default-Kombination enthalten
+GRID = {
+    "BASE_MIN_SWING_PIPS": [sweep.phase1.BASE_MIN_SWING_PIPS, 4.0],
+    "BASE_SINGLE_COUNTER_ENGULFING": [sweep.phase1.BASE_SINGLE_COUNTER_ENGULFING, 3.0],
+}
+
+
+def default_combo() -> dict:
+    return {k: getattr(sweep.phase1, k) for k in sweep.GRID_KEYS}
+
+
+def direct_row(df, combo: dict) -> dict:
+    phase1 = sweep.phase1
+    params = phase1.StructureParams.from_pips(
+        PIP_SIZE, VOLA_RATIO, **{sweep.GRID_KEYS[k]: v for k, v in combo.items()})
+    with contextlib.redirect_stdout(io.StringIO()):
+        df_final, points = phase1.build_structure(df, params)
+    return sweep.summarize_structure(df_final, points)
+
+
+def run_sweep(df, grid: dict, max_workers: int = 1):
+    combos = sweep.grid_combinations(grid)
+    with contextlib.redirect_stdout(io.StringIO()):
+        summary = sweep.sweep_bars("TEST", df, sweep.phase1.structure_context(df), PIP_SIZE, VOLA_RATIO,
+                                   combos, max_workers=max_workers)
+    return combos, summary
+
+
+def assert_row_matches(summary_row, expected: dict, what: str) -> None:
+    for key, value in expected.items():
+        assert summary_row[key] == value, (what, key)
+    # Label-Spalten anderer Kombinationen sind hier 0 (fillna)
+    for key in summary_row.index:
+        if key.startswith("label_") and key not in expected:
+            assert summary_row[key] == 0, (what, key)
+
+
+# ---------------------------------
+# CHECKS
+# ---------------------------------
+
+def test_unknown_keys_are_rejected():
+    with pytest.raises(ValueError, match="BASE_TYPO"):
+        sweep.grid_combinations({"BASE_TYPO": [1.0]})
+    with pytest.raises(ValueError, match="BASE_TYPO"):
+        sweep.combo_tag({**default_combo(), "BASE_TYPO": 1.0})
+
+
+def test_missing_keys_use_script_defaults():
+    combos = sweep.grid_combinations({"BASE_CHOCH_PIPS": [1.0, 2.0]})
+    assert [c["BASE_CHOCH_PIPS"] for c in combos] == [1.0, 2.0]
+    assert all(list(c) == list(sweep.GRID_KEYS) for c in combos)
+    assert sweep.grid_combinations({}) == [default_combo()]
+    assert sweep.combo_tag({}) == sweep.combo_tag(default_combo())
+    assert sweep.combo_tag({"BASE_MIN_SWING_PIPS": 3.0, "BASE_CHOCH_PIPS": 1.5,
+                            "BASE_SKIP_PIPS": 1.5, "BASE_SINGLE_COUNTER_ENGULFING": 4.0}) == "ms3_ch1.5_sk1.5_sc4"
+
+
+def test_groups_share_choch_thresholds():
+    combos = sweep.grid_combinations(sweep.SWEEP_GRID)
+    groups = sweep.group_combinations(combos)
+    assert sum(len(g) for g in groups) == len(combos)
+    assert len(groups) == len({tuple(c[k] for k in sweep.CHOCH_KEYS) for c in combos})
+    for group in groups:
+        assert len({tuple(c[k] for k in sweep.CHOCH_KEYS) for c in group}) == 1
+
+
+def test_default_row_matches_build_structure():
+    df = synthetic_m5(WEEKS)
+    combos, summary = run_sweep(df, {})
+    assert len(summary) == 1
+    row = summary.iloc[0]
+    assert row["tag"] == sweep.combo_tag(default_combo())
+    assert row["seconds"] >= 0 and row["choch_seconds"] >= 0
+    assert_row_matches(row, direct_row(df, default_combo()), "default")
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_grouped_sweep_matches_build_structure(max_workers):
+    df = synthetic_m5(WEEKS, seed=1)
+    combos, summary = run_sweep(df, GRID, max_workers=max_workers)
+    assert summary["tag"].tolist() == [sweep.combo_tag(c) for c in combos]
+    for (_, row), combo in zip(summary.iterrows(), combos):
+        assert_row_matches(row, direct_row(df, combo), row["tag"])
@@ -0,0 +1,122 @@
+import contextlib
+import csv
+import io
+import json
+import os
+import pstats
+import sys
+
+# Module liegen eine Ebene höher in pyBacktest/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from phase_metrics import CSV_FIELDS, PhaseMetrics
+from test_phase1_regression import PARAM_SETS, PIP_SIZE, load_phase1, synthetic_m5
+
+# ---------------------------------
+# SCHRITT-METRIKEN AUF build_structure
+# ---------------------------------
+#
+# build_structure mit eingeschalteten Metriken auf der synthetischen
+# Test-Reihe: Schrittnamen in Pipeline-Reihenfolge, Zeilen- und Punktzahlen
+# (Ausgabe eines Schritts = Eingabe des nächsten, Ende = finale Punkte),
+# gleiches Ergebnis wie ohne Metriken, JSON / CSV / .prof von write().
+# Speicher (tracemalloc) nur mit memory=True.
+#
+#   python -m pytest -q tests                   (aus pyBacktest/)
+
+WEEKS = 2
+
+PHASE1_STEPS = [
+    "0_structure_context",
+    "1_detect_struct_points", "2_intermediate_swings", "2_merge",
+    "3_classify_pre", "4a_bearish_choch", "4b_bullish_choch", "4c_counter_engulfing",
+    "5_merge", "5_intermediate_swings", "5_merge_intermediates",
+    "6_body_filter", "7_classify_tmp1", "8_refine_LH_HL", "9_classify_tmp2", "10_merge_extremes",
+    "11_classify_swings", "11b_relabel_inside_legs", "11c_counter_engulf_override", "12_detect_bos",
+]
+
+# Schritt -> Schritt, dessen Ergebnis er als erstes Punkt-Argument bekommt
+CHAINED = {
+    "2_merge": "1_detect_struct_points",
+    "3_classify_pre": "2_merge",
+    "5_merge": "2_merge",
+    "6_body_filter": "5_merge_intermediates",
+    "7_classify_tmp1": "6_body_filter",
+    "8_refine_LH_HL": "6_body_filter",
+    "10_merge_extremes": "8_refine_LH_HL",
+}
+
+
+def run_with_metrics(tmp_path, **kwargs):
+    phase1 = load_phase1()
+    df = synthetic_m5(WEEKS)
+    params = phase1.StructureParams.from_pips(PIP_SIZE, 1.0, **PARAM_SETS["default"])
+    metrics = PhaseMetrics("phase1", "TEST", enabled=True, out_dir=str(tmp_path), **kwargs)
+    with contextlib.redirect_stdout(io.StringIO()):
+        df_final, points = phase1.build_structure(df, params, metrics=metrics)
+        plain, plain_points = phase1.build_structure(df, params)
+    return df, df_final, points, plain, plain_points, metrics
+
+
+# ---------------------------------
+# CHECKS
+# ---------------------------------
+
+def test_steps_and_counts(tmp_path):
+    df, df_final, points, plain, plain_points, metrics = run_with_metrics(tmp_path, profile=False)
+    steps = {s["step"]: s for s in metrics.steps}
+    assert [s["step"] for s in metrics.steps] == PHASE1_STEPS
+
+    for step, source in CHAINED.items():
+        assert steps[step]["points_in"] == steps[source]["points_out"], step
+    assert steps["2_merge"]["points_out"] == (steps["1_detect_struct_points"]["points_out"]
+                                              + steps["2_intermediate_swings"]["points_out"])
+    assert steps["10_merge_extremes"]["points_out"] == len(points)
+    assert steps["12_detect_bos"]["points_in"] == len(points)
+    assert steps["0_structure_context"]["rows"] == len(df)
+
+    for s in metrics.steps:
+        assert s["wall_s"] >= 0 and s["cpu_s"] >= 0, s
+        assert s["peak_mem_mb"] is None, s            # ohne memory=True kein tracemalloc
+
+    # Metriken ändern nichts am Ergebnis
+    assert df_final.equals(plain)
+    assert points.pos.tolist() == plain_points.pos.tolist()
+
+
+def test_memory_flag(tmp_path):
+    _, _, _, _, _, metrics = run_with_metrics(tmp_path, profile=False, memory=True)
+    peaks = [s["peak_mem_mb"] for s in metrics.steps]
+    assert all(p is not None and p >= 0 for p in peaks)
+    assert max(peaks) > 0
+    assert metrics.summary()["memory_traced"] is True
+
+
+def test_write_outputs(tmp_path):
+    _, _, _, _, _, metrics = run_with_metrics(tmp_path, profile=True)
+    paths = metrics.write()
+    assert [os.path.splitext(p)[1] for p in paths] == [".json", ".csv", ".prof"]
+    assert all(os.path.dirname(p) == str(tmp_path) for p in paths)
+
+    with open(paths[0]) as f:
+        summary = json.load(f)
+    assert summary["phase"] == "phase1" and summary["symbol"] == "TEST"
+    assert [s["step"] for s in summary["steps"]] == PHASE1_STEPS
+    assert summary["profiled"] is True
+    assert abs(summary["total_wall_s"] - sum(s["wall_s"] for s in summary["steps"])) < 1e-5
+
+    with open(paths[1], newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert list(rows[0]) == CSV_FIELDS
+    assert [r["step"] for r in rows] == PHASE1_STEPS
+    assert [int(r["points_out"]) if r["points_out"] else None for r in rows] == \
+        [s["points_out"] for s in metrics.steps]
+
+    stats = pstats.Stats(paths[2])
+    assert any(name == "build_structure" or "body_filter" in name for _, _, name in stats.stats)
+
+
+def test_disabled_is_passthrough(tmp_path):
+    metrics = PhaseMetrics("phase1", "TEST", enabled=False, profile=True, memory=True, out_dir=str(tmp_path))
+    assert metrics.call("x", lambda a, b: a + b, 1, 2) == 3
+    assert metrics.steps == [] and metrics.write() == []
+    assert not metrics.profile and not metrics.memory
@@ -0,0 +1,185 @@
+import contextlib
+import io
+import os
+import sys
+import time
+
+import pandas as pd
+import pytest
+
+# Module liegen eine Ebene höher in pyBacktest/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from structure_engine import DEFAULT_LAG_BARS, StructureEngine, compare_with_batch, diff_structure
+from test_phase1_regression import PARAM_SETS, PIP_SIZE, load_phase1, synthetic_m5
+
+# ---------------------------------
+# STRUCTURE ENGINE GEGEN build_structure
+# ---------------------------------
+#
+# Die Online-Engine muss nach Ausgabe + Revisionen exakt den Batch-Lauf
+# liefern (jede Abweichung schlägt fehl, auch innerhalb des Lags), für
+# alle PARAM_SETS und Lookbacks. Dazu:
+#   - Zwischenstand: flush nach t Bars == build_structure auf Bars 0..t-1,
+#     danach weiter pushen -> wieder exakt der ganze Lauf
+#   - jede Bar, deren erste Ausgabe vom Endstand abweicht, hat eine
+#     Revision (Spalten + "revision"-Event)
+#   - Zustand bleibt begrenzt (max_buffered unabhängig von der Länge)
+#
+#   python -m pytest -q tests                   (aus pyBacktest/)
+#   python tests/test_structure_engine.py        (mit Revisionsrate / Laufzeit)
+
+WEEKS = 2
+LOOKBACKS = [(1, 1), (2, 1), (1, 2), (3, 3)]
+LAGS = [0, DEFAULT_LAG_BARS]
+CHECKPOINTS = [1, 2, 3, 500, 1441, 2880]
+MAX_BUFFERED = 4096 + 512   # _TRIM_MIN_BARS + offene Anker
+
+
+def params_for(name: str):
+    return load_phase1().StructureParams.from_pips(PIP_SIZE, 1.0, **PARAM_SETS[name])
+
+
+def batch_structure(df: pd.DataFrame, params, left: int = 1, right: int = 1) -> pd.DataFrame:
+    phase1 = load_phase1()
+    saved = phase1.LEFT_LOOKBACK, phase1.RIGHT_LOOKFORWARD
+    phase1.LEFT_LOOKBACK, phase1.RIGHT_LOOKFORWARD = left, right
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            df_final, _ = phase1.build_structure(df, params)
+    finally:
+        phase1.LEFT_LOOKBACK, phase1.RIGHT_LOOKFORWARD = saved
+    return df_final
+
+
+def apply_outputs(outputs) -> pd.DataFrame:
+    """Ausgegebene Bars + Revisionen in Reihenfolge -> aktueller Stand."""
+    current = pd.concat([frame for o in outputs for frame in (o.bars, o.revised)])
+    return current[~current.index.duplicated(keep="last")].sort_index()
+
+
+def assert_same_structure(actual: pd.DataFrame, expected: pd.DataFrame, what: str) -> None:
+    assert actual.index.equals(expected.index), what
+    bad = diff_structure(actual, expected)
+    assert len(bad) == 0, f"{what}: {len(bad)} bar(s) differ, first at {bad[:5].tolist()}"
+
+
+# ---------------------------------
+# CHECKS
+# ---------------------------------
+
+@pytest.mark.parametrize("name", list(PARAM_SETS))
+@pytest.mark.parametrize("lag", LAGS)
+def test_stream_matches_batch(name, lag):
+    params = params_for(name)
+    df = synthetic_m5(WEEKS, seed=1)
+    report = compare_with_batch(load_phase1().build_structure, params, df, lag=lag, block=97)
+    assert report["diff_bars"] == 0, report["diff_positions"][:10]
+    assert report["first_emission_diff"] <= report["revised_bars"] <= report["revision_events"]
+
+
+def test_stream_matches_batch_lookbacks():
+    params = params_for("default")
+    df = synthetic_m5(1, seed=2)
+    phase1 = load_phase1()
+    for left, right in LOOKBACKS:
+        batch = batch_structure(df, params, left, right)
+        report = compare_with_batch(phase1.build_structure, params, df, left=left, right=right, batch=batch)
+        assert report["diff_bars"] == 0, (left, right, report["diff_positions"][:10])
+
+
+def test_flush_matches_batch_on_prefix():
+    params = params_for("default")
+    df = synthetic_m5(1, seed=3)
+    for t in CHECKPOINTS:
+        engine = StructureEngine(params)
+        outputs = [engine.push(df.iloc[:t]), engine.flush()]
+        assert_same_structure(apply_outputs(outputs), batch_structure(df.iloc[:t], params), f"prefix {t}")
+
+        # nach flush weiter -> Revisionen bringen den ganzen Lauf
+        outputs += [engine.push(df.iloc[t:]), engine.flush()]
+        assert_same_structure(apply_outputs(outputs), batch_structure(df, params), f"continued after {t}")
+
+
+def test_every_changed_bar_is_revised():
+    params = params_for("wide")
+    df = synthetic_m5(1, seed=4)
+    engine = StructureEngine(params)
+    outputs = [engine.push(df.iloc[i:i + 1]) for i in range(len(df))] + [engine.flush()]
+
+    first = pd.concat([o.bars for o in outputs])
+    assert first.index.equals(df.index)         # jede Bar genau einmal ausgegeben
+    final = apply_outputs(outputs)
+    changed = set(first.index[diff_structure(first, final)])
+    revised = set().union(*(o.revised.index for o in outputs))
+    revision_events = {e["time"] for o in outputs for e in o.events if e["event"] == "revision"}
+    assert changed, "no revisions in this series - pick a noisier seed"
+    assert changed <= revised == revision_events
+
+    # Bars erscheinen frühestens nach `lag` Folgebars
+    seen = 0
+    for i, out in enumerate(outputs[:-1]):
+        seen += len(out.bars)
+        assert seen == max(0, i + 1 - DEFAULT_LAG_BARS)
+
+
+def test_events_match_columns():
+    params = params_for("default")
+    df = synthetic_m5(1, seed=5)
+    engine = StructureEngine(params)
+    outputs = [engine.push(df.iloc[i:i + 7]) for i in range(0, len(df), 7)] + [engine.flush()]
+    final = apply_outputs(outputs)
+
+    # je Bar gelten die Events der letzten Ausgabe ("revision" ersetzt sie)
+    by_time = {}
+    for e in (e for o in outputs for e in o.events):
+        if e["event"] == "revision":
+            by_time[e["time"]] = []
+        else:
+            by_time.setdefault(e["time"], []).append(e)
+    events = pd.DataFrame([e for lst in by_time.values() for e in lst])
+
+    swings = events[events["event"] == "swing"]
+    for kind, col in (("L", "swing_low_price"), ("H", "swing_high_price")):
+        prices = swings[swings["kind"] == kind].groupby("time")["price"].last().sort_index()
+        expected = final[col].dropna()
+        assert list(prices.index) == list(expected.index), kind
+        assert prices.tolist() == expected.tolist(), kind
+    for col in ("bos_up", "bos_down"):
+        times = set(events.loc[events["event"] == col, "time"])
+        assert times == set(final.index[final[col]]), col
+    assert set(events["event"]) >= {"swing", "choch_bear", "choch_bull", "bos_up", "bos_down"}
+
+
+def test_state_is_bounded():
+    params = params_for("default")
+    df = synthetic_m5(8, seed=6)
+    engine = StructureEngine(params)
+    for i in range(0, len(df), 288):
+        engine.push(df.iloc[i:i + 288])
+    assert engine.bars_seen == len(df)
+    assert engine.max_buffered <= MAX_BUFFERED, engine.max_buffered
+    assert engine.bars_final >= len(df) - MAX_BUFFERED
+
+
+def test_invalid_arguments():
+    params = params_for("default")
+    for kwargs in (dict(left=0), dict(right=0), dict(lag=-1)):
+        with pytest.raises(ValueError):
+            StructureEngine(params, **kwargs)
+    engine = StructureEngine(params)
+    df = synthetic_m5(1)
+    engine.push(df.iloc[:10])
+    with pytest.raises(ValueError):
+        engine.push(df.iloc[5:6])
+
+
+if __name__ == "__main__":
+    phase1 = load_phase1()
+    df = synthetic_m5(4)
+    for name in PARAM_SETS:
+        for lag in (0, DEFAULT_LAG_BARS, 4 * DEFAULT_LAG_BARS):
+            t0 = time.perf_counter()
+            report = compare_with_batch(phase1.build_structure, params_for(name), df, lag=lag)
+            elapsed = time.perf_counter() - t0
+            print(f"{name:8s} lag {lag:3d}: {report['diff_bars']} differ, "
+                  f"{report['revised_rate']:.2%} revised, max_buffered {report['max_buffered']}, {elapsed:.1f}s")
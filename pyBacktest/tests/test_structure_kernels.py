@@ -0,0 +1,209 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pytest
+
+# Module liegen eine Ebene höher in pyBacktest/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from range_query import SegmentScan, SparseTable
+from struct_points import KIND_H, KIND_L, source_code
+from structure_kernels import (PivotWindows, choch_extremes, count_between, first_index_at_or_below,
+                               first_index_at_or_below_scan, pivot_struct_points)
+
+# ---------------------------------
+# ARRAY-KERNEL GEGEN DIE BISHERIGEN PHASE-1-SCHLEIFEN
+# ---------------------------------
+#
+# pivot_struct_points / PivotWindows gegen die Pivot- und Override-Schleife
+# aus detect_struct_points (Stand vor structure_kernels.py), für beliebige
+# LEFT_LOOKBACK / RIGHT_LOOKFORWARD inkl. 0 und auf Daten mit vielen
+# gleichen Highs/Lows (Preise auf einem groben Tick-Raster).
+# count_between gegen das direkte Abzählen (Existenz-Prüfungen in
+# refine/merge); choch_extremes mit linear=True (Vorwärts-Scan, offene
+# Referenzen der Zeit-Shards) und SegmentScan (Steps 1-2 der Zeit-Shards)
+# gegen die Sparse-Table-Suche. Die ganze
+# Phase 1 prüft test_phase1_regression.py.
+#
+#   python -m pytest -q tests                   (aus pyBacktest/)
+#   python tests/test_structure_kernels.py       (mit Benchmark-Ausgabe)
+
+TICK = 0.0001
+LOOKBACKS = range(0, 5)
+THRESHOLDS = [(0.0, 0.0), (2 * TICK, TICK), (3 * TICK, 1.5 * TICK), (10 * TICK, 5 * TICK)]
+MIN_SPEEDUP = 10.0   # gemessen ~125x auf 150k Bars
+
+
+def tick_bars(n: int, seed: int = 0):
+    """(highs, lows) als Random Walk auf dem Tick-Raster -> viele Gleichstände."""
+    rng = np.random.default_rng(seed)
+    close = 10000 + np.cumsum(rng.integers(-2, 3, n))
+    open_ = np.r_[close[0], close[:-1]]
+    highs = np.maximum(open_, close) + rng.integers(0, 3, n)
+    lows = np.minimum(open_, close) - rng.integers(0, 3, n)
+    return highs * TICK, lows * TICK
+
+
+def reference_pivot_loop(highs, lows, L, R, min_swing_price, skip_price):
+    """Schleife aus detect_struct_points vor structure_kernels.py, Punkte als (pos, kind, price, source)."""
+    n = len(highs)
+    points = []
+    pivot_low_pos = set()
+    pivot_high_pos = set()
+
+    for i in range(L, n - R):
+        low_val = lows[i]
+        high_val = highs[i]
+
+        # --- LOW PIVOT ---
+        window_lows = lows[i-L:i+R+1]
+        left_high = highs[i-L:i].max() if i - L < i else highs[i-1]
+        right_high = highs[i+1:i+1+R].max() if i + 1 < i + 1 + R <= n else highs[min(i+1, n-1)]
+        depth_min = min(left_high - low_val, right_high - low_val)
+
+        is_low_min = (low_val == window_lows.min())
+        if is_low_min and depth_min >= min_swing_price:
+            points.append((i, "L", float(low_val), "pivot"))
+            pivot_low_pos.add(i)
+
+        # --- HIGH PIVOT ---
+        window_highs = highs[i-L:i+R+1]
+        left_low = lows[i-L:i].min() if i - L < i else lows[i-1]
+        right_low = lows[i+1:i+1+R].min() if i + 1 < i + 1 + R <= n else lows[min(i+1, n-1)]
+        height_min = min(high_val - left_low, high_val - right_low)
+
+        is_high_max = (high_val == window_highs.max())
+        if is_high_max and height_min >= min_swing_price:
+            points.append((i, "H", float(high_val), "pivot"))
+            pivot_high_pos.add(i)
+
+    for i in range(L, n - R):
+        if i not in pivot_low_pos:
+            drop = lows[i-1] - lows[i]
+            if drop >= skip_price:
+                right_window = lows[i+1:i+1+R]
+                if len(right_window) > 0 and right_window.min() >= lows[i]:
+                    points.append((i, "L", float(lows[i]), "override_prev_drop_L"))
+
+        if i not in pivot_high_pos:
+            spike = highs[i] - highs[i-1]
+            if spike >= skip_price:
+                right_window_h = highs[i+1:i+1+R]
+                if len(right_window_h) > 0 and right_window_h.max() <= highs[i]:
+                    points.append((i, "H", float(highs[i]), "override_prev_spike_H"))
+
+    points.sort(key=lambda x: x[0])
+    return points
+
+
+def as_tuples(points):
+    kinds = {KIND_L: "L", KIND_H: "H"}
+    sources = {source_code(s): s for s in ("pivot", "override_prev_drop_L", "override_prev_spike_H")}
+    return [(int(p), kinds[int(k)], float(v), sources[int(s)])
+            for p, k, v, s in zip(points.pos, points.kind, points.price, points.source)]
+
+
+# ---------------------------------
+# CHECKS
+# ---------------------------------
+
+def test_pivot_kernel_matches_loop():
+    highs, lows = tick_bars(3000, seed=1)
+    for L in LOOKBACKS:
+        for R in LOOKBACKS:
+            windows = PivotWindows(highs, lows, L, R)
+            for min_swing, skip in THRESHOLDS:
+                expected = reference_pivot_loop(highs, lows, L, R, min_swing, skip)
+                points, n_pl, n_ph, n_ol, n_oh = pivot_struct_points(highs, lows, L, R, min_swing, skip)
+                assert as_tuples(points) == expected, (L, R, min_swing, skip)
+
+                counts = [sum(1 for p in expected if p[1] == k and p[3] == s)
+                          for k, s in (("L", "pivot"), ("H", "pivot"),
+                                       ("L", "override_prev_drop_L"), ("H", "override_prev_spike_H"))]
+                assert [n_pl, n_ph, n_ol, n_oh] == counts, (L, R, min_swing, skip)
+
+                # einmal gebaute Fenster, andere Schwellen -> gleiches Ergebnis
+                assert as_tuples(windows.points(min_swing, skip)[0]) == expected, (L, R, min_swing, skip)
+
+
+def test_pivot_kernel_short_inputs():
+    for n in range(0, 8):
+        highs, lows = (a[:n] for a in tick_bars(n + 1, seed=n))
+        for L in LOOKBACKS:
+            for R in LOOKBACKS:
+                expected = reference_pivot_loop(highs, lows, L, R, TICK, TICK)
+                assert as_tuples(pivot_struct_points(highs, lows, L, R, TICK, TICK)[0]) == expected, (n, L, R)
+
+
+def test_count_between_matches_scan():
+    rng = np.random.default_rng(3)
+    sorted_pos = np.sort(rng.integers(0, 200, 80))          # mit Duplikaten
+    lo = rng.integers(-5, 205, 500)
+    hi = lo + rng.integers(-3, 40, 500)                      # auch leere / umgekehrte Intervalle
+    expected = [sum(1 for p in sorted_pos if a < p < b) for a, b in zip(lo, hi)]
+    assert count_between(sorted_pos, lo, hi).tolist() == expected
+    assert count_between(np.zeros(0, dtype=np.int64), lo, hi).tolist() == [0] * len(lo)
+
+
+def test_linear_choch_search_matches_table():
+    rng = np.random.default_rng(4)
+    highs, lows = tick_bars(5000, seed=4)
+    opens = lows + (highs - lows) * rng.random(len(highs))
+    closes = lows + (highs - lows) * rng.random(len(highs))
+    swing_pos = np.sort(rng.choice(len(highs), 400, replace=False))
+
+    values = np.where(closes < opens, lows, np.nan)
+    thresholds = lows[swing_pos] - rng.integers(0, 60, len(swing_pos)) * TICK
+    expected = first_index_at_or_below(values, swing_pos + 1, thresholds)
+    assert (expected == -1).any() and (expected >= 0).any()
+    for block in (1, 7, 1024):
+        assert first_index_at_or_below_scan(values, swing_pos + 1, thresholds, block).tolist() == expected.tolist()
+
+    for bearish, prices in ((True, lows[swing_pos]), (False, highs[swing_pos])):
+        for choch in (0.0, 3 * TICK, 20 * TICK):
+            table = choch_extremes(opens, highs, lows, closes, swing_pos, prices, choch, bearish)
+            linear = choch_extremes(opens, highs, lows, closes, swing_pos, prices, choch, bearish, linear=True)
+            assert linear.tolist() == table.tolist(), (bearish, choch)
+
+
+def test_segment_scan_matches_table():
+    highs, lows = tick_bars(3000, seed=5)
+    lows[::97] = np.nan                                      # NaN wird übersprungen
+    rng = np.random.default_rng(5)
+    edges = np.unique(rng.integers(0, len(lows) + 1, 300))
+    starts = edges[:-1] + rng.integers(0, 2, len(edges) - 1)  # auch leere Bereiche
+    ends = edges[1:]
+    for values, mode in ((lows, "min"), (highs, "max")):
+        expected = SparseTable(values, mode).arg_many(starts, ends)
+        assert SegmentScan(values, mode).arg_many(starts, ends).tolist() == expected.tolist(), mode
+    with pytest.raises(ValueError, match="overlap"):
+        SegmentScan(lows).arg_many([0, 5], [10, 12])
+
+
+def benchmark(n: int = 150_000) -> tuple:
+    """(Sekunden Kernel, Sekunden Schleife) für L=R=1 auf n Bars."""
+    highs, lows = tick_bars(n, seed=2)
+    t0 = time.perf_counter()
+    pivot_struct_points(highs, lows, 1, 1, 3 * TICK, 1.5 * TICK)
+    t1 = time.perf_counter()
+    reference_pivot_loop(highs, lows, 1, 1, 3 * TICK, 1.5 * TICK)
+    t2 = time.perf_counter()
+    return t1 - t0, t2 - t1
+
+
+def test_pivot_kernel_speedup():
+    kernel_s, loop_s = benchmark(30_000)
+    assert loop_s / kernel_s >= MIN_SPEEDUP, (kernel_s, loop_s)
+
+
+if __name__ == "__main__":
+    test_pivot_kernel_matches_loop()
+    test_pivot_kernel_short_inputs()
+    test_count_between_matches_scan()
+    test_linear_choch_search_matches_table()
+    test_segment_scan_matches_table()
+    print("equivalence: OK")
+    n = 150_000
+    kernel_s, loop_s = benchmark(n)
+    print(f"{n:,} bars: pivot_struct_points {kernel_s * 1000:.1f}ms, loop {loop_s:.2f}s ({loop_s / kernel_s:.0f}x)")
@@ -0,0 +1,152 @@
+import contextlib
+import io
+import os
+import sys
+import time
+
+import numpy as np
+import pytest
+
+# Module liegen eine Ebene höher in pyBacktest/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import symbol_runner
+from structure_engine import diff_structure
+from structure_shards import build_structure_sharded, finish_segments, fx_day_starts
+from test_phase1_regression import PARAM_SETS, PIP_SIZE, load_phase1, synthetic_m5
+
+# ---------------------------------
+# ZEIT-SHARDS GEGEN DEN MONOLITH-LAUF
+# ---------------------------------
+#
+# build_structure_sharded muss exakt build_structure auf der ganzen
+# Historie liefern (Spalten und Punkte), für alle PARAM_SETS:
+#   - Monats-Shards mit normalem Halo
+#   - kleiner Halo -> nicht abgleichbare Grenzen, Kerne werden
+#     zusammengelegt und neu gerechnet; CHOCH-Referenzen, die erst hinter
+#     dem Halo gebrochen werden, gehen über den Schnitt
+#   - Prozess-Pool (2 Worker)
+# Dazu die Segmente der Steps 11-12 (Grenzen auf FX-Tages-Beginn) und die
+# Worker-Zahl innerhalb eines Symbol-Pools (nested_worker_count).
+#
+#   python -m pytest -q tests                   (aus pyBacktest/)
+#   python tests/test_structure_shards.py        (Laufzeit gegen den Monolith)
+
+WEEKS = 13          # ~3 Monate -> 4 Monats-Shards
+HALOS = [(2016, 288), (100, 30)]
+
+
+def run_both(name: str, halo: int, margin: int, seed: int = 0, max_workers=1):
+    phase1 = load_phase1()
+    params = phase1.StructureParams.from_pips(PIP_SIZE, 1.0, **PARAM_SETS[name])
+    df = synthetic_m5(WEEKS, seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        mono, mono_points = phase1.build_structure(df, params)
+        sharded, points, report = build_structure_sharded(
+            phase1.SHARD_STEPS, params, df, months=1, halo=halo, margin=margin, max_workers=max_workers)
+    return mono, mono_points, sharded, points, report
+
+
+def assert_same(mono, mono_points, sharded, points, what: str) -> None:
+    assert list(sharded.columns) == list(mono.columns), what
+    assert sharded.index.equals(mono.index), what
+    bad = diff_structure(sharded, mono)
+    assert len(bad) == 0, f"{what}: {len(bad)} bar(s) differ, first at {bad[:5].tolist()}"
+    for attr in ("pos", "kind", "price", "source"):
+        assert np.array_equal(getattr(points, attr), getattr(mono_points, attr)), (what, attr)
+
+
+# ---------------------------------
+# CHECKS
+# ---------------------------------
+
+@pytest.mark.parametrize("name", list(PARAM_SETS))
+@pytest.mark.parametrize("halo,margin", HALOS)
+def test_sharded_matches_monolith(name, halo, margin):
+    mono, mono_points, sharded, points, report = run_both(name, halo, margin)
+    assert report["shards"] + report["merged"] == 4
+    assert_same(mono, mono_points, sharded, points, f"{name} halo {halo}")
+
+
+def test_choch_references_carried_across_cuts():
+    mono, mono_points, sharded, points, report = run_both("default", 100, 30)
+    assert report["choch_carried"] > 0
+    assert report["seconds_in_shards"] <= report["seconds"]
+    assert_same(mono, mono_points, sharded, points, "carried")
+
+
+def test_finish_segments_start_fx_days():
+    index = synthetic_m5(WEEKS).index
+    starts = fx_day_starts(index)
+    hours = index[starts].hour
+    assert len(starts) > 0 and ((hours == 17) | (index[starts - 1].dayofweek == 4)).all()
+    cuts = [5, 6000, 6001, len(index) - 1]
+    segments = finish_segments(index, cuts)
+    assert segments[0][0] == 0 and segments[-1][1] == len(index)
+    assert all(a[1] == b[0] for a, b in zip(segments[:-1], segments[1:]))
+    inner = [s for s, _ in segments[1:]]
+    assert set(inner) <= set(starts.tolist())
+    assert inner == sorted({int(starts[starts >= c][0]) for c in cuts if (starts >= c).any()})
+
+
+def test_unreconciled_boundaries_are_merged():
+    mono, mono_points, sharded, points, report = run_both("wide", 100, 30)
+    assert report["merged"] > 0
+    assert all(r["reconciled"] for r in report["boundaries"])
+    assert_same(mono, mono_points, sharded, points, "wide, merged")
+
+
+def test_sharded_process_pool():
+    mono, mono_points, sharded, points, report = run_both("default", 2016, 288, seed=1, max_workers=2)
+    assert_same(mono, mono_points, sharded, points, "pool")
+
+
+def test_nested_worker_count_shares_symbol_pool():
+    assert symbol_runner.nested_worker_count(0) == 0
+    full = symbol_runner.nested_worker_count(8, max_workers=8, memory_per_symbol_gb=0)
+    assert full == 8
+    try:
+        symbol_runner._init_symbol_worker(3)
+        assert symbol_runner.nested_worker_count(8, max_workers=8, memory_per_symbol_gb=0) == 2
+        assert symbol_runner.nested_worker_count(8, max_workers=2, memory_per_symbol_gb=0) == 1
+    finally:
+        symbol_runner._init_symbol_worker(1)
+
+
+# ---------------------------------
+# BENCHMARK GEGEN DEN MONOLITH-LAUF
+# ---------------------------------
+
+def benchmark(weeks: int = 104, months: int = 3, workers=(1, 2, 4, 8)) -> list:
+    """
+    Wall-Clock Monolith vs. Shards je Worker-Zahl (höchstens os.cpu_count()).
+    Dazu je Lauf der serielle Anteil (außerhalb der Shard-Runden) und die
+    daraus hochgerechnete Zeit mit w Workern: seriell + Shard-Runden / w.
+    """
+    phase1 = load_phase1()
+    params = phase1.StructureParams.from_pips(PIP_SIZE, 1.0, **PARAM_SETS["default"])
+    df = synthetic_m5(weeks)
+    with contextlib.redirect_stdout(io.StringIO()):
+        t0 = time.perf_counter()
+        mono, _ = phase1.build_structure(df, params)
+        mono_s = time.perf_counter() - t0
+        rows = []
+        for w in [w for w in workers if w <= (os.cpu_count() or 1)]:
+            t0 = time.perf_counter()
+            sharded, _, report = build_structure_sharded(phase1.SHARD_STEPS, params, df, months=months, max_workers=w)
+            wall = time.perf_counter() - t0
+            assert len(diff_structure(sharded, mono)) == 0
+            serial = report["seconds"] - report["seconds_in_shards"]
+            rows.append({"workers": report["workers"], "bars": len(df), "mono_s": mono_s, "sharded_s": wall,
+                         "serial_s": serial, "shard_rounds_s": report["seconds_in_shards"],
+                         "projected": {p: serial + report["seconds_in_shards"] / p for p in workers}})
+    return rows
+
+
+if __name__ == "__main__":
+    for row in benchmark():
+        print(f"{row['bars']:,} bars, {row['workers']} worker(s): monolith {row['mono_s']:.2f}s, "
+              f"sharded {row['sharded_s']:.2f}s ({row['mono_s'] / row['sharded_s']:.2f}x), "
+              f"serial {row['serial_s']:.2f}s + shard rounds {row['shard_rounds_s']:.2f}s")
+        if row["workers"] == 1:
+            print("  projected: " + ", ".join(f"{p} workers {t:.2f}s ({row['mono_s'] / t:.2f}x)"
+                                              for p, t in row["projected"].items()))
@@ -0,0 +1,196 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from session_calendar import block_max, block_min, date_to_day_id, day_blocks
+
+try:
+    from config import PIP_SIZE_MAP
+except ImportError:
+    PIP_SIZE_MAP = {}
+
+# ---------------------------------
+# VOLATILITÄTS-STORE (NY-AM-SESSION-RANGES PRO TAG)
+# ---------------------------------
+#
+# Statt eines einzigen Mittelwerts pro Symbol (volatility_raw_ranges_NY.json)
+# wird pro Symbol und Tag das Session-High/-Low 08:00–11:55 NY gespeichert:
+#   data/vola_ranges/<SYMBOL>_NY_AM.npy   (structured array: day, high, low)
+#
+# Phase 0b ersetzt darin jeweils nur die Tage, die im aktuellen M5-Frame
+# liegen; ältere Tage bleiben erhalten. Mittelwerte / Ratios über ein
+# beliebiges Fenster (ganze Historie, letzte N Tage, Stand zu einem Datum
+# für Walk-Forward) sind dann ein searchsorted + Mittelwert über ein paar
+# hundert Werte.
+#
+# volatility_ratios_NY.json bleibt das veröffentlichte Ergebnis für die
+# Phasen 1–3; load_vola_ratio liest es gecacht (einmal pro Prozess bzw.
+# neu, wenn sich die Datei ändert).
+
+DATA_DIR = "data"
+STORE_DIR = os.path.join(DATA_DIR, "vola_ranges")
+RATIO_FILE = os.path.join(DATA_DIR, "volatility_ratios_NY.json")
+
+# Basis für alle Ratios
+BASE_SYMBOL = "EURUSD"
+
+# Session-Fenster: Kerzen mit Stunde 8, 9, 10, 11 (08:00 bis 11:55)
+SESSION_START_HOUR = 8
+SESSION_END_HOUR = 12
+
+DEFAULT_PIP_SIZE = 0.0001
+
+DAY_RANGE_DTYPE = np.dtype([("day", "<i4"), ("high", "<f8"), ("low", "<f8")])
+
+# {pfad: (mtime_ns, daten)}
+_store_cache = {}
+_ratio_cache = {}
+
+
+def store_path(symbol: str) -> str:
+    return os.path.join(STORE_DIR, f"{symbol}_NY_AM.npy")
+
+
+# ---------------------------------
+# TAGES-RANGES BERECHNEN & SPEICHERN
+# ---------------------------------
+
+def session_day_ranges(df: pd.DataFrame) -> np.ndarray:
+    """
+    Session-High/-Low je Kalendertag aus einem M5-Frame (Index time_ny,
+    Spalten high/low), nur Kerzen SESSION_START_HOUR <= Stunde < SESSION_END_HOUR.
+    """
+    times = np.asarray(df.index.values, dtype="datetime64[ns]")
+    hours = (times - times.astype("datetime64[D]")).astype("timedelta64[h]").astype(np.int64)
+    in_session = (hours >= SESSION_START_HOUR) & (hours < SESSION_END_HOUR)
+
+    days = times[in_session].astype("datetime64[D]").astype(np.int64)
+    if len(days) and np.any(np.diff(days) < 0):
+        order = np.argsort(days, kind="mergesort")
+    else:
+        order = None
+
+    high = df["high"].to_numpy(dtype=np.float64)[in_session]
+    low = df["low"].to_numpy(dtype=np.float64)[in_session]
+    if order is not None:
+        days, high, low = days[order], high[order], low[order]
+
+    starts, _ = day_blocks(days)
+    out = np.empty(len(starts), dtype=DAY_RANGE_DTYPE)
+    out["day"] = days[starts]
+    out["high"] = block_max(high, starts)
+    out["low"] = block_min(low, starts)
+    return out
+
+
+def load_day_ranges(symbol: str) -> np.ndarray:
+    """Gespeicherte Tages-Ranges (gecacht, leer wenn kein Store existiert)."""
+    path = store_path(symbol)
+    if not os.path.exists(path):
+        return np.zeros(0, dtype=DAY_RANGE_DTYPE)
+    mtime = os.stat(path).st_mtime_ns
+    cached = _store_cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    data = np.load(path)
+    if data.dtype != DAY_RANGE_DTYPE:
+        raise RuntimeError(f"Unexpected layout in {path} (re-run phase 0b)")
+    _store_cache[path] = (mtime, data)
+    return data
+
+
+def update_day_ranges(symbol: str, df: pd.DataFrame) -> np.ndarray:
+    """
+    Ersetzt im Store alle Tage im Zeitraum des Frames durch frisch
+    berechnete Werte; Tage außerhalb bleiben erhalten. Rückgabe: neuer Store.
+    """
+    new = session_day_ranges(df)
+    old = load_day_ranges(symbol)
+
+    if len(df) and len(old):
+        first = date_to_day_id(df.index[0])
+        last = date_to_day_id(df.index[-1])
+        keep = (old["day"] < first) | (old["day"] > last)
+        merged = np.concatenate([old[keep], new])
+        merged = merged[np.argsort(merged["day"], kind="mergesort")]
+    else:
+        merged = new if len(new) else old
+
+    os.makedirs(STORE_DIR, exist_ok=True)
+    path = store_path(symbol)
+    tmp = path + ".tmp.npy"
+    np.save(tmp, merged)
+    os.replace(tmp, path)
+    _store_cache.pop(path, None)
+    return merged
+
+
+# ---------------------------------
+# FENSTER-ABFRAGEN
+# ---------------------------------
+
+def _window(days: np.ndarray, start=None, end=None, last_n_days=None):
+    """Index-Bereich [a, b) der Tage mit start <= Tag < end, ggf. nur die letzten N."""
+    a = 0 if start is None else int(np.searchsorted(days, date_to_day_id(start), side="left"))
+    b = len(days) if end is None else int(np.searchsorted(days, date_to_day_id(end), side="left"))
+    if last_n_days is not None:
+        a = max(a, b - int(last_n_days))
+    return a, max(a, b)
+
+
+def avg_range_pips(symbol: str, start=None, end=None, last_n_days=None):
+    """
+    Durchschnittliche NY-AM-Session-Range in Pips über ein Fenster:
+      start / end:  Kalendertage, end exklusiv (-> Stand "as of" end für Walk-Forward)
+      last_n_days:  nur die letzten N Handelstage vor end
+    None, wenn im Fenster keine Tage liegen.
+    """
+    store = load_day_ranges(symbol)
+    a, b = _window(store["day"], start, end, last_n_days)
+    if a >= b:
+        return None
+    pip_size = PIP_SIZE_MAP.get(symbol, DEFAULT_PIP_SIZE)
+    ranges = (store["high"][a:b] - store["low"][a:b]) / pip_size
+    return float(np.nanmean(ranges))
+
+
+def vola_ratio(symbol: str, start=None, end=None, last_n_days=None,
+               base_symbol: str = BASE_SYMBOL, decimals: int = 4) -> float:
+    """Ratio Range(symbol) / Range(base_symbol) im gleichen Fenster (1.0 wenn nicht berechenbar)."""
+    base = avg_range_pips(base_symbol, start, end, last_n_days)
+    val = avg_range_pips(symbol, start, end, last_n_days)
+    if base is None or val is None or not base > 0:
+        return 1.0
+    return round(val / base, decimals)
+
+
+# ---------------------------------
+# GECACHTER ZUGRIFF FÜR PHASE 1–3
+# ---------------------------------
+
+def load_ratio_file(ratio_file: str = RATIO_FILE) -> dict:
+    """volatility_ratios_NY.json, gecacht bis sich die Datei ändert ({} wenn nicht lesbar)."""
+    if not os.path.exists(ratio_file):
+        return {}
+    mtime = os.stat(ratio_file).st_mtime_ns
+    cached = _ratio_cache.get(ratio_file)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    try:
+        with open(ratio_file, "r") as f:
+            data = json.load(f)
+    except Exception as e:
+        print(f"ERROR reading ratio file: {e}. Defaulting to 1.0.")
+        data = {}
+    _ratio_cache[ratio_file] = (mtime, data)
+    return data
+
+
+def load_vola_ratio(symbol: str, ratio_file: str = RATIO_FILE) -> float:
+    """Vola-Ratio des Symbols relativ zu EURUSD (1.0 wenn unbekannt)."""
+    if not os.path.exists(ratio_file):
+        print(f"WARN: {ratio_file} not found. Defaulting to 1.0 ratio.")
+        return 1.0
+    return load_ratio_file(ratio_file).get(symbol, 1.0)